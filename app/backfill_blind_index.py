@@ -0,0 +1,106 @@
+"""Миграция users.chat_id_bidx: добавляет колонку и заполняет blind index.
+
+Запускать ДО выката кода с blind index: модель ``User`` читает колонку
+``chat_id_bidx``, а ``create_all`` не добавляет колонки в существующую
+таблицу, поэтому без миграции любой ``select(User)`` упадёт. Новые
+пользователи, созданные старым кодом между миграцией и выкатом, получат
+индекс при повторном запуске сразу после выката.
+
+Повторять после каждой ротации DATA_ENCRYPTION_KEY — индекс
+пересчитывается текущим (первым) ключом.
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from .crypto import blind_index
+from .db import engine, SessionLocal
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+async def ensure_column(conn: AsyncConnection) -> None:
+    """Добавляет колонку chat_id_bidx, если её ещё нет."""
+
+    def _has_column(sync_conn) -> bool:
+        cols = inspect(sync_conn).get_columns("users")
+        return any(c["name"] == "chat_id_bidx" for c in cols)
+
+    if not await conn.run_sync(_has_column):
+        await conn.execute(text("ALTER TABLE users ADD COLUMN chat_id_bidx VARCHAR(64)"))
+
+
+async def ensure_index(conn: AsyncConnection) -> None:
+    await conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_chat_id_bidx "
+            "ON users (chat_id_bidx)"
+        )
+    )
+
+
+async def backfill(session: AsyncSession, batch_size: int = 500) -> int:
+    """Пересчитывает индекс для всех пользователей, возвращает число обновлённых.
+
+    Дубликаты chat_id (созданные до появления индекса) остаются без индекса:
+    каноническим считается пользователь с наименьшим id. Миграция идёт
+    пачками по id с коммитом на каждую и может быть перезапущена.
+    """
+    seen: set[str] = set()
+    last_id = 0
+    updated = 0
+    duplicates = 0
+    while True:
+        rows = (
+            await session.execute(
+                select(User.id, User.chat_id)
+                .where(User.id > last_id)
+                .order_by(User.id)
+                .limit(batch_size)
+            )
+        ).all()
+        if not rows:
+            break
+        params = []
+        for uid, chat_id in rows:
+            bidx = blind_index(str(chat_id)) if chat_id is not None else None
+            if bidx is not None and bidx in seen:
+                duplicates += 1
+                bidx = None
+            elif bidx is not None:
+                seen.add(bidx)
+            params.append({"id": uid, "chat_id_bidx": bidx})
+        if params:
+            await session.execute(update(User), params)
+            updated += len(params)
+        last_id = rows[-1][0]
+        await session.commit()
+    if duplicates:
+        logger.warning("Найдено дубликатов chat_id: %s", duplicates)
+    return updated
+
+
+async def run(batch_size: int) -> int:
+    async with engine.begin() as conn:
+        await ensure_column(conn)
+    async with SessionLocal() as session:
+        updated = await backfill(session, batch_size)
+    async with engine.begin() as conn:
+        await ensure_index(conn)
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill users.chat_id_bidx blind index")
+    parser.add_argument("--batch-size", type=int, default=500, help="Users per batch")
+    args = parser.parse_args()
+    updated = asyncio.run(run(args.batch_size))
+    print(f"Updated {updated} users")
+
+
+if __name__ == "__main__":
+    main()
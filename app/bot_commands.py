@@ -14,7 +14,7 @@ DEFAULT_CRON_HUMAN = get_description(DEFAULT_CRON, locale="ru")
 router = Router()
 
 async def _get_or_create_user(session, chat_id: int) -> User:
-    res = await session.execute(select(User).where(User.chat_id == chat_id))
+    res = await session.execute(select(User).where(User.chat_id_is(chat_id)))
     user = res.scalar_one_or_none()
     if not user:
         user = User(chat_id=chat_id)
@@ -33,18 +33,84 @@ class Settings(BaseSettings):
     BUDGET_MAX_TASKS: int = 20
     QUIET_HOURS: str | None = None
 
+    # Темп публикации задач оркестратором (задач/сек на сайт, 0 — без ограничения)
+    PUBLISH_RATE: float = 5.0
+    PUBLISH_BURST: int = 50
+    PUBLISH_RATES: dict[str, float] = Field(default_factory=dict)
+
     PRESETS_FILE: str = "./presets.yaml"
 
+    # Движок разбора HTML: bs4 или lxml; PARSER_ENGINES переопределяет по сайту
+    PARSER_ENGINE: str = "bs4"
+    PARSER_ENGINES: dict[str, str] = Field(default_factory=dict)
+    # Сначала разбирать листинг из встроенного JSON-состояния страницы
+    PARSER_STATE_FAST_PATH: bool = True
+    # Поиск цены карточки Ozon без селектора: уровни предков и окно соседей
+    OZON_PRICE_FALLBACK_DEPTH: int = 2
+    OZON_PRICE_FALLBACK_WINDOW: int = 3
+    # Процессы пула разбора HTML; 0 — разбор прямо в event loop
+    PARSE_WORKERS: int = 0
+    # Не больше N рендеров детальных страниц на пресет (попадания в кэш не считаются); кэш деталей по URL в памяти воркера
+    DETAIL_FETCH_LIMIT: int = 10
+    DETAIL_URL_CACHE_TTL: int = 900
+    # Кэш деталей в Redis по (source, external_id, geoid); 0 — выключен.
+    # BETA > 1 обновляет записи раньше истечения TTL, < 1 — позже
+    DETAIL_CACHE_TTL: int = 3 * 3600
+    DETAIL_CACHE_BETA: float = 1.0
+
+    # Писать историю цен только при смене цены/продавца или раз в heartbeat
+    HISTORY_CHANGE_POINTS: bool = False
+    HISTORY_HEARTBEAT_HOURS: int = 24
+    HISTORY_REFRESH_CHUNK: int = 1000
+    HISTORY_REFRESH_CONCURRENCY: int = 4
+    # Прогресс прерванного пересчёта старше N часов относится к прошлому запуску
+    HISTORY_REFRESH_RESUME_HOURS: int = 12
+
     TIMEZONE: str = "Europe/Moscow"
 
     REDIS_URL: str = "redis://localhost:6379/0"
     QUEUE_STREAM: str = "presets"
+    WORKER_CONCURRENCY: int = 4
 
     S3_BUCKET: str | None = None
     S3_ENDPOINT: str | None = None
     S3_ACCESS_KEY: str | None = None
     S3_SECRET_KEY: str | None = None
     SNAPSHOT_TTL_DAYS: int = 7
+    # Скриншот страницы при рендере: never | on_error | always;
+    # SCREENSHOT_FULL_PAGE=False снимает только видимую область
+    SCREENSHOT_MODE: str = "on_error"
+    SCREENSHOT_FULL_PAGE: bool = True
+    # Блокировка ресурсов при рендере; RENDER_BLOCK_PROFILES переопределяет
+    # types/urls и задаёт allow-список по домену сайта
+    RENDER_BLOCKING: bool = True
+    RENDER_BLOCK_TYPES: list[str] = Field(default_factory=lambda: ["image", "media", "font"])
+    RENDER_BLOCK_URLS: list[str] = Field(
+        default_factory=lambda: [
+            "mc.yandex.ru",
+            "an.yandex.ru",
+            "google-analytics.com",
+            "googletagmanager.com",
+            "doubleclick.net",
+            "top-fwz1.mail.ru",
+            "counter.yadro.ru",
+            "vk.com/rtrg",
+        ]
+    )
+    RENDER_BLOCK_PROFILES: dict[str, dict[str, list[str]]] = Field(default_factory=dict)
+    # Готовность страницы после селектора: stable | networkidle | none;
+    # RENDER_READY_PREDICATES — JS-предикат готовности по домену
+    RENDER_READY_MODE: str = "stable"
+    RENDER_READY_TIMEOUT_MS: int = 3000
+    RENDER_READY_INTERVAL_MS: int = 250
+    RENDER_READY_PREDICATES: dict[str, str] = Field(default_factory=dict)
+    # Минимальный интервал между рендерами одного домена (ждём до взятия контекста)
+    RENDER_MIN_DELAY_MS: int = 1000
+    # Контекст (домен, регион) пересоздаётся после N страниц; 0 — без лимита
+    RENDER_CONTEXT_MAX_PAGES: int = 200
+    # Процессы Chromium в пуле рендера (0 — половина ядер) и их лимит страниц
+    RENDER_BROWSERS: int = 0
+    RENDER_BROWSER_MAX_PAGES: int = 2000
 
     METRICS_PORT: int = 8000
     SENTRY_DSN: str | None = None
@@ -1,4 +1,6 @@
 import base64
+import hashlib
+import hmac
 import json
 import os
 from typing import List
@@ -13,6 +15,8 @@ _keys: List[bytes] = [
 ]
 _encryptor = AESGCM(_keys[0])
 _decryptors = [AESGCM(k) for k in _keys]
+# Ключи blind index выводятся из ключей шифрования и ротируются вместе с ними
+_index_keys = [hmac.new(k, b"blind-index", hashlib.sha256).digest() for k in _keys]
 
 
 def encrypt_text(value: str) -> str:
@@ -33,6 +37,16 @@ def decrypt_text(token: str) -> str:
             continue
     raise ValueError("Не удалось расшифровать данные")
 
+def blind_index(value: str) -> str:
+    """Детерминированный HMAC-индекс значения для поиска на равенство."""
+    return hmac.new(_index_keys[0], value.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def blind_indexes(value: str) -> list[str]:
+    """Индексы значения для всех ключей, включая старые (для поиска при ротации)."""
+    data = value.encode("utf-8")
+    return [hmac.new(k, data, hashlib.sha256).hexdigest() for k in _index_keys]
+
 class EncryptedStr(TypeDecorator):
     impl = String
     cache_ok = True
@@ -27,6 +27,23 @@ budget_exceeded = Counter(
 tasks_skipped = Counter(
     "tasks_skipped_total", "Total skipped tasks", ["reason"]
 )
+fanout_duration = Histogram(
+    "orchestrator_fanout_seconds", "Wall time of preset fan-out", ["notify"]
+)
+tasks_published = Counter(
+    "orchestrator_tasks_published_total", "Total tasks published by orchestrator", ["site"]
+)
+
+# Ночной пересчёт метрик продуктов
+history_refresh_products = Counter(
+    "history_refresh_products_total", "Products processed by history refresh"
+)
+history_refresh_chunk_seconds = Histogram(
+    "history_refresh_chunk_seconds", "Latency of one history refresh chunk"
+)
+history_refresh_throughput = Gauge(
+    "history_refresh_products_per_second", "Throughput of the last history refresh run"
+)
 
 # Метрики по категориям
 category_avg_price = Gauge(
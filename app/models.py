@@ -1,7 +1,8 @@
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 from sqlalchemy import (
     String,
     Integer,
+    BigInteger,
     Float,
     ForeignKey,
     DateTime,
@@ -15,7 +16,7 @@ from sqlalchemy import (
 )
 from datetime import datetime
 from .db import Base
-from .crypto import EncryptedStr, EncryptedInt, EncryptedJSON
+from .crypto import EncryptedStr, EncryptedInt, EncryptedJSON, blind_index, blind_indexes
 
 class Product(Base):
     __tablename__ = "products"
@@ -78,6 +79,22 @@ class PriceHistory(Base):
     product: Mapped["Product"] = relationship(back_populates="history")
 
 
+class PriceDaily(Base):
+    """Дневной агрегат цен продукта для скользящих метрик без скана истории."""
+    __tablename__ = "price_daily"
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[int] = mapped_column(Integer, primary_key=True)  # date.toordinal()
+    cnt: Mapped[int] = mapped_column(Integer, default=0)
+    total: Mapped[int] = mapped_column(BigInteger, default=0)
+    min_price: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    first_ts: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    first_price: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # суммы для регрессии; x — доля суток от начала дня бакета
+    sum_x: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_xx: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_xy: Mapped[float] = mapped_column(Float, default=0.0)
+
+
 # Создание hypertable для TimescaleDB
 event.listen(
     PriceHistory.__table__,
@@ -99,6 +116,8 @@ class User(Base):
     __tablename__ = "users"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     chat_id: Mapped[int] = mapped_column(EncryptedInt, unique=True, index=True)
+    # HMAC chat_id: шифротекст со случайным nonce нельзя сравнивать на равенство
+    chat_id_bidx: Mapped[str | None] = mapped_column(String(64), unique=True, index=True, nullable=True)
     geoid: Mapped[str] = mapped_column(EncryptedStr, default="213")
     min_discount: Mapped[int] = mapped_column(EncryptedInt, default=25)
     min_score: Mapped[int] = mapped_column(EncryptedInt, default=70)
@@ -107,6 +126,23 @@ class User(Base):
     schedule_cron: Mapped[str | None] = mapped_column(EncryptedStr)  # e.g., "0 9,19 * * *"
     schedule_human: Mapped[str | None] = mapped_column(EncryptedStr, nullable=True)
 
+    @validates("chat_id")
+    def _index_chat_id(self, key, value):
+        self.chat_id_bidx = blind_index(str(value)) if value is not None else None
+        return value
+
+    @classmethod
+    def chat_id_is(cls, chat_id: int):
+        """Условие поиска пользователя по chat_id через blind index."""
+        return cls.chat_id_bidx.in_(blind_indexes(str(chat_id)))
+
+class JobProgress(Base):
+    """Прогресс длительных фоновых задач для возобновления после сбоя."""
+    __tablename__ = "job_progress"
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    last_id: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Favorite(Base):
     __tablename__ = "favorites"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
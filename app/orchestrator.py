@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -13,7 +14,8 @@ from .schemas import TaskPayload
 from .db import SessionLocal
 from .models import User
 from . import metrics
-from history.service import refresh_all_products
+from history.refresh import refresh_all_products
+from orchestrator.pacer import Pacer
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +26,7 @@ class Orchestrator:
         max_pages: int | None = None,
         max_tasks: int | None = None,
         quiet_hours: tuple[int, int] | str | None = None,
+        pacer: Pacer | None = None,
     ):
         self.queue = queue
         self.tz = ZoneInfo(settings.TIMEZONE)
@@ -42,6 +45,9 @@ class Orchestrator:
             self.quiet_hours = qh
         self.pages_sent = 0
         self.tasks_sent = 0
+        self.pacer = pacer or Pacer(
+            settings.PUBLISH_RATE, settings.PUBLISH_BURST, settings.PUBLISH_RATES
+        )
 
     async def start(self):
         self.running = True
@@ -63,8 +69,12 @@ class Orchestrator:
         await self._run_presets(notify=True)
 
     async def refresh_history(self):
-        async with SessionLocal() as session:
-            await refresh_all_products(session)
+        await refresh_all_products(
+            SessionLocal,
+            chunk_size=settings.HISTORY_REFRESH_CHUNK,
+            concurrency=settings.HISTORY_REFRESH_CONCURRENCY,
+            resume_hours=settings.HISTORY_REFRESH_RESUME_HOURS,
+        )
 
     def _in_quiet_hours(self) -> bool:
         if not self.quiet_hours:
@@ -98,7 +108,26 @@ class Orchestrator:
         self.tasks_sent += 1
         return True
 
+    async def _publish_site(self, site: str, tasks: list[TaskPayload]) -> None:
+        """Публикует задачи сайта пачками в пределах бюджета token bucket."""
+        i = 0
+        while i < len(tasks):
+            n = await self.pacer.acquire(site, len(tasks) - i)
+            batch = tasks[i:i + n]
+            await self.queue.publish_many(batch)
+            metrics.tasks_published.labels(site=site).inc(len(batch))
+            i += n
+
     async def _run_presets(self, notify: bool):
+        start = time.perf_counter()
+        try:
+            await self._fan_out(notify)
+        finally:
+            metrics.fanout_duration.labels(notify=str(notify).lower()).observe(
+                time.perf_counter() - start
+            )
+
+    async def _fan_out(self, notify: bool):
         self.pages_sent = 0
         self.tasks_sent = 0
 
@@ -145,6 +174,7 @@ class Orchestrator:
         min_discount = settings.MIN_DISCOUNT
         min_score = settings.MIN_SCORE
 
+        by_site: dict[str, list[TaskPayload]] = {}
         for category, geoid in pairs:
             for site, items in presets.sites.items():
                 for item in items:
@@ -162,5 +192,8 @@ class Orchestrator:
                     )
                     if not self._allow_publish(task.model_dump()):
                         continue
-                    await self.queue.publish(task)
-                    await asyncio.sleep(1.0)
+                    by_site.setdefault(site, []).append(task)
+
+        await asyncio.gather(
+            *(self._publish_site(site, tasks) for site, tasks in by_site.items())
+        )
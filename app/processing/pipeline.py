@@ -1,16 +1,27 @@
+import asyncio
+from datetime import datetime, timedelta
 from typing import Iterable
 import time
 from urllib.parse import urlparse
 
-from sqlalchemy import select
+from sqlalchemy import insert, select, or_
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
-from history.service import update_product_metrics
+from history.service import last_points, update_product_metrics
+from history.rollup import record_prices, rollup_metrics
 
 import sentry_sdk
 
 from ..scraper.render import RenderService
 from ..scraper.adapters import ozon as ozon_ad, market as market_ad
+from ..scraper.detail_cache import detail_cache
+from ..scraper.parse_pool import (
+    parse_executor,
+    parse_listing_page,
+    parse_product_page,
+    record_listing_stats,
+)
 from ..schemas import OfferRaw, OfferNormalized
 from ..processing.normalize import normalize
 from ..processing.score import discount_pct, compute_score
@@ -21,87 +32,289 @@ from ..config import settings
 from ..metrics import update_listing_stats, update_category_price_stats
 from observability.metrics import parse_latency, parse_errors
 
+_LISTING_WAIT = {
+    "ozon": '[data-widget="searchResultsV2"]',
+    "market": "article[data-autotest-id='product-snippet']",
+}
+_ADAPTERS = {"ozon": ozon_ad, "market": market_ad}
+
+
 async def fetch_site_list(
     render: RenderService, site: str, url: str, geoid: str | None
 ) -> list[OfferRaw]:
+    if site not in _ADAPTERS:
+        return []
     geoid_actual = geoid or settings.DEFAULT_GEOID
     domain = urlparse(url).netloc
-    if site == "ozon":
-        cookies = ozon_ad.region_cookies(geoid_actual)
-        html, screenshot = await render.fetch(
-            url=url,
-            cookies=cookies,
-            wait_selector='[data-widget="searchResultsV2"]',
-            region_hint=geoid,
-        )
-        if not ozon_ad.ensure_region(html, geoid_actual):
-            raise ValueError("Не удалось выбрать регион")
-        start = time.perf_counter()
-        try:
-            items = ozon_ad.parse_listing(html)
-            parse_latency.labels(domain=domain).observe(time.perf_counter() - start)
-        except Exception as e:
-            parse_errors.labels(domain=domain).inc()
-            await render.save_snapshot(url, html, screenshot, prefix="schema")
-            sentry_sdk.capture_exception(e)
-            raise
-        if not items:
-            await render.save_snapshot(url, html, screenshot, prefix="schema")
-        update_listing_stats(domain, not items)
-        return items
-    elif site == "market":
-        cookies = market_ad.region_cookies(geoid_actual)
-        html, screenshot = await render.fetch(
-            url=url,
-            cookies=cookies,
-            wait_selector="article[data-autotest-id='product-snippet']",
-            region_hint=geoid,
+    html, screenshot = await render.fetch(
+        url=url,
+        cookies=_ADAPTERS[site].region_cookies(geoid_actual),
+        wait_selector=_LISTING_WAIT[site],
+        region_hint=geoid,
+    )
+    # проверка региона и парсинг по одному документу, вне event loop
+    try:
+        region_ok, payloads, elapsed, tiers = await parse_executor.run(
+            parse_listing_page, site, html, geoid_actual, geoid
         )
-        if not market_ad.ensure_region(html, geoid_actual):
-            raise ValueError("Не удалось выбрать регион")
-        start = time.perf_counter()
-        try:
-            items = market_ad.parse_listing(html, geoid=geoid)
-            parse_latency.labels(domain=domain).observe(time.perf_counter() - start)
-        except Exception as e:
-            parse_errors.labels(domain=domain).inc()
-            await render.save_snapshot(url, html, screenshot, prefix="schema")
-            sentry_sdk.capture_exception(e)
-            raise
-        if not items:
-            await render.save_snapshot(url, html, screenshot, prefix="schema")
-        update_listing_stats(domain, not items)
-        return items
-    else:
-        return []
+    except Exception as e:
+        parse_errors.labels(domain=domain).inc()
+        await render.save_snapshot(url, html, screenshot, prefix="schema")
+        sentry_sdk.capture_exception(e)
+        raise
+    if not region_ok:
+        raise ValueError("Не удалось выбрать регион")
+    parse_latency.labels(domain=domain).observe(elapsed)
+    record_listing_stats(site, tiers)
+    items = [OfferRaw.model_validate(p) for p in payloads]
+    if not items:
+        await render.save_snapshot(url, html, screenshot, prefix="schema")
+    update_listing_stats(domain, not items)
+    return items
 
 
 async def fetch_product_detail(
     render: RenderService, site: str, url: str, geoid: str | None
 ) -> OfferRaw | None:
+    """Деталь товара из кэша Redis или рендером страницы."""
+    if site not in _ADAPTERS:
+        return None
+    external_id = _ADAPTERS[site].external_id_from_url(url)
+    cached = await detail_cache.get(site, external_id, geoid)
+    if cached is not None:
+        return cached
+    return await render_product_detail(render, site, url, geoid)
+
+
+async def render_product_detail(
+    render: RenderService, site: str, url: str, geoid: str | None
+) -> OfferRaw | None:
+    """Рендерит и разбирает страницу товара, результат кладёт в кэш Redis."""
+    if site not in _ADAPTERS:
+        return None
+    adapter = _ADAPTERS[site]
+    external_id = adapter.external_id_from_url(url)
     geoid_actual = geoid or settings.DEFAULT_GEOID
     domain = urlparse(url).netloc
-    if site == "ozon":
-        cookies = ozon_ad.region_cookies(geoid_actual)
-        html, screenshot = await render.fetch(url=url, cookies=cookies, region_hint=geoid)
-        try:
-            return ozon_ad.parse_product(html)
-        except Exception as e:
-            parse_errors.labels(domain=domain).inc()
-            await render.save_snapshot(url, html, screenshot, prefix="product")
-            sentry_sdk.capture_exception(e)
-            return None
-    elif site == "market":
-        cookies = market_ad.region_cookies(geoid_actual)
-        html, screenshot = await render.fetch(url=url, cookies=cookies, region_hint=geoid)
-        try:
-            return market_ad.parse_product(html, geoid=geoid)
-        except Exception as e:
-            parse_errors.labels(domain=domain).inc()
-            await render.save_snapshot(url, html, screenshot, prefix="product")
-            sentry_sdk.capture_exception(e)
-            return None
-    return None
+    start = time.perf_counter()
+    cookies = adapter.region_cookies(geoid_actual)
+    html, screenshot = await render.fetch(url=url, cookies=cookies, region_hint=geoid)
+    try:
+        payload, _ = await parse_executor.run(parse_product_page, site, html, geoid)
+        offer = OfferRaw.model_validate(payload)
+    except Exception as e:
+        parse_errors.labels(domain=domain).inc()
+        await render.save_snapshot(url, html, screenshot, prefix="product")
+        sentry_sdk.capture_exception(e)
+        return None
+    await detail_cache.set(external_id, geoid, offer, time.perf_counter() - start)
+    return offer
+
+# кэш деталей между задачами воркера: (url, geoid) -> (истекает, оффер)
+_DETAIL_CACHE_MAX = 5000
+_detail_cache: dict[tuple[str, str | None], tuple[float, OfferRaw]] = {}
+_detail_inflight: dict[tuple[str, str | None], asyncio.Future] = {}
+
+
+def _remember_detail(key: tuple[str, str | None], detail: OfferRaw) -> None:
+    now = time.monotonic()
+    if len(_detail_cache) >= _DETAIL_CACHE_MAX:
+        for k in [k for k, (exp, _) in _detail_cache.items() if exp <= now]:
+            del _detail_cache[k]
+        while len(_detail_cache) >= _DETAIL_CACHE_MAX:
+            del _detail_cache[next(iter(_detail_cache))]
+    _detail_cache[key] = (now + settings.DETAIL_URL_CACHE_TTL, detail)
+
+
+async def cached_product_detail(site: str, url: str, geoid: str | None) -> OfferRaw | None:
+    """Деталь товара из кэша по URL или из Redis, без рендера."""
+    key = (url, geoid)
+    hit = _detail_cache.get(key)
+    if hit:
+        if hit[0] > time.monotonic():
+            return hit[1]
+        del _detail_cache[key]
+    if site not in _ADAPTERS:
+        return None
+    detail = await detail_cache.get(site, _ADAPTERS[site].external_id_from_url(url), geoid)
+    if detail and settings.DETAIL_URL_CACHE_TTL > 0:
+        _remember_detail(key, detail)
+    return detail
+
+
+async def _load_detail(
+    render: RenderService, site: str, url: str, geoid: str | None
+) -> OfferRaw | None:
+    detail = await render_product_detail(render, site, url, geoid)
+    if detail and settings.DETAIL_URL_CACHE_TTL > 0:
+        _remember_detail((url, geoid), detail)
+    return detail
+
+
+async def shared_product_detail(
+    render: RenderService, site: str, url: str, geoid: str | None
+) -> OfferRaw | None:
+    """Рендер детали товара; одновременные запросы URL делят один рендер."""
+    key = (url, geoid)
+    fut = _detail_inflight.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(_load_detail(render, site, url, geoid))
+        _detail_inflight[key] = fut
+        fut.add_done_callback(lambda _: _detail_inflight.pop(key, None))
+    # отмена одной задачи не должна обрывать общий рендер
+    return await asyncio.shield(fut)
+
+
+def _product_row(item: OfferNormalized) -> dict:
+    return {
+        "source": item.source,
+        "external_id": item.external_id,
+        "title": item.title,
+        "url": item.url,
+        "img": item.img,
+        "img_hash": item.img_hash,
+        "brand": item.brand,
+        "category": item.category,
+        "finger": item.finger,
+        "geoid_created": item.geoid,
+    }
+
+
+def _insert_ignore(dialect: str):
+    """INSERT ... ON CONFLICT DO NOTHING для поддерживаемых диалектов."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(Product)
+
+
+async def _resolve_products(
+    session: AsyncSession, items: list[OfferNormalized]
+) -> dict[str, Product]:
+    """Возвращает продукты по URL, создавая отсутствующие одним INSERT."""
+    urls = list(dict.fromkeys(it.url for it in items))
+    res = await session.execute(select(Product).where(Product.url.in_(urls)))
+    by_url = {p.url: p for p in res.scalars()}
+
+    missing: dict[str, OfferNormalized] = {}
+    for it in items:
+        if it.url not in by_url and it.url not in missing:
+            missing[it.url] = it
+    if not missing:
+        return by_url
+
+    stmt = _insert_ignore(session.get_bind().dialect.name)
+    if stmt is None:
+        for url, it in missing.items():
+            prod = Product(**_product_row(it))
+            session.add(prod)
+            by_url[url] = prod
+        await session.flush()
+        return by_url
+
+    await session.execute(
+        stmt.values([_product_row(it) for it in missing.values()]).on_conflict_do_nothing()
+    )
+    # конфликт мог случиться по (source, external_id) при другом URL
+    ext_ids = {it.external_id for it in missing.values()}
+    res = await session.execute(
+        select(Product).where(
+            or_(Product.url.in_(list(missing)), Product.external_id.in_(ext_ids))
+        )
+    )
+    by_ext: dict[tuple[str, str], Product] = {}
+    for prod in res.scalars():
+        by_url.setdefault(prod.url, prod)
+        by_ext[(prod.source, prod.external_id)] = prod
+    for url, it in missing.items():
+        if url not in by_url:
+            by_url[url] = by_ext[(it.source, it.external_id)]
+    return by_url
+
+
+def _offer_row(item: OfferNormalized) -> dict:
+    return {
+        "price": item.price,
+        "price_old": item.price_old,
+        "price_final": item.price_final,
+        "seller": item.seller,
+        "shipping_days": item.shipping_days,
+        "promo_flags": item.promo_flags,
+        "price_in_cart": item.price_in_cart,
+        "subscription": item.subscription,
+    }
+
+
+async def _changed_points(
+    session: AsyncSession, pairs: list[tuple[Product, OfferNormalized]], now: datetime
+) -> list[tuple[Product, OfferNormalized]]:
+    """Оставляет наблюдения, отличающиеся от последней точки истории.
+
+    Точка пишется и без изменений, если с последней прошло больше
+    ``HISTORY_HEARTBEAT_HOURS``.
+    """
+    last = await last_points(session, [prod.id for prod, _ in pairs])
+    heartbeat = timedelta(hours=settings.HISTORY_HEARTBEAT_HOURS)
+    changed = []
+    seen: set[int] = set()
+    for prod, item in pairs:
+        if prod.id in seen:
+            continue
+        prev = last.get(prod.id)
+        if (
+            prev is None
+            or prev[1] != item.price_final
+            or prev[2] != item.seller
+            or now - prev[0] >= heartbeat
+        ):
+            changed.append((prod, item))
+            seen.add(prod.id)
+    return changed
+
+
+async def upsert_offers(session: AsyncSession, items: list[OfferNormalized]) -> list[Product]:
+    """Пакетно сохраняет продукты и историю цен, возвращает продукты по порядку items.
+
+    Число запросов не зависит от размера листинга: выборка продуктов по
+    ``IN``, мульти-INSERT недостающих, один пакетный INSERT истории и один
+    upsert дневных агрегатов. В режиме ``HISTORY_CHANGE_POINTS`` история
+    пишется только для изменившихся цен; дневные агрегаты получают все
+    наблюдения, так что метрики по ним не меняются.
+    Офферы пишутся отдельно через :func:`insert_offers`, когда посчитан скор.
+    """
+    if not items:
+        return []
+    products = await _resolve_products(session, items)
+    result = []
+    for item in items:
+        prod = products[item.url]
+        if item.img_hash and not prod.img_hash:
+            prod.img_hash = item.img_hash
+        result.append(prod)
+    now = datetime.utcnow()
+    pairs = list(zip(result, items))
+    if settings.HISTORY_CHANGE_POINTS:
+        pairs = await _changed_points(session, pairs, now)
+    if pairs:
+        await session.execute(
+            insert(PriceHistory),
+            [
+                {"product_id": prod.id, "ts": now, "price_final": item.price_final, "seller": item.seller}
+                for prod, item in pairs
+            ],
+        )
+    await record_prices(session, ((prod.id, now, item.price_final) for prod, item in zip(result, items)))
+    return result
+
+
+async def insert_offers(session: AsyncSession, rows: list[dict]) -> None:
+    """Пакетно вставляет офферы одним executemany."""
+    if rows:
+        await session.execute(insert(Offer), rows)
+
 
 async def upsert_offer(session: AsyncSession, item: OfferNormalized):
     # Product
@@ -109,18 +322,7 @@ async def upsert_offer(session: AsyncSession, item: OfferNormalized):
     res = await session.execute(q)
     prod: Product | None = res.scalar_one_or_none()
     if not prod:
-        prod = Product(
-            source=item.source,
-            external_id=item.external_id,
-            title=item.title,
-            url=item.url,
-            img=item.img,
-            img_hash=item.img_hash,
-            brand=item.brand,
-            category=item.category,
-            finger=item.finger,
-            geoid_created=item.geoid,
-        )
+        prod = Product(**_product_row(item))
         session.add(prod)
         await session.flush()
     else:
@@ -128,31 +330,25 @@ async def upsert_offer(session: AsyncSession, item: OfferNormalized):
             prod.img_hash = item.img_hash
 
     # Offer
-    off = Offer(
-        product_id=prod.id,
-        price=item.price,
-        price_old=item.price_old,
-        price_final=item.price_final,
-        seller=item.seller,
-        shipping_days=item.shipping_days,
-        promo_flags=item.promo_flags,
-        price_in_cart=item.price_in_cart,
-        subscription=item.subscription,
-    )
+    off = Offer(product_id=prod.id, **_offer_row(item))
     session.add(off)
     await session.flush()
 
     # History (append)
+    now = datetime.utcnow()
     hist = PriceHistory(
         product_id=prod.id,
+        ts=now,
         price_final=item.price_final,
         seller=item.seller
     )
     session.add(hist)
+    # метрики считаются по дневным агрегатам, наблюдение пишется и туда
+    await record_prices(session, [(prod.id, now, item.price_final)])
     return prod, off, hist
 
 async def compute_features(session: AsyncSession, product_id: int) -> tuple[int | None, int | None, float | None]:
-    """Расчёт средней цены за 30 дней, лучшей цены за 90 дней и тренда."""
+    """Расчёт средней цены за 30 дней, лучшей цены за 90 дней и тренда по ``price_daily``."""
     return await update_product_metrics(session, product_id)
 
 async def process_preset(
@@ -168,34 +364,56 @@ async def process_preset(
     raws = await fetch_site_list(render, site, url, geoid)
     normalized = [normalize(r) for r in raws]
     normalized = dedupe_offers(normalized)
-    for idx, n in enumerate(normalized):
-        if n.price_in_cart and n.price_final is None:
-            detail = await fetch_product_detail(render, site, n.url, geoid)
-            if detail:
-                normalized[idx] = normalize(detail)
+    pending = [
+        idx for idx, n in enumerate(normalized) if n.price_in_cart and n.price_final is None
+    ]
+    cached = await asyncio.gather(
+        *(cached_product_detail(site, normalized[idx].url, geoid) for idx in pending)
+    )
+    misses = []
+    for idx, detail in zip(pending, cached):
+        if detail:
+            normalized[idx] = normalize(detail)
+        else:
+            misses.append(idx)
+    # детали из кэшей отдаются всем карточкам, лимит только на рендеры.
+    # Рендеры идут параллельно: ограничение даёт пул контекстов и семафор
+    # домена RenderService, лимит не даёт пресету занять весь рендер
+    misses = misses[: max(settings.DETAIL_FETCH_LIMIT, 0)]
+    details = await asyncio.gather(
+        *(shared_product_detail(render, site, normalized[idx].url, geoid) for idx in misses)
+    )
+    for idx, detail in zip(misses, details):
+        if detail:
+            normalized[idx] = normalize(detail)
     update_category_price_stats(normalized)
 
     results: list[dict] = []
-    infos = []
-    for n in normalized:
-        infos.append(await upsert_offer(session, n))
-    await session.commit()
+    products = await upsert_offers(session, normalized)
+
+    features = await rollup_metrics(session, [p.id for p in products])
 
-    for (prod, off, _), n in zip(infos, normalized):
-        avg30, best90, trend = await compute_features(session, prod.id)
-        prod.avg_price_30d = avg30
-        prod.min_price_90d = best90
-        prod.trend_30d = trend
+    offer_rows: list[dict] = []
+    for prod, n in zip(products, normalized):
+        avg30, best90, trend = features[prod.id]
+        # значения уже записаны пакетным UPDATE, не помечаем объект грязным
+        set_committed_value(prod, "avg_price_30d", avg30)
+        set_committed_value(prod, "min_price_90d", best90)
+        set_committed_value(prod, "trend_30d", trend)
 
         abs_sav = (avg30 - (n.price_final or 0)) if avg30 and n.price_final else None
         disc = discount_pct(n.price_old or avg30, n.price_final)
         fake_msrp = is_fake_msrp(n.price_old, avg30)
         score = compute_score(disc, abs_sav, None, n.shipping_days, score_weights)
 
-        off.discount_pct = disc
-        off.abs_saving = abs_sav
-        off.score = score
-        off.fake_msrp = fake_msrp
+        offer_rows.append({
+            "product_id": prod.id,
+            **_offer_row(n),
+            "discount_pct": disc,
+            "abs_saving": abs_sav,
+            "score": score,
+            "fake_msrp": fake_msrp,
+        })
 
         if disc is not None:
             n.discount_pct = disc
@@ -212,6 +430,7 @@ async def process_preset(
                 "fake_msrp": fake_msrp,
             })
 
+    await insert_offers(session, offer_rows)
     await session.commit()
     results.sort(key=lambda x: x["score"], reverse=True)
     return results
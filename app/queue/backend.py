@@ -1,6 +1,8 @@
 import asyncio
+import logging
 import random
-from typing import Callable, Awaitable, Any
+import time
+from typing import Callable, Awaitable, Any, Iterable
 import json
 from pydantic import BaseModel
 from ..schemas import TaskPayload
@@ -8,6 +10,33 @@ from ..schemas import TaskPayload
 import redis.asyncio as redis
 from redis.exceptions import ResponseError
 
+logger = logging.getLogger(__name__)
+
+# KEYS[1] — ключ идемпотентности, KEYS[2] — поток;
+# ARGV[1] — TTL ключа, далее пары поле/значение сообщения.
+_PUBLISH_LUA = """
+if redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+    return redis.call('XADD', KEYS[2], '*', unpack(ARGV, 2))
+end
+return false
+"""
+
+# KEYS[1] — ZSET отложенных ретраев, KEYS[2] — поток;
+# ARGV[1] — текущее время, ARGV[2] — сколько ретраев перенести за раз.
+_PROMOTE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    local fields = {}
+    for k, v in pairs(cjson.decode(member)) do
+        fields[#fields + 1] = k
+        fields[#fields + 1] = v
+    end
+    redis.call('XADD', KEYS[2], '*', unpack(fields))
+end
+return #due
+"""
+
 
 class PermanentError(Exception):
     """Исключение для ошибок, которые не стоит ретраить."""
@@ -18,7 +47,16 @@ class AbstractQueue:
     async def publish(self, data: dict | BaseModel, dlq: bool = False) -> None:
         raise NotImplementedError
 
-    async def consume(self, handler: Callable[[Any], Awaitable[Any]], consumer_name: str) -> None:
+    async def publish_many(self, tasks: Iterable[dict | BaseModel], dlq: bool = False) -> int:
+        count = 0
+        for task in tasks:
+            await self.publish(task, dlq=dlq)
+            count += 1
+        return count
+
+    async def consume(
+        self, handler: Callable[[Any], Awaitable[Any]], consumer_name: str, concurrency: int = 1
+    ) -> None:
         raise NotImplementedError
 
 
@@ -27,6 +65,11 @@ class RedisQueue(AbstractQueue):
         self.redis = redis.from_url(url)
         self.stream = stream
         self.idempotency_ttl = 24 * 3600
+        self.retry_poll_interval = 1.0
+        self._stopping = asyncio.Event()
+        self._groups: set[tuple[str, str]] = set()
+        self._publish_script = self.redis.register_script(_PUBLISH_LUA)
+        self._promote_script = self.redis.register_script(_PROMOTE_LUA)
 
     def _shard_stream(self, site: str | None, geoid: str | None, category: str | None) -> str:
         """Формирует имя потока с учётом шардов."""
@@ -39,13 +82,30 @@ class RedisQueue(AbstractQueue):
 
     async def _ensure_group(self, stream: str, group: str) -> None:
         """Создаёт consumer group, если она ещё не существует."""
+        if (stream, group) in self._groups:
+            return
         try:
             await self.redis.xgroup_create(stream, group, id="$", mkstream=True)
         except ResponseError as e:
             if "BUSYGROUP" not in str(e):
                 raise
+        self._groups.add((stream, group))
 
-    async def publish(self, data: dict | BaseModel, dlq: bool = False) -> None:
+    @staticmethod
+    def _idem_key(data_dict: dict) -> str:
+        url_template = data_dict.get("url_template") or data_dict.get("url")
+        page = data_dict.get("page")
+        site = data_dict.get("site")
+        geoid = data_dict.get("geoid")
+        category = data_dict.get("category")
+        return f"{site}:{geoid}:{category}:{url_template}:{page}"
+
+    @staticmethod
+    def _retry_key(stream: str) -> str:
+        return f"{stream}:retry"
+
+    def _prepare_publish(self, data: dict | BaseModel, dlq: bool) -> tuple[str, str, dict]:
+        """Возвращает (поток, ключ идемпотентности в Redis, поля сообщения)."""
         retries = None
         if isinstance(data, BaseModel):
             model = TaskPayload.model_validate(data.model_dump())
@@ -59,25 +119,117 @@ class RedisQueue(AbstractQueue):
         category = data_dict.get("category")
         base_stream = self._shard_stream(site, geoid, category)
         stream = f"{base_stream}:dlq" if dlq else base_stream
-        group = f"{stream}:group"
-        await self._ensure_group(stream, group)
 
-        url_template = data_dict.get("url_template") or data_dict.get("url")
-        page = data_dict.get("page")
-        idem_key = f"{site}:{geoid}:{category}:{url_template}:{page}"
+        idem_key = self._idem_key(data_dict)
         idem_redis_key = f"{stream}:idem:{idem_key}"
-        added = await self.redis.setnx(idem_redis_key, 1)
-        if not added:
-            return
-        await self.redis.expire(idem_redis_key, self.idempotency_ttl)
-
         payload = {
             "data": json.dumps(data_dict, ensure_ascii=False),
             "idempotency_key": idem_key,
         }
         if retries is not None:
             payload["retries"] = str(retries)
-        await self.redis.xadd(stream, payload)
+        return stream, idem_redis_key, payload
+
+    async def publish(self, data: dict | BaseModel, dlq: bool = False) -> None:
+        await self.publish_many([data], dlq=dlq)
+
+    async def publish_many(self, tasks: Iterable[dict | BaseModel], dlq: bool = False) -> int:
+        """Публикует пачку задач одним пайплайном и возвращает число добавленных.
+
+        Проверка идемпотентности и XADD выполняются атомарно Lua-скриптом,
+        поэтому ключ идемпотентности всегда создаётся вместе с TTL.
+        """
+        prepared = [self._prepare_publish(t, dlq) for t in tasks]
+        if not prepared:
+            return 0
+        for stream in dict.fromkeys(stream for stream, _, _ in prepared):
+            await self._ensure_group(stream, f"{stream}:group")
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for stream, idem_redis_key, payload in prepared:
+                args: list[Any] = [self.idempotency_ttl]
+                for k, v in payload.items():
+                    args.extend((k, v))
+                await self._publish_script(
+                    keys=[idem_redis_key, stream], args=args, client=pipe
+                )
+            results = await pipe.execute()
+        return sum(1 for r in results if r)
+
+    async def schedule_retry(self, stream: str, task: TaskPayload, retries: int, delay: float) -> None:
+        """Откладывает повтор задачи в ZSET с временем готовности в качестве score."""
+        data_dict = task.model_dump()
+        payload = {
+            "data": json.dumps(data_dict, ensure_ascii=False),
+            "idempotency_key": self._idem_key(data_dict),
+            "retries": str(retries),
+        }
+        member = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        await self.redis.zadd(self._retry_key(stream), {member: time.time() + delay})
+
+    async def promote_due_retries(self, stream: str, limit: int = 100) -> int:
+        """Переносит созревшие ретраи обратно в поток и возвращает их число.
+
+        Выборка, ZREM и XADD выполняются одним Lua-скриптом: ретрай не
+        теряется при падении между ними и не задваивается между консьюмерами.
+        """
+        return await self._promote_script(
+            keys=[self._retry_key(stream), stream],
+            args=[time.time(), limit],
+            client=self.redis,
+        )
+
+    async def _retry_promoter(self, stream: str) -> None:
+        while True:
+            try:
+                await self.promote_due_retries(stream)
+            except Exception:
+                logger.exception("Не удалось перенести отложенные ретраи %s", stream)
+            await asyncio.sleep(self.retry_poll_interval)
+
+    def stop(self) -> None:
+        """Просит consume завершиться после обработки задач в работе.
+
+        Действует и до запуска consume: сигнал, пришедший во время старта
+        воркера, не теряется.
+        """
+        self._stopping.set()
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.error("Ошибка обработки сообщения очереди", exc_info=exc)
+
+    async def _process_message(
+        self,
+        stream: str,
+        group: str,
+        msg_id: Any,
+        message: dict,
+        handler: Callable[[dict], Awaitable[Any]],
+    ) -> None:
+        max_retries = 5
+        data = {k.decode(): v.decode() for k, v in message.items()}
+        retries = int(data.pop("retries", "0"))
+        task = TaskPayload.model_validate_json(data.get("data", "{}"))
+        try:
+            await handler(task)
+        except PermanentError:
+            await self.publish({**task.model_dump(), "retries": retries}, dlq=True)
+        except Exception as e:
+            status = getattr(e, "status", getattr(e, "status_code", None))
+            if status and 400 <= int(status) < 600:
+                await self.publish({**data, "retries": retries}, dlq=True)
+            elif retries + 1 >= max_retries:
+                await self.publish({**task.model_dump(), "retries": retries + 1}, dlq=True)
+            else:
+                backoff = (2 ** retries) + random.random()
+                await self.schedule_retry(stream, task, retries + 1, backoff)
+        finally:
+            await self.redis.xack(stream, group, msg_id)
+            await self.redis.xdel(stream, msg_id)
 
     async def consume(
         self,
@@ -86,39 +238,45 @@ class RedisQueue(AbstractQueue):
         site: str | None = None,
         geoid: str | None = None,
         category: str | None = None,
+        concurrency: int = 1,
     ) -> None:
+        """Читает задачи пачками и выполняет до ``concurrency`` штук одновременно.
+
+        Каждое сообщение подтверждается сразу после завершения своего
+        обработчика. Ретраи с бэкоффом откладываются в ZSET и возвращаются в
+        поток фоновым промоутером, не занимая слот консьюмера. После ``stop()`` или отмены новые сообщения не читаются,
+        а уже запущенные задачи дорабатываются до конца.
+        """
         stream = self._shard_stream(site, geoid, category)
         group = f"{stream}:group"
         await self._ensure_group(stream, group)
-        max_retries = 5
-        while True:
-            res = await self.redis.xreadgroup(
-                group, consumer_name, {stream: ">"}, count=1, block=1000,
-            )
-            if not res:
-                continue
-            for _stream, messages in res:
-                for msg_id, message in messages:
-                    data = {k.decode(): v.decode() for k, v in message.items()}
-                    retries = int(data.pop("retries", "0"))
-                    task = TaskPayload.model_validate_json(data.get("data", "{}"))
-                    try:
-                        await handler(task)
-                    except PermanentError:
-                        await self.publish({**task.model_dump(), "retries": retries}, dlq=True)
-                    except Exception as e:
-                        status = getattr(e, "status", getattr(e, "status_code", None))
-                        if status and 400 <= int(status) < 600:
-                            await self.publish({**data, "retries": retries}, dlq=True)
-                        elif retries + 1 >= max_retries:
-                            await self.publish({**task.model_dump(), "retries": retries + 1}, dlq=True)
-                        else:
-                            backoff = (2 ** retries) + random.random()
-                            await asyncio.sleep(backoff)
-                            await self.publish({**task.model_dump(), "retries": retries + 1})
-                    finally:
-                        await self.redis.xack(stream, group, msg_id)
-                        await self.redis.xdel(stream, msg_id)
+        limit = max(1, concurrency)
+        inflight: set[asyncio.Task] = set()
+        promoter = asyncio.create_task(self._retry_promoter(stream))
+        try:
+            while not self._stopping.is_set():
+                free = limit - len(inflight)
+                if free <= 0:
+                    await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                res = await self.redis.xreadgroup(
+                    group, consumer_name, {stream: ">"}, count=free, block=1000,
+                )
+                if not res:
+                    continue
+                for _stream, messages in res:
+                    for msg_id, message in messages:
+                        t = asyncio.create_task(
+                            self._process_message(stream, group, msg_id, message, handler)
+                        )
+                        inflight.add(t)
+                        t.add_done_callback(inflight.discard)
+                        t.add_done_callback(self._on_task_done)
+        finally:
+            if inflight:
+                await asyncio.gather(*inflight, return_exceptions=True)
+            promoter.cancel()
+            await asyncio.gather(promoter, return_exceptions=True)
 
     async def consume_dlq(
         self,
@@ -2,4 +2,13 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-__all__ = ["logger"]
\ No newline at end of file
+
+def domain_setting(mapping: dict, domain: str, default=None):
+    """Значение настройки для домена: точное совпадение или родительский домен."""
+    for key, value in mapping.items():
+        if domain == key or domain.endswith("." + key):
+            return value
+    return default
+
+
+__all__ = ["logger", "domain_setting"]
@@ -1,14 +1,14 @@
 from functools import lru_cache
 from pathlib import Path
 from typing import Any
-import json
 
 import yaml
+from bs4 import BeautifulSoup
 
-try:  # optional lxml for XPath fallback
-    from lxml import etree
-except Exception:  # pragma: no cover - lxml may be missing
-    etree = None
+from ...config import settings
+from .. import logger
+from .engines import ENGINES, LxmlNode, lxml_available, parse_lxml
+from .plans import SelectorPlan, compile_selectors, plan_for
 
 
 @lru_cache()
@@ -20,78 +20,80 @@ def _load_selectors() -> dict:
         return yaml.safe_load(f) or {}
 
 
+@lru_cache()
 def get_selectors(name: str) -> dict:
-    return _load_selectors().get(name, {})
+    """Скомпилированные планы селекторов сайта: {раздел: {поле: SelectorPlan}}."""
+    return compile_selectors(_load_selectors().get(name, {}), name)
+
+
+def engine_for(site: str | None) -> str:
+    """Движок разбора для адаптера: ``PARSER_ENGINES[site]`` или ``PARSER_ENGINE``."""
+    engine = settings.PARSER_ENGINES.get(site, settings.PARSER_ENGINE) if site else settings.PARSER_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный движок разбора: {engine}")
+    if engine == "lxml" and not lxml_available():
+        logger.warning("lxml/cssselect не установлены, используется bs4")
+        return "bs4"
+    return engine
+
+
+class Document:
+    """HTML-страница, которая разбирается один раз.
+
+    Дерево строится лениво при первом обращении выбранным движком
+    (``bs4`` или ``lxml``) и переиспользуется проверкой региона, разбором
+    листинга и решением о снапшоте.
+    """
+
+    __slots__ = ("html", "engine", "_root", "_memo")
+
+    def __init__(self, html: str, engine: str = "bs4") -> None:
+        self.html = html
+        self.engine = engine
+        self._root = None
+        self._memo: dict = {}
+
+    def memo(self, key: str, fn):
+        """Значение ``fn(self)``, вычисленное один раз на документ."""
+        if key not in self._memo:
+            self._memo[key] = fn(self)
+        return self._memo[key]
+
+    @property
+    def root(self):
+        if self._root is None:
+            if self.engine == "lxml":
+                self._root = parse_lxml(self.html)
+            else:
+                self._root = BeautifulSoup(self.html, "html.parser")
+        return self._root
+
+
+def as_document(page: "str | Document", site: str | None = None) -> Document:
+    """Оборачивает строку HTML в :class:`Document`, документ возвращает как есть."""
+    return page if isinstance(page, Document) else Document(page, engine_for(site))
+
+
+def _to_node(node: Any):
+    """Узел дерева для запросов: корень документа, узел как есть или разбор строки."""
+    if isinstance(node, Document):
+        return node.root
+    if isinstance(node, LxmlNode) or hasattr(node, "select"):
+        return node
+    return as_document(str(node)).root
 
 
-def _to_soup(node: Any):
-    from bs4 import BeautifulSoup
+def select_all(node: Any, selector: "SelectorPlan | dict | None") -> list[Any]:
+    """Возвращает все элементы по селектору с fallback CSS→XPath→JSON.
 
-    if hasattr(node, "select"):
-        return node
-    return BeautifulSoup(str(node), "html.parser")
-
-
-def _json_query(data: Any, path: str):
-    if not path:
-        return data
-    parts = path.split(".")
-    cur = data
-    for p in parts:
-        if isinstance(cur, dict):
-            cur = cur.get(p)
-        elif isinstance(cur, list):
-            try:
-                cur = cur[int(p)]
-            except Exception:
-                return None
-        else:
-            return None
-    return cur
-
-
-def select_all(node: Any, selector: dict) -> list[Any]:
-    """Возвращает все элементы по селектору с fallback CSS→XPath→JSON."""
-    soup = _to_soup(node)
-    css = selector.get("css") if selector else None
-    if css:
-        els = soup.select(css)
-        if els:
-            return els
-
-    xpath = selector.get("xpath") if selector else None
-    if xpath and etree is not None:
-        try:
-            tree = etree.HTML(str(node))
-            els = tree.xpath(xpath)
-            if els:
-                from bs4 import BeautifulSoup
-
-                return [
-                    BeautifulSoup(etree.tostring(e, encoding="unicode"), "html.parser")
-                    for e in els
-                ]
-        except Exception:
-            pass
-
-    json_path = selector.get("json") if selector else None
-    if json_path:
-        results = []
-        for script in soup.find_all("script"):
-            try:
-                data = json.loads(script.string or "")
-            except Exception:
-                continue
-            value = _json_query(data, json_path)
-            if value is not None:
-                results.append(value)
-        if results:
-            return results
-
-    return []
-
-
-def select_one(node: Any, selector: dict) -> Any:
+    Все три вида запросов выполняются по одному дереву ``node`` без
+    сериализации и повторного разбора; dict-селекторы компилируются в
+    :class:`SelectorPlan` и кэшируются.
+    """
+    return plan_for(selector).select_all(_to_node(node))
+
+
+def select_one(node: Any, selector: "SelectorPlan | dict | None") -> Any:
     """Возвращает первый элемент по селектору с fallback."""
     els = select_all(node, selector)
     return els[0] if els else None
@@ -0,0 +1,278 @@
+"""Движки разбора HTML для адаптеров.
+
+``bs4`` — BeautifulSoup с ``html.parser`` (по умолчанию), ``lxml`` —
+``lxml.html`` с cssselect. Узлы lxml оборачиваются в :class:`LxmlNode`,
+который повторяет используемое адаптерами подмножество API ``bs4.Tag``.
+
+Оба вида узлов отвечают на CSS, XPath и JSON-запросы по своему дереву без
+сериализации в строку: для XPath по дереву bs4 один раз на документ
+строится зеркало в lxml (:class:`SoupMirror`), найденные элементы
+возвращаются исходными тегами bs4.
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Any, Iterator
+
+from bs4.element import NavigableString, PreformattedString, Tag
+
+try:  # optional lxml engine
+    import lxml.html as lxml_html
+    from lxml import etree
+except Exception:  # pragma: no cover - lxml may be missing
+    lxml_html = None
+    etree = None
+
+try:
+    from cssselect import HTMLTranslator
+except Exception:  # pragma: no cover - cssselect may be missing
+    HTMLTranslator = None
+
+ENGINES = ("bs4", "lxml")
+
+# текст этих тегов bs4 не включает в get_text
+_SKIP_TEXT = frozenset(("script", "style", "template"))
+# управляющие символы, которые lxml не принимает в тексте и атрибутах
+_NON_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def lxml_available() -> bool:
+    return lxml_html is not None and HTMLTranslator is not None
+
+
+@lru_cache(maxsize=256)
+def css_xpath(css: str):
+    """CSS-селектор, скомпилированный в XPath по потомкам узла (как в bs4)."""
+    return etree.XPath(HTMLTranslator().css_to_xpath(css, prefix="descendant::"))
+
+
+@lru_cache(maxsize=512)
+def compile_xpath(path: str, is_root: bool = False):
+    """Компилирует XPath; абсолютный путь от карточки ищет внутри неё."""
+    if path.startswith("/") and not is_root:
+        path = "." + path
+    return etree.XPath(path)
+
+
+def _is_element(el: Any) -> bool:
+    return isinstance(el.tag, str)
+
+
+class LxmlNode:
+    """Элемент ``lxml.html`` с интерфейсом, совместимым с ``bs4.Tag``."""
+
+    __slots__ = ("el",)
+
+    def __init__(self, el) -> None:
+        self.el = el
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, LxmlNode) and other.el is self.el
+
+    def __hash__(self) -> int:
+        return id(self.el)
+
+    def __repr__(self) -> str:
+        return f"<LxmlNode {self.name}>"
+
+    @property
+    def name(self) -> str:
+        return self.el.tag
+
+    @property
+    def attrs(self) -> dict:
+        return dict(self.el.attrib)
+
+    @property
+    def string(self) -> str | None:
+        if len(self.el):
+            return None
+        return self.el.text
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.el.get(key, default)
+
+    def __getitem__(self, key: str) -> str:
+        value = self.el.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def _strings(self, el) -> Iterator[str]:
+        if el.text and el.tag not in _SKIP_TEXT:
+            yield el.text
+        for child in el:
+            if _is_element(child) and child.tag not in _SKIP_TEXT:
+                yield from self._strings(child)
+            if child.tail:
+                yield child.tail
+
+    def get_text(self, separator: str = "", strip: bool = False) -> str:
+        strings = self._strings(self.el)
+        if strip:
+            strings = (s.strip() for s in strings)
+            strings = (s for s in strings if s)
+        return separator.join(strings)
+
+    @property
+    def is_root(self) -> bool:
+        return self.el.getparent() is None
+
+    def select(self, css: str) -> list["LxmlNode"]:
+        return self.evaluate(css_xpath(css))
+
+    def select_one(self, css: str) -> "LxmlNode | None":
+        found = css_xpath(css)(self.el)
+        return LxmlNode(found[0]) if found else None
+
+    def xpath(self, path: str) -> list[Any]:
+        return self.evaluate(compile_xpath(path, self.is_root))
+
+    def evaluate(self, compiled) -> list[Any]:
+        """Выполняет скомпилированный XPath от этого узла."""
+        return [LxmlNode(e) if hasattr(e, "tag") else e for e in compiled(self.el)]
+
+    def scripts(self) -> Iterator[str | None]:
+        for el in self.el.iterdescendants("script"):
+            yield el.text
+
+    def _match(self, el, name: Any, attrs: dict) -> bool:
+        if callable(name):
+            return bool(name(LxmlNode(el)))
+        if name is not None and el.tag != name:
+            return False
+        return all(el.get(k) == v for k, v in attrs.items())
+
+    def find(self, name: Any = None, **attrs: str) -> "LxmlNode | None":
+        for el in self.el.iterdescendants():
+            if _is_element(el) and self._match(el, name, attrs):
+                return LxmlNode(el)
+        return None
+
+    def find_all(self, name: Any = None, **attrs: str) -> list["LxmlNode"]:
+        return [
+            LxmlNode(el)
+            for el in self.el.iterdescendants()
+            if _is_element(el) and self._match(el, name, attrs)
+        ]
+
+    @property
+    def parent(self) -> "LxmlNode | None":
+        parent = self.el.getparent()
+        return LxmlNode(parent) if parent is not None else None
+
+    def find_next_siblings(self, limit: int | None = None) -> list["LxmlNode"]:
+        found = []
+        sib = self.el.getnext()
+        while sib is not None and (limit is None or len(found) < limit):
+            if _is_element(sib):
+                found.append(LxmlNode(sib))
+            sib = sib.getnext()
+        return found
+
+    def _next_elements(self) -> Iterator[Any]:
+        # порядок документа после открывающего тега: потомки, затем всё следующее
+        yield from self.el.iterdescendants()
+        cur = self.el
+        while cur is not None:
+            sib = cur.getnext()
+            while sib is not None:
+                yield from sib.iter()
+                sib = sib.getnext()
+            cur = cur.getparent()
+
+    def find_next(self, name: Any = None, **attrs: str) -> "LxmlNode | None":
+        for el in self._next_elements():
+            if _is_element(el) and self._match(el, name, attrs):
+                return LxmlNode(el)
+        return None
+
+
+def parse_lxml(html: str) -> LxmlNode:
+    """Разбирает страницу в дерево ``lxml.html`` и возвращает корень."""
+    try:
+        try:
+            root = lxml_html.document_fromstring(html)
+        except ValueError:
+            # строки с XML-декларацией кодировки lxml принимает только байтами
+            root = lxml_html.document_fromstring(html.encode("utf-8"))
+    except etree.ParserError:
+        root = lxml_html.document_fromstring("<html><body></body></html>")
+    return LxmlNode(root)
+
+
+class SoupMirror:
+    """Копия дерева bs4 в элементах lxml для XPath-запросов.
+
+    Строится обходом уже разобранного дерева, без ``str()`` и повторного
+    парсинга, и хранит соответствие элементов и тегов в обе стороны.
+    """
+
+    __slots__ = ("root", "_elements", "_tags")
+
+    def __init__(self, soup: Tag) -> None:
+        self._elements: dict[int, Any] = {}
+        self._tags: dict[Any, Tag] = {}
+        self.root = etree.Element("root")
+        self._elements[id(soup)] = self.root
+        self._tags[self.root] = soup
+        stack = [(soup, self.root)]
+        while stack:
+            tag, el = stack.pop()
+            last = None
+            for child in tag.contents:
+                if isinstance(child, Tag):
+                    sub = self._element(el, child)
+                    stack.append((child, sub))
+                    last = sub
+                elif isinstance(child, NavigableString) and not isinstance(
+                    child, PreformattedString
+                ):
+                    text = _NON_XML.sub("", child)
+                    if last is None:
+                        el.text = (el.text or "") + text
+                    else:
+                        last.tail = (last.tail or "") + text
+
+    def _element(self, parent, tag: Tag):
+        try:
+            el = etree.SubElement(parent, tag.name)
+        except ValueError:
+            el = etree.SubElement(parent, "invalid")
+        for key, value in tag.attrs.items():
+            if isinstance(value, (list, tuple)):
+                value = " ".join(value)
+            try:
+                el.set(key, _NON_XML.sub("", value))
+            except (ValueError, TypeError):
+                continue
+        self._elements[id(tag)] = el
+        self._tags[el] = tag
+        return el
+
+    @classmethod
+    def of(cls, tag: Tag) -> "SoupMirror":
+        """Зеркало документа, которому принадлежит ``tag`` (строится один раз)."""
+        top = tag
+        while top.parent is not None:
+            top = top.parent
+        mirror = getattr(top, "_xpath_mirror", None)
+        if mirror is None:
+            mirror = cls(top)
+            top._xpath_mirror = mirror
+        return mirror
+
+    def xpath(self, tag: Tag, path: str) -> list[Any]:
+        # корень зеркала — служебный элемент, поэтому путь всегда от узла
+        return self.evaluate(tag, compile_xpath(path, False))
+
+    def evaluate(self, tag: Tag, compiled) -> list[Any]:
+        """Выполняет скомпилированный XPath от зеркала ``tag``."""
+        return [
+            self._tags.get(e, e) if hasattr(e, "tag") else e
+            for e in compiled(self._elements[id(tag)])
+        ]
@@ -1,9 +1,11 @@
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 import re
 from ....schemas import OfferRaw
 from ....pricing import compute_final_price as compute_final_price_common
-from .. import get_selectors, select_one, select_all
+from ....config import settings
+from .. import Document, as_document, get_selectors, select_one, select_all
+from ..promo import extract_features
+from ..state import element_states, find_values, strings
 from ... import logger
 
 GEOID_TO_CITY = {
@@ -26,16 +28,17 @@ def region_cookies(geoid: str) -> list[dict[str, str]]:
     ]
 
 
-def city_from_html(html: str) -> str | None:
+def city_from_html(html: str | Document) -> str | None:
     """Извлекает название города из HTML шапки сайта."""
-    soup = BeautifulSoup(html, "html.parser")
+    doc = as_document(html, "market")
+    soup = doc.root
     el = soup.select_one("[data-autotest-id='region']") or soup.select_one(
         "[data-zone-name='region']"
     )
     return el.get_text(strip=True) if el else None
 
 
-def ensure_region(html: str, geoid: str) -> bool:
+def ensure_region(html: str | Document, geoid: str) -> bool:
     """Проверяет, что отображаемый город соответствует geoid."""
     expected = GEOID_TO_CITY.get(geoid)
     if not expected:
@@ -50,10 +53,92 @@ def _extract_price(text: str | None):
     digits = "".join(ch for ch in text if ch.isdigit())
     return int(digits) if digits else None
 
-def parse_listing(html: str, geoid: str | None = None) -> list[OfferRaw]:
-    """Парсит листинг Яндекс Маркета."""
-    soup = BeautifulSoup(html, "html.parser")
+def _make_offer(
+    url: str, title: str, price: int, img: str | None, text_block: str, geoid: str | None
+) -> OfferRaw:
+    """Собирает оффер листинга, определяя промо и доставку по тексту карточки."""
+    features = extract_features(text_block)
+
+    return OfferRaw(
+        source="market",
+        title=title[:200],
+        url=url,
+        img=img,
+        price=price,
+        **features._asdict(),
+        geoid=geoid
+    )
+
+
+def _state_collections(doc: Document) -> dict[str, dict]:
+    """Объединённые ``collections`` из JSON-блоков apiary."""
+    merged: dict[str, dict] = {}
+    for tag in ("noframes", "script"):
+        for state in element_states(doc.html, tag, "apiary"):
+            for collections in find_values(state, "collections", limit=100):
+                if not isinstance(collections, dict):
+                    continue
+                for name, entries in collections.items():
+                    if isinstance(entries, dict):
+                        merged.setdefault(name, {}).update(entries)
+    return merged
+
+
+def _state_price(offer: dict) -> int | None:
+    prices = offer.get("prices") or offer.get("price")
+    value = prices.get("value") if isinstance(prices, dict) else prices
+    if isinstance(value, (int, float)):
+        return int(value)
+    return _extract_price(value) if isinstance(value, str) else None
+
+
+def _state_image(entry: dict) -> str | None:
+    for pictures in (entry.get("pictures"), entry.get("images")):
+        if not isinstance(pictures, list) or not pictures:
+            continue
+        pic = pictures[0]
+        url = (pic.get("original") or {}).get("url") if isinstance(pic, dict) else pic
+        if isinstance(url, str) and url:
+            return urljoin("https:", url) if url.startswith("//") else urljoin(BASE, url)
+    return None
+
+
+def listing_from_state(doc: Document, geoid: str | None = None) -> list[OfferRaw]:
+    """Парсит листинг из коллекций apiary (product/offer), без обхода DOM."""
+    collections = doc.memo("market_state", _state_collections)
+    products = collections.get("product", {})
     items: list[OfferRaw] = []
+    seen = set()
+    for offer in collections.get("offer", {}).values():
+        if not isinstance(offer, dict):
+            continue
+        product_id = str(offer.get("productId") or "")
+        product = products.get(product_id)
+        if not isinstance(product, dict) or product_id in seen:
+            continue
+        slug = product.get("slug")
+        price = _state_price(offer)
+        if not slug or price is None:
+            continue
+        seen.add(product_id)
+        titles = product.get("titles") or {}
+        title = (titles.get("raw") if isinstance(titles, dict) else None) or "Товар Маркета"
+        img = _state_image(product) or _state_image(offer)
+        text_block = " ".join(strings(offer)).lower()
+        url = urljoin(BASE, f"/product--{slug}/{product_id}")
+        items.append(_make_offer(url, title, price, img, text_block, geoid))
+    return items
+
+
+def parse_listing(html: str | Document, geoid: str | None = None) -> list[OfferRaw]:
+    """Парсит листинг Яндекс Маркета: из коллекций apiary, иначе по DOM."""
+    doc = as_document(html, "market")
+    if settings.PARSER_STATE_FAST_PATH:
+        items = listing_from_state(doc, geoid)
+        if items:
+            return items
+    soup = doc.root
+    items = []
 
     selectors = get_selectors("market").get("listing", {})
     card_sel = selectors.get("card", {"css": "article[data-autotest-id='product-snippet']"})
@@ -102,46 +187,13 @@ def parse_listing(html: str, geoid: str | None = None) -> list[OfferRaw]:
                 img = urljoin(BASE, str(img_el))
 
         text_block = card.get_text(" ", strip=True).lower()
-
-        promo_flags: dict[str, int | bool] = {}
-        m_coupon = re.search(r"купон.*?(\d+)", text_block)
-        if m_coupon:
-            try:
-                promo_flags["instant_coupon"] = int(m_coupon.group(1))
-            except Exception:
-                pass
-
-        shipping_days = None
-        m_ship = re.search(r"(\d+)[^\d]{0,5}дн", text_block)
-        if m_ship:
-            try:
-                shipping_days = int(m_ship.group(1))
-            except Exception:
-                pass
-
-        shipping_included = "бесп" in text_block
-        price_in_cart = "корзин" in text_block
-        subscription = "подпис" in text_block
-
-        items.append(OfferRaw(
-            source="market",
-            title=title[:200],
-            url=url,
-            img=img,
-            price=price_value,
-            shipping_days=shipping_days,
-            shipping_included=shipping_included,
-            promo_flags=promo_flags,
-            price_in_cart=price_in_cart,
-            subscription=subscription,
-            geoid=geoid
-        ))
+        items.append(_make_offer(url, title, price_value, img, text_block, geoid))
     return items
 
 
-def parse_product(html: str, geoid: str | None = None) -> OfferRaw:
+def parse_product(html: str | Document, geoid: str | None = None) -> OfferRaw:
     """Парсит страницу товара Маркета."""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = as_document(html, "market").root
     selectors = get_selectors("market").get("product", {})
 
     link = soup.find("link", rel="canonical")
@@ -168,25 +220,7 @@ def parse_product(html: str, geoid: str | None = None) -> OfferRaw:
         img = None
 
     text_block = soup.get_text(" ", strip=True).lower()
-    promo_flags: dict[str, int | bool] = {}
-    m_coupon = re.search(r"купон.*?(\d+)", text_block)
-    if m_coupon:
-        try:
-            promo_flags["instant_coupon"] = int(m_coupon.group(1))
-        except Exception:
-            pass
-
-    shipping_days = None
-    m_ship = re.search(r"(\d+)[^\d]{0,5}дн", text_block)
-    if m_ship:
-        try:
-            shipping_days = int(m_ship.group(1))
-        except Exception:
-            pass
-
-    shipping_included = "бесп" in text_block
-    price_in_cart = "корзин" in text_block
-    subscription = "подпис" in text_block
+    features = extract_features(text_block)
 
     offer = OfferRaw(
         source="market",
@@ -194,11 +228,7 @@ def parse_product(html: str, geoid: str | None = None) -> OfferRaw:
         url=url,
         img=img,
         price=price,
-        shipping_days=shipping_days,
-        shipping_included=shipping_included,
-        promo_flags=promo_flags,
-        price_in_cart=price_in_cart,
-        subscription=subscription,
+        **features._asdict(),
         geoid=geoid,
     )
     return offer
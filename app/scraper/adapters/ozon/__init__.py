@@ -1,13 +1,16 @@
 import json
 import os
 import re
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 
 from ....schemas import OfferRaw
 from ....pricing import compute_final_price as compute_final_price_common
-from .. import get_selectors, select_one, select_all
+from ....config import settings
+from .. import Document, as_document, get_selectors, select_one, select_all
+from ..promo import extract_features
+from ..state import attr_states, find_values, texts
 from ... import logger
+from observability.metrics import price_locator_hits
 
 GEOID_TO_CITY = {
     "213": "Москва",
@@ -35,21 +38,22 @@ def region_cookies(geoid: str) -> list[dict[str, str]]:
     ]
 
 
-def city_from_html(html: str) -> str | None:
+def city_from_html(html: str | Document) -> str | None:
     """Извлекает название города из HTML шапки сайта."""
-    soup = BeautifulSoup(html, "html.parser")
+    doc = as_document(html, "ozon")
+    soup = doc.root
     el = soup.select_one("[data-widget='headerLocation']") or soup.select_one(
         "[data-widget='regionSelect']"
     )
     if el:
         return el.get_text(strip=True)
-    m = re.search(r"Товары для города\s+([\w\-\s]+)", html)
+    m = re.search(r"Товары для города\s+([\w\-\s]+)", doc.html)
     if m:
         return m.group(1).strip()
     return None
 
 
-def ensure_region(html: str, geoid: str) -> bool:
+def ensure_region(html: str | Document, geoid: str) -> bool:
     """Проверяет, что отображаемый город соответствует geoid."""
     expected = GEOID_TO_CITY.get(geoid)
     if not expected:
@@ -57,16 +61,144 @@ def ensure_region(html: str, geoid: str) -> bool:
     city = city_from_html(html)
     return city == expected
 
+# цена с разрядами через пробел: «1 234 ₽», но не «5 1 234 ₽»
+_PRICE_TEXT = re.compile(r"(\d{1,3}(?:[\s\u2009]\d{3})+|\d+)\s*₽")
+
+
 def _extract_price(text: str | None):
     if not text:
         return None
     digits = "".join(ch for ch in text if ch.isdigit())
     return int(digits) if digits else None
 
-def parse_listing(html: str) -> list[OfferRaw]:
-    """Парсит листинг Ozon."""
-    soup = BeautifulSoup(html, "html.parser")
+def _price_in(node) -> int | None:
+    m = _PRICE_TEXT.search(node.get_text(" "))
+    return _extract_price(m.group(1)) if m else None
+
+
+def _is_card_link(tag) -> bool:
+    return getattr(tag, "name", None) == "a" and "/product/" in (tag.get("href") or "")
+
+
+def locate_price(card, depth: int = 2, window: int = 3) -> tuple[int | None, str]:
+    """Ищет цену рядом с карточкой, когда селектор цены не сработал.
+
+    Сначала текст самой карточки, затем до ``window`` следующих соседей на
+    каждом из ``depth`` уровней предков. Соседняя карточка останавливает
+    поиск, чтобы не взять её цену. Возвращает (цена, уровень).
+    """
+    price = _price_in(card)
+    if price is not None:
+        return price, "card"
+    node = card
+    for _ in range(depth):
+        for sib in node.find_next_siblings(limit=window):
+            if _is_card_link(sib) or sib.find(_is_card_link) is not None:
+                return None, "miss"
+            price = _price_in(sib)
+            if price is not None:
+                return price, "siblings"
+        node = node.parent
+        if node is None or node.parent is None:
+            break
+    return None, "miss"
+
+
+def _make_offer(
+    url: str, title: str | None, price: int, img: str | None, text_block: str
+) -> OfferRaw:
+    """Собирает оффер листинга, определяя промо и доставку по тексту карточки."""
+    features = extract_features(text_block)
+
+    return OfferRaw(
+        source="ozon",
+        title=title[:200] if title else "Товар Ozon",
+        url=url,
+        img=img,
+        price=price,
+        **features._asdict(),
+        geoid=None
+    )
+
+
+def _state_items(doc: Document) -> list[dict]:
+    """Карточки из ``data-state`` виджетов ``state-searchResultsV2-*``."""
+    items: list[dict] = []
+    for state in attr_states(doc.html, "state-searchResultsV2"):
+        if isinstance(state, dict) and isinstance(state.get("items"), list):
+            items.extend(i for i in state["items"] if isinstance(i, dict))
+    return items
+
+
+def _state_title(item: dict) -> str | None:
+    fallback = None
+    for atoms in find_values(item, "mainState"):
+        for atom in atoms if isinstance(atoms, list) else ():
+            text = (atom.get("textAtom") or {}).get("text") if isinstance(atom, dict) else None
+            if not isinstance(text, str):
+                continue
+            if atom.get("id") == "name":
+                return text
+            fallback = fallback or text
+    return fallback
+
+
+def _state_price(item: dict) -> int | None:
+    for price_v2 in find_values(item, "priceV2"):
+        prices = price_v2.get("price") if isinstance(price_v2, dict) else None
+        if not isinstance(prices, list):
+            continue
+        prices = [p for p in prices if isinstance(p, dict)]
+        current = next((p for p in prices if p.get("textStyle") == "PRICE"), None)
+        current = current or (prices[0] if prices else None)
+        price = _extract_price(current.get("text")) if current else None
+        if price is not None:
+            return price
+    return None
+
+
+def _state_image(item: dict) -> str | None:
+    for image in find_values(item, "image"):
+        if isinstance(image, dict) and isinstance(image.get("link"), str):
+            return urljoin(BASE, image["link"])
+    return None
+
+
+def listing_from_state(doc: Document) -> list[OfferRaw]:
+    """Парсит листинг из встроенного состояния виджета, без обхода DOM."""
     items: list[OfferRaw] = []
+    seen = set()
+    for item in doc.memo("ozon_state", _state_items):
+        link = (item.get("action") or {}).get("link")
+        if not isinstance(link, str) or "/product/" not in link:
+            continue
+        url = urljoin(BASE, link)
+        if url in seen:
+            continue
+        price = _state_price(item)
+        if price is None:
+            continue
+        seen.add(url)
+        text_block = " ".join(t.strip() for t in texts(item)).lower()
+        items.append(_make_offer(url, _state_title(item), price, _state_image(item), text_block))
+    return items
+
+
+def parse_listing(
+    html: str | Document, tiers: dict[str, int] | None = None
+) -> list[OfferRaw]:
+    """Парсит листинг Ozon: из встроенного состояния, иначе по DOM.
+
+    Если передан ``tiers``, уровни поиска цены считаются в нём, а не в
+    ``price_locator_hits`` — так счётчики переносятся из процесса пула разбора.
+    """
+    doc = as_document(html, "ozon")
+    if settings.PARSER_STATE_FAST_PATH:
+        items = listing_from_state(doc)
+        if items:
+            return items
+    soup = doc.root
+    items = []
 
     selectors = get_selectors("ozon").get("listing", {})
     container_sel = selectors.get("container", {"css": '[data-widget="searchResultsV2"]'})
@@ -102,13 +234,15 @@ def parse_listing(html: str) -> list[OfferRaw]:
         if price_el is not None:
             text = price_el.get_text() if hasattr(price_el, "get_text") else str(price_el)
             price = _extract_price(text)
+        tier = "selector"
         if price is None:
-            # fallback к поиску по тексту
-            price_el = a.find_next(
-                lambda tag: tag.name in ("span", "div")
-                and re.search(r"\d[\d\s]*₽", tag.get_text())
+            price, tier = locate_price(
+                a, settings.OZON_PRICE_FALLBACK_DEPTH, settings.OZON_PRICE_FALLBACK_WINDOW
             )
-            price = _extract_price(price_el.get_text() if price_el else "")
+        if tiers is None:
+            price_locator_hits.labels(site="ozon", tier=tier).inc()
+        else:
+            tiers[tier] = tiers.get(tier, 0) + 1
         if price is None:
             logger.warning("пропуск карточки %s: отсутствует цена", url)
             continue
@@ -121,48 +255,14 @@ def parse_listing(html: str) -> list[OfferRaw]:
             else:
                 img = urljoin(BASE, str(img_el))
 
-        # простые эвристики для купонов и доставки
         text_block = a.get_text(" ", strip=True).lower()
-
-        promo_flags: dict[str, int | bool] = {}
-        m_coupon = re.search(r"купон.*?(\d+)", text_block)
-        if m_coupon:
-            try:
-                promo_flags["instant_coupon"] = int(m_coupon.group(1))
-            except Exception:
-                pass
-
-        shipping_days = None
-        m_ship = re.search(r"(\d+)[^\d]{0,5}дн", text_block)
-        if m_ship:
-            try:
-                shipping_days = int(m_ship.group(1))
-            except Exception:
-                pass
-
-        shipping_included = "бесп" in text_block
-        price_in_cart = "корзин" in text_block
-        subscription = "подпис" in text_block
-
-        items.append(OfferRaw(
-            source="ozon",
-            title=title[:200] if title else "Товар Ozon",
-            url=url,
-            img=img,
-            price=price,
-            shipping_days=shipping_days,
-            promo_flags=promo_flags,
-            shipping_included=shipping_included,
-            price_in_cart=price_in_cart,
-            subscription=subscription,
-            geoid=None
-        ))
+        items.append(_make_offer(url, title, price, img, text_block))
     return items
 
 
-def parse_product(html: str) -> OfferRaw:
+def parse_product(html: str | Document) -> OfferRaw:
     """Парсит страницу товара Ozon."""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = as_document(html, "ozon").root
     selectors = get_selectors("ozon").get("product", {})
 
     link = soup.find("link", rel="canonical")
@@ -189,25 +289,7 @@ def parse_product(html: str) -> OfferRaw:
         img = None
 
     text_block = soup.get_text(" ", strip=True).lower()
-    promo_flags: dict[str, int | bool] = {}
-    m_coupon = re.search(r"купон.*?(\d+)", text_block)
-    if m_coupon:
-        try:
-            promo_flags["instant_coupon"] = int(m_coupon.group(1))
-        except Exception:
-            pass
-
-    shipping_days = None
-    m_ship = re.search(r"(\d+)[^\d]{0,5}дн", text_block)
-    if m_ship:
-        try:
-            shipping_days = int(m_ship.group(1))
-        except Exception:
-            pass
-
-    shipping_included = "бесп" in text_block
-    price_in_cart = "корзин" in text_block
-    subscription = "подпис" in text_block
+    features = extract_features(text_block)
 
     offer = OfferRaw(
         source="ozon",
@@ -215,11 +297,7 @@ def parse_product(html: str) -> OfferRaw:
         url=url,
         img=img,
         price=price,
-        shipping_days=shipping_days,
-        promo_flags=promo_flags,
-        shipping_included=shipping_included,
-        price_in_cart=price_in_cart,
-        subscription=subscription,
+        **features._asdict(),
         geoid=None,
     )
     return offer
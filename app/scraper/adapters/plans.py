@@ -0,0 +1,148 @@
+"""Скомпилированные планы селекторов из ``selectors.yaml``.
+
+План хранит заранее разобранный CSS (soupsieve и XPath для lxml),
+скомпилированные ``etree.XPath`` и разбитый JSON-путь, так что на карточку
+не тратится разбор селектора. План запоминает, какой уровень fallback
+сработал последним, и начинает с него: после смены вёрстки неудачный CSS не
+повторяется на каждой карточке.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Iterable
+
+import soupsieve
+
+from .. import logger
+from .engines import LxmlNode, SoupMirror, compile_xpath, css_xpath, etree
+from .state import loads
+
+TIERS = ("css", "xpath", "json")
+
+
+def json_walk(data: Any, parts: Iterable[str]):
+    cur = data
+    for p in parts:
+        if isinstance(cur, dict):
+            cur = cur.get(p)
+        elif isinstance(cur, list):
+            try:
+                cur = cur[int(p)]
+            except Exception:
+                return None
+        else:
+            return None
+    return cur
+
+
+def _scripts(node: Any):
+    if isinstance(node, LxmlNode):
+        return node.scripts()
+    return (script.string for script in node.find_all("script"))
+
+
+class SelectorPlan:
+    """Скомпилированный селектор поля с fallback CSS→XPath→JSON."""
+
+    __slots__ = (
+        "name", "css", "xpath", "json", "tiers",
+        "_css_soup", "_css_lxml", "_xpath_rel", "_xpath_root", "_json_parts", "last_tier",
+    )
+
+    def __init__(self, spec: dict, name: str = "") -> None:
+        self.name = name
+        self.css = spec.get("css") or None
+        self.xpath = spec.get("xpath") or None
+        self.json = spec.get("json") or None
+        self._css_soup = soupsieve.compile(self.css) if self.css else None
+        self._css_lxml = None
+        self._xpath_rel = self._xpath_root = None
+        if self.xpath and etree is not None:
+            try:
+                self._xpath_rel = compile_xpath(self.xpath, False)
+                self._xpath_root = compile_xpath(self.xpath, True)
+            except etree.XPathSyntaxError:
+                logger.warning("Некорректный XPath в селекторе %s: %s", name, self.xpath)
+        self._json_parts = tuple(self.json.split(".")) if self.json else ()
+        self.tiers = tuple(
+            t for t, ok in zip(TIERS, (self.css, self._xpath_rel, self.json)) if ok
+        )
+        self.last_tier: str | None = None
+
+    def __bool__(self) -> bool:
+        return bool(self.tiers)
+
+    def __repr__(self) -> str:
+        return f"<SelectorPlan {self.name or self.tiers}>"
+
+    def _run(self, tier: str, node: Any) -> list[Any]:
+        if tier == "css":
+            if isinstance(node, LxmlNode):
+                if self._css_lxml is None:
+                    self._css_lxml = css_xpath(self.css)
+                return node.evaluate(self._css_lxml)
+            return self._css_soup.select(node)
+        if tier == "xpath":
+            try:
+                if isinstance(node, LxmlNode):
+                    return node.evaluate(self._xpath_root if node.is_root else self._xpath_rel)
+                return SoupMirror.of(node).evaluate(node, self._xpath_rel)
+            except Exception:
+                return []
+        results = []
+        for text in _scripts(node):
+            try:
+                data = loads(text or "")
+            except Exception:
+                continue
+            value = json_walk(data, self._json_parts)
+            if value is not None:
+                results.append(value)
+        return results
+
+    def select_all(self, node: Any) -> list[Any]:
+        """Все элементы по первому сработавшему уровню, начиная с последнего удачного."""
+        last = self.last_tier
+        order = self.tiers
+        if last is not None and last != order[0]:
+            order = (last,) + tuple(t for t in order if t != last)
+        for tier in order:
+            found = self._run(tier, node)
+            if found:
+                if tier != last:
+                    logger.debug("Селектор %s: сработал уровень %s", self.name, tier)
+                    self.last_tier = tier
+                return found
+        return []
+
+
+EMPTY = SelectorPlan({})
+
+
+@lru_cache(maxsize=256)
+def _adhoc(css: str | None, xpath: str | None, json_path: str | None) -> SelectorPlan:
+    return SelectorPlan({"css": css, "xpath": xpath, "json": json_path})
+
+
+def plan_for(selector: SelectorPlan | dict | None) -> SelectorPlan:
+    """План для селектора: готовый план или скомпилированный (и закэшированный) dict."""
+    if isinstance(selector, SelectorPlan):
+        return selector
+    if not selector:
+        return EMPTY
+    return _adhoc(selector.get("css"), selector.get("xpath"), selector.get("json"))
+
+
+def compile_selectors(raw: dict, site: str) -> dict:
+    """Превращает раздел ``selectors.yaml`` сайта в {раздел: {поле: SelectorPlan}}."""
+    plans: dict = {}
+    for section, fields in raw.items():
+        if isinstance(fields, dict):
+            plans[section] = {
+                field: SelectorPlan(spec, f"{site}.{section}.{field}")
+                for field, spec in fields.items()
+                if isinstance(spec, dict)
+            }
+        else:
+            plans[section] = fields
+    return plans
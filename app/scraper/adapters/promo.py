@@ -0,0 +1,69 @@
+"""Признаки промо и доставки по тексту карточки, общие для всех адаптеров.
+
+Текст сканируется от ключевых слов (поиск подстроки выполняется на C):
+купон — первое число после «купон» в той же строке, срок доставки — число
+не дальше пяти символов перед «дн». Регулярки не перебирают все числа
+текста и не откатываются по всему блоку.
+"""
+from __future__ import annotations
+
+import re
+from typing import NamedTuple
+
+_DIGITS = re.compile(r"\d+")
+# между числом и «дн» не больше пяти нецифровых символов
+_DAYS_GAP = 5
+
+
+class PromoFeatures(NamedTuple):
+    promo_flags: dict[str, int | bool]
+    shipping_days: int | None
+    shipping_included: bool
+    price_in_cart: bool
+    subscription: bool
+
+
+def _coupon(text: str) -> int | None:
+    # первое число после «купон» в пределах строки
+    pos = text.find("купон")
+    while pos >= 0:
+        eol = text.find("\n", pos)
+        m = _DIGITS.search(text, pos + 5, len(text) if eol < 0 else eol)
+        if m:
+            return int(m.group())
+        pos = text.find("купон", pos + 5)
+    return None
+
+
+def _shipping_days(text: str) -> int | None:
+    pos = text.find("дн")
+    while pos >= 0:
+        end = pos
+        stop = max(0, pos - _DAYS_GAP)
+        while end > stop and not text[end - 1].isdecimal():
+            end -= 1
+        if end > 0 and text[end - 1].isdecimal():
+            start = end - 1
+            while start > 0 and text[start - 1].isdecimal():
+                start -= 1
+            return int(text[start:end])
+        pos = text.find("дн", pos + 2)
+    return None
+
+
+def extract_features(text_block: str) -> PromoFeatures:
+    """Купон, срок и бесплатность доставки, цена в корзине и подписка.
+
+    ``text_block`` — текст карточки в нижнем регистре.
+    """
+    promo_flags: dict[str, int | bool] = {}
+    coupon = _coupon(text_block) if "купон" in text_block else None
+    if coupon is not None:
+        promo_flags["instant_coupon"] = coupon
+    return PromoFeatures(
+        promo_flags=promo_flags,
+        shipping_days=_shipping_days(text_block) if "дн" in text_block else None,
+        shipping_included="бесп" in text_block,
+        price_in_cart="корзин" in text_block,
+        subscription="подпис" in text_block,
+    )
@@ -0,0 +1,118 @@
+"""Извлечение встроенного JSON-состояния страницы без обхода DOM.
+
+Сайты отдают данные листинга готовой структурой: Ozon — в атрибуте
+``data-state`` виджета ``state-searchResultsV2-*``, Маркет — в JSON-блоках
+apiary (``<noframes data-apiary>`` / ``<script type="application/json">``).
+Блок находится точечным поиском по строке, декодируется один раз (orjson,
+если установлен) и кэшируется в :class:`~app.scraper.adapters.Document`.
+"""
+from __future__ import annotations
+
+import html as html_lib
+import json
+import re
+from collections import deque
+from typing import Any, Iterator
+
+try:  # optional fast JSON decoder
+    import orjson
+except Exception:  # pragma: no cover - orjson may be missing
+    orjson = None
+
+_TAG = re.compile(r"<[^\s>/]+")
+_ATTR = re.compile(r"""\s+([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?""")
+
+
+def loads(text: str | bytes) -> Any:
+    """Декодирует JSON, используя orjson при наличии."""
+    if orjson is not None:
+        # orjson не принимает подклассы str (например, NavigableString)
+        return orjson.loads(text if type(text) in (str, bytes) else str(text))
+    return json.loads(text)
+
+
+def _tag_attrs(html: str, start: int) -> dict[str, str]:
+    """Атрибуты открывающего тега, начинающегося в позиции ``start``."""
+    m = _TAG.match(html, start)
+    if not m:
+        return {}
+    attrs: dict[str, str] = {}
+    pos = m.end()
+    while True:
+        m = _ATTR.match(html, pos)
+        if not m:
+            return attrs
+        attrs[m.group(1).lower()] = next((v for v in m.groups()[1:] if v is not None), "")
+        pos = m.end()
+
+
+def attr_states(html: str, id_prefix: str, attr: str = "data-state") -> Iterator[Any]:
+    """JSON из атрибута ``attr`` элементов с ``id``, начинающимся с ``id_prefix``."""
+    for m in re.finditer(r"""id\s*=\s*["']""" + re.escape(id_prefix), html):
+        start = html.rfind("<", 0, m.start())
+        if start < 0:
+            continue
+        raw = _tag_attrs(html, start).get(attr)
+        if not raw:
+            continue
+        try:
+            yield loads(html_lib.unescape(raw))
+        except ValueError:
+            continue
+
+
+def element_states(html: str, tag: str, marker: str) -> Iterator[Any]:
+    """JSON из тела элементов ``tag``, в открывающем теге которых есть ``marker``."""
+    pattern = re.compile(
+        rf"<{tag}\b[^>]*{re.escape(marker)}[^>]*>(.*?)</{tag}\s*>", re.S | re.I
+    )
+    for m in pattern.finditer(html):
+        body = m.group(1).strip()
+        if not body:
+            continue
+        try:
+            yield loads(body)
+        except ValueError:
+            try:
+                yield loads(html_lib.unescape(body))
+            except ValueError:
+                continue
+
+
+def find_values(data: Any, key: str, limit: int = 10_000) -> Iterator[Any]:
+    """Значения ключа ``key`` на любой глубине (обход в ширину с ограничением)."""
+    queue = deque([data])
+    seen = 0
+    while queue and seen < limit:
+        cur = queue.popleft()
+        seen += 1
+        if isinstance(cur, dict):
+            for k, v in cur.items():
+                if k == key:
+                    yield v
+                if isinstance(v, (dict, list)):
+                    queue.append(v)
+        elif isinstance(cur, list):
+            queue.extend(v for v in cur if isinstance(v, (dict, list)))
+
+
+def texts(data: Any) -> Iterator[str]:
+    """Все строки ``text`` внутри структуры — аналог ``get_text`` для карточки."""
+    for value in find_values(data, "text"):
+        if isinstance(value, str):
+            yield value
+
+
+def strings(data: Any, limit: int = 10_000) -> Iterator[str]:
+    """Все строковые значения внутри структуры."""
+    queue = deque([data])
+    seen = 0
+    while queue and seen < limit:
+        cur = queue.popleft()
+        seen += 1
+        if isinstance(cur, str):
+            yield cur
+        elif isinstance(cur, dict):
+            queue.extend(cur.values())
+        elif isinstance(cur, list):
+            queue.extend(cur)
@@ -0,0 +1,44 @@
+"""Профили блокировки лишних ресурсов при рендере.
+
+Адаптерам нужен только DOM и встроенное JSON-состояние: картинки, шрифты,
+медиа и счётчики аналитики при рендере не загружаются. Профиль сайта
+задаётся в ``RENDER_BLOCK_PROFILES`` по домену (ключи ``types``, ``urls``,
+``allow``) поверх общих ``RENDER_BLOCK_TYPES`` / ``RENDER_BLOCK_URLS``;
+``allow`` — подстроки URL, которые пропускаются всегда.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from ..config import settings
+from . import domain_setting
+
+
+@dataclass(frozen=True)
+class BlockProfile:
+    types: frozenset[str]
+    urls: tuple[str, ...]
+    allow: tuple[str, ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.types or self.urls)
+
+    def blocks(self, resource_type: str, url: str) -> bool:
+        # сам документ не блокируется никогда
+        if resource_type == "document":
+            return False
+        if resource_type not in self.types and not any(p in url for p in self.urls):
+            return False
+        return not any(p in url for p in self.allow)
+
+
+def profile_for(domain: str) -> BlockProfile:
+    """Профиль блокировки для домена с учётом настроек сайта."""
+    if not settings.RENDER_BLOCKING:
+        return BlockProfile(frozenset(), ())
+    site = domain_setting(settings.RENDER_BLOCK_PROFILES, domain, {})
+    return BlockProfile(
+        types=frozenset(site.get("types", settings.RENDER_BLOCK_TYPES)),
+        urls=tuple(site.get("urls", settings.RENDER_BLOCK_URLS)),
+        allow=tuple(site.get("allow", ())),
+    )
@@ -0,0 +1,126 @@
+"""Пул процессов браузера для RenderService.
+
+Вместо одного Chromium запускается несколько, и новый контекст создаётся в
+наименее загруженном по числу живых контекстов. Упавший браузер
+(``disconnected``) заменяется новым при следующем создании контекста, его
+контексты перестают считаться живыми. После ``max_pages`` страниц браузер
+выводится из ротации: сразу запускается замена, а старый закрывается, когда
+закроется последний его контекст.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from playwright.async_api import Browser, BrowserContext
+
+from observability.metrics import render_browser_events
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserSlot:
+    __slots__ = ("browser", "contexts", "pages", "dead", "draining")
+
+    def __init__(self, browser: Browser) -> None:
+        self.browser = browser
+        self.contexts = 0
+        self.pages = 0
+        self.dead = False
+        self.draining = False
+
+
+class BrowserPool:
+    def __init__(self, launch: Callable[[], Awaitable[Browser]], size: int, max_pages: int = 0) -> None:
+        if size < 1:
+            raise ValueError("size должен быть не меньше 1")
+        self.size = size
+        self.max_pages = max_pages
+        self._launch = launch
+        self.slots: list[BrowserSlot] = []
+        self._owner: dict[BrowserContext, BrowserSlot] = {}
+        self._lock = asyncio.Lock()
+
+    async def _spawn(self) -> BrowserSlot:
+        slot = BrowserSlot(await self._launch())
+        slot.browser.on("disconnected", lambda _: self._disconnected(slot))
+        render_browser_events.labels(event="launch").inc()
+        return slot
+
+    def _disconnected(self, slot: BrowserSlot) -> None:
+        if slot.draining or slot.dead:
+            return
+        slot.dead = True
+        render_browser_events.labels(event="crash").inc()
+        logger.warning("Браузер рендера упал, будет перезапущен")
+
+    async def start(self) -> None:
+        async with self._lock:
+            while len(self.slots) < self.size:
+                self.slots.append(await self._spawn())
+
+    async def _replace_dead(self) -> None:
+        for i, slot in enumerate(self.slots):
+            if slot.dead:
+                self.slots[i] = await self._spawn()
+
+    async def new_context(self, **kwargs: Any) -> BrowserContext:
+        """Контекст в наименее загруженном живом браузере."""
+        async with self._lock:
+            await self._replace_dead()
+            slot = min(self.slots, key=lambda s: s.contexts)
+            slot.contexts += 1
+        try:
+            ctx = await slot.browser.new_context(**kwargs)
+        except BaseException:
+            slot.contexts -= 1
+            raise
+        self._owner[ctx] = slot
+        ctx.on("close", lambda _: self._context_closed(ctx))
+        return ctx
+
+    def alive(self, ctx: BrowserContext) -> bool:
+        """Можно ли дальше использовать контекст (браузер жив и в ротации)."""
+        slot = self._owner.get(ctx)
+        return slot is not None and not slot.dead and not slot.draining
+
+    def _context_closed(self, ctx: BrowserContext) -> None:
+        slot = self._owner.pop(ctx, None)
+        if slot is None:
+            return
+        slot.contexts -= 1
+        if slot.draining and slot.contexts <= 0:
+            asyncio.ensure_future(self._retire(slot))
+
+    async def _retire(self, slot: BrowserSlot) -> None:
+        render_browser_events.labels(event="recycle").inc()
+        try:
+            await slot.browser.close()
+        except Exception:
+            logger.warning("Не удалось закрыть браузер рендера")
+
+    async def page_done(self, ctx: BrowserContext) -> bool:
+        """Учитывает страницу; True, если браузер контекста выведен из ротации."""
+        slot = self._owner.get(ctx)
+        if slot is None or slot.draining:
+            return False
+        slot.pages += 1
+        if not self.max_pages or slot.pages < self.max_pages:
+            return False
+        async with self._lock:
+            if slot in self.slots:
+                slot.draining = True
+                self.slots[self.slots.index(slot)] = await self._spawn()
+        return True
+
+    async def close(self) -> None:
+        async with self._lock:
+            slots, self.slots = self.slots, []
+        drained = {s for s in self._owner.values() if s.draining}
+        self._owner.clear()
+        for slot in [*slots, *drained]:
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
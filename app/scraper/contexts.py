@@ -0,0 +1,139 @@
+"""Пул браузерных контекстов по (домен, регион).
+
+Контекст сохраняет cookies и storage сайта между рендерами, поэтому их не
+нужно сбрасывать на каждую страницу. Пул ограничен по числу контекстов,
+включая создаваемые: при нехватке закрываются давно не использованные
+свободные контексты (LRU). Контекст пересоздаётся после ``max_pages``
+страниц, а также после ошибки рендера, чтобы не тянуть за собой состояние
+капчи или сломанную сессию. Свободные контексты, для которых ``alive``
+вернул False (браузер упал или выведен из ротации), закрываются.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+from playwright.async_api import BrowserContext
+
+from observability.metrics import render_context_events
+
+logger = logging.getLogger(__name__)
+
+
+class PooledContext:
+    __slots__ = ("key", "ctx", "pages")
+
+    def __init__(self, key: Hashable, ctx: BrowserContext) -> None:
+        self.key = key
+        self.ctx = ctx
+        self.pages = 0
+
+
+class ContextPool:
+    def __init__(
+        self,
+        capacity: int,
+        factory: Callable[[Hashable], Awaitable[BrowserContext]],
+        max_pages: int = 0,
+        alive: Callable[[BrowserContext], bool] | None = None,
+    ) -> None:
+        if capacity < 1:
+            raise ValueError("capacity должен быть не меньше 1")
+        self.capacity = capacity
+        self.max_pages = max_pages
+        self._factory = factory
+        self._alive = alive or (lambda ctx: True)
+        self._sem = asyncio.Semaphore(capacity)
+        self._idle: OrderedDict[Hashable, list[PooledContext]] = OrderedDict()
+        self._busy: set[PooledContext] = set()
+        # контексты в процессе создания: место под них занято до первого await
+        self._pending = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._busy) + self._pending + sum(len(v) for v in self._idle.values())
+
+    async def _close(self, entry: PooledContext, event: str) -> None:
+        render_context_events.labels(event=event).inc()
+        try:
+            await entry.ctx.close()
+        except Exception:
+            logger.warning("Не удалось закрыть контекст %s", entry.key)
+
+    async def _evict_lru(self) -> None:
+        key, entries = next(iter(self._idle.items()))
+        entry = entries.pop(0)
+        if not entries:
+            del self._idle[key]
+        await self._close(entry, "evict")
+
+    async def purge(self) -> None:
+        """Закрывает свободные контексты, которые больше нельзя использовать."""
+        for key in list(self._idle):
+            entries = self._idle[key]
+            dead = [e for e in entries if not self._alive(e.ctx)]
+            if not dead:
+                continue
+            entries[:] = [e for e in entries if e not in dead]
+            if not entries:
+                del self._idle[key]
+            for entry in dead:
+                await self._close(entry, "dead")
+
+    async def acquire(self, key: Hashable) -> PooledContext:
+        """Свободный контекст для ключа; создаёт новый, вытесняя LRU при нехватке."""
+        await self._sem.acquire()
+        try:
+            entries = self._idle.get(key)
+            if entries and not all(self._alive(e.ctx) for e in entries):
+                await self.purge()
+                entries = self._idle.get(key)
+            if entries:
+                entry = entries.pop()
+                if not entries:
+                    del self._idle[key]
+                render_context_events.labels(event="hit").inc()
+            else:
+                render_context_events.labels(event="miss").inc()
+                self._pending += 1
+                try:
+                    # занятых и создаваемых не больше capacity (семафор),
+                    # значит, пока пул переполнен, свободный для вытеснения есть
+                    while self.size > self.capacity:
+                        await self._evict_lru()
+                    ctx = await self._factory(key)
+                finally:
+                    self._pending -= 1
+                entry = PooledContext(key, ctx)
+        except BaseException:
+            self._sem.release()
+            raise
+        self._busy.add(entry)
+        return entry
+
+    async def release(self, entry: PooledContext, healthy: bool = True) -> None:
+        """Возвращает контекст в пул или закрывает его после ошибки/лимита страниц."""
+        self._busy.discard(entry)
+        entry.pages += 1
+        try:
+            if not healthy:
+                await self._close(entry, "discard")
+            elif self.max_pages and entry.pages >= self.max_pages:
+                await self._close(entry, "recycle")
+            else:
+                self._idle.setdefault(entry.key, []).append(entry)
+                self._idle.move_to_end(entry.key)
+        finally:
+            self._sem.release()
+
+    async def close(self) -> None:
+        entries = [e for v in self._idle.values() for e in v] + list(self._busy)
+        self._idle.clear()
+        self._busy.clear()
+        for entry in entries:
+            try:
+                await entry.ctx.close()
+            except Exception:
+                pass
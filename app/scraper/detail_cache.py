@@ -0,0 +1,97 @@
+"""Кэш разобранных страниц товара в Redis.
+
+Ключ — (source, external_id, geoid), значение — компактный JSON ``OfferRaw``
+вместе со временем его получения. Чтобы истечение популярного ключа не
+вызывало одновременный рендер во всех воркерах, запись может считаться
+устаревшей заранее с вероятностью, растущей к концу TTL (XFetch): чем
+дороже был рендер и ближе истечение, тем раньше один из читателей
+обновит её.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import random
+import time
+
+import redis.asyncio as redis
+
+from ..config import settings
+from ..schemas import OfferRaw
+from observability.metrics import detail_cache_requests
+
+logger = logging.getLogger(__name__)
+
+
+class DetailCache:
+    def __init__(
+        self,
+        client: redis.Redis | None = None,
+        ttl: int | None = None,
+        beta: float | None = None,
+    ) -> None:
+        self._redis = client
+        self.ttl = settings.DETAIL_CACHE_TTL if ttl is None else ttl
+        self.beta = settings.DETAIL_CACHE_BETA if beta is None else beta
+
+    @property
+    def redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.from_url(settings.REDIS_URL)
+        return self._redis
+
+    @staticmethod
+    def key(source: str, external_id: str, geoid: str | None) -> str:
+        return f"detail:{source}:{external_id}:{geoid or '-'}"
+
+    def _expired_early(self, delta: float, expires: float) -> bool:
+        # XFetch: now - delta * beta * ln(rand) >= expiry
+        return time.time() - delta * self.beta * math.log(1.0 - random.random()) >= expires
+
+    async def get(self, source: str, external_id: str, geoid: str | None) -> OfferRaw | None:
+        """Оффер из кэша или None, если записи нет либо пора её обновить."""
+        if self.ttl <= 0:
+            return None
+        try:
+            raw = await self.redis.get(self.key(source, external_id, geoid))
+        except Exception:
+            logger.exception("Не удалось прочитать кэш детали %s", external_id)
+            raw = None
+        if not raw:
+            detail_cache_requests.labels(site=source, result="miss").inc()
+            return None
+        try:
+            entry = json.loads(raw)
+            offer = OfferRaw.model_validate(entry["o"])
+        except Exception:
+            detail_cache_requests.labels(site=source, result="miss").inc()
+            return None
+        if self._expired_early(entry.get("d", 0.0), entry.get("e", 0.0)):
+            detail_cache_requests.labels(site=source, result="early").inc()
+            return None
+        detail_cache_requests.labels(site=source, result="hit").inc()
+        return offer
+
+    async def set(
+        self, external_id: str, geoid: str | None, offer: OfferRaw, delta: float
+    ) -> None:
+        """Сохраняет оффер; ``delta`` — сколько секунд заняло его получение."""
+        if self.ttl <= 0:
+            return
+        entry = {
+            "o": offer.model_dump(mode="json", exclude_defaults=True),
+            "d": round(delta, 3),
+            "e": time.time() + self.ttl,
+        }
+        try:
+            await self.redis.set(
+                self.key(offer.source, external_id, geoid),
+                json.dumps(entry, ensure_ascii=False, separators=(",", ":")),
+                ex=self.ttl,
+            )
+        except Exception:
+            logger.exception("Не удалось записать кэш детали %s", external_id)
+
+
+detail_cache = DetailCache()
@@ -0,0 +1,133 @@
+"""Разбор HTML вне event loop: пул процессов с прогретыми адаптерами.
+
+Страница разбирается целиком в процессе пула (проверка региона и карточки
+по одному документу), обратно возвращаются компактные dict'ы ``OfferRaw``.
+Счётчики разбора возвращаются вместе с результатом и записываются в
+родительском процессе (:func:`record_listing_stats`): реестр Prometheus
+дочернего процесса никто не экспортирует. При ``PARSE_WORKERS=0`` (по умолчанию и в тестах) те же функции вызываются
+прямо в event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from ..schemas import OfferRaw
+from observability.metrics import price_locator_hits
+from .adapters import as_document, get_selectors, market as market_ad, ozon as ozon_ad
+
+logger = logging.getLogger(__name__)
+
+_ADAPTERS = {"ozon": ozon_ad, "market": market_ad}
+
+
+def _warm() -> None:
+    """Инициализатор процесса: компилирует селекторы всех адаптеров заранее."""
+    for site in _ADAPTERS:
+        get_selectors(site)
+
+
+def _compact(offer: OfferRaw) -> dict:
+    return offer.model_dump(mode="json", exclude_defaults=True)
+
+
+def parse_listing_page(
+    site: str, html: str, geoid_actual: str, geoid: str | None
+) -> tuple[bool, list[dict], float, dict[str, int]]:
+    """Проверяет регион и парсит листинг.
+
+    Возвращает (регион верен, офферы, секунды, уровни поиска цены).
+    """
+    start = time.perf_counter()
+    adapter = _ADAPTERS[site]
+    doc = as_document(html, site)
+    tiers: dict[str, int] = {}
+    if not adapter.ensure_region(doc, geoid_actual):
+        return False, [], time.perf_counter() - start, tiers
+    if site == "market":
+        items = adapter.parse_listing(doc, geoid=geoid)
+    else:
+        items = adapter.parse_listing(doc, tiers=tiers)
+    return True, [_compact(i) for i in items], time.perf_counter() - start, tiers
+
+
+def record_listing_stats(site: str, tiers: dict[str, int]) -> None:
+    """Записывает в метрики родительского процесса счётчики разбора листинга."""
+    for tier, count in tiers.items():
+        price_locator_hits.labels(site=site, tier=tier).inc(count)
+
+
+def parse_product_page(site: str, html: str, geoid: str | None) -> tuple[dict, float]:
+    """Парсит страницу товара; возвращает (оффер, секунды)."""
+    start = time.perf_counter()
+    adapter = _ADAPTERS[site]
+    doc = as_document(html, site)
+    offer = adapter.parse_product(doc, geoid=geoid) if site == "market" else adapter.parse_product(doc)
+    return _compact(offer), time.perf_counter() - start
+
+
+class ParseExecutor:
+    """Выполняет функции разбора в пуле процессов или, без пула, в event loop."""
+
+    # задача, которая сама роняет процесс, не должна пересоздавать пул бесконечно
+    max_attempts = 3
+
+    def __init__(self, workers: int = 0) -> None:
+        self.workers = workers
+        self._pool: ProcessPoolExecutor | None = None
+
+    def _create(self) -> None:
+        # spawn: форк процесса с запущенным Playwright и event loop небезопасен
+        self._pool = ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm,
+        )
+
+    async def start(self, workers: int | None = None) -> None:
+        """Поднимает пул и дожидается прогрева всех процессов."""
+        if workers is not None:
+            self.workers = workers
+        if self.workers <= 0 or self._pool is not None:
+            return
+        self._create()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(self._pool, _warm) for _ in range(self.workers))
+        )
+        logger.info("Пул разбора запущен: %s процессов", self.workers)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Выполняет ``fn`` в пуле; после падения пула повторяет в новом.
+
+        Пул пересоздаёт только тот вызов, который застал его текущим:
+        остальные ожидавшие упавший пул отправляют задачу в уже новый, не
+        трогая его очередь.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_attempts):
+            pool = self._pool
+            if pool is None:
+                return fn(*args)
+            try:
+                return await loop.run_in_executor(pool, fn, *args)
+            except BrokenProcessPool:
+                if self._pool is pool:
+                    logger.exception("Пул разбора упал, пересоздаём")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self._create()
+                if attempt + 1 == self.max_attempts:
+                    raise
+
+    def stop(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+parse_executor = ParseExecutor()
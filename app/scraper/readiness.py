@@ -0,0 +1,65 @@
+"""Ожидание готовности страницы после навигации вместо фиксированной паузы.
+
+Режимы (``RENDER_READY_MODE``):
+
+* ``stable`` — число элементов ``wait_selector`` (без него — всех узлов DOM)
+  не меняется между двумя опросами;
+* ``networkidle`` — нет сетевых запросов 500 мс;
+* ``none`` — не ждать.
+
+Если для домена задан JS-предикат в ``RENDER_READY_PREDICATES``, ждём его.
+Каждое ожидание ограничено ``RENDER_READY_TIMEOUT_MS``; по таймауту страница
+отдаётся как есть — селектор к этому моменту уже найден.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+
+from playwright.async_api import Page, TimeoutError as PlaywrightTimeoutError
+
+from ..config import settings
+from . import domain_setting
+from observability.metrics import render_ready
+
+READY_MODES = ("none", "stable", "networkidle")
+
+_COUNT_JS = "s => document.querySelectorAll(s).length"
+
+
+async def _stable(page: Page, selector: str, timeout_ms: int, interval_ms: int) -> bool:
+    deadline = time.monotonic() + timeout_ms / 1000
+    last = -1
+    while True:
+        count = await page.evaluate(_COUNT_JS, selector)
+        if count and count == last:
+            return True
+        last = count
+        if time.monotonic() + interval_ms / 1000 > deadline:
+            return False
+        await asyncio.sleep(interval_ms / 1000)
+
+
+async def wait_ready(page: Page, domain: str, selector: str | None = None, mode: str | None = None) -> str:
+    """Ждёт готовности страницы; возвращает итог: ready, timeout или skipped."""
+    predicate = domain_setting(settings.RENDER_READY_PREDICATES, domain)
+    mode = "predicate" if predicate else (mode or settings.RENDER_READY_MODE)
+    if mode not in READY_MODES and mode != "predicate":
+        raise ValueError(f"Неизвестный режим готовности: {mode}")
+    timeout_ms = settings.RENDER_READY_TIMEOUT_MS
+    outcome = "ready"
+    if mode == "none" or timeout_ms <= 0:
+        outcome = "skipped"
+    elif mode == "stable":
+        ok = await _stable(page, selector or "*", timeout_ms, settings.RENDER_READY_INTERVAL_MS)
+        outcome = "ready" if ok else "timeout"
+    else:
+        try:
+            if mode == "networkidle":
+                await page.wait_for_load_state("networkidle", timeout=timeout_ms)
+            else:
+                await page.wait_for_function(predicate, timeout=timeout_ms)
+        except PlaywrightTimeoutError:
+            outcome = "timeout"
+    render_ready.labels(domain=domain, mode=mode, outcome=outcome).inc()
+    return outcome
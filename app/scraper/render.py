@@ -1,5 +1,6 @@
 import asyncio
 import json
+import os
 import random
 from datetime import datetime, timedelta
 from hashlib import sha256
@@ -13,10 +14,20 @@ import logging
 
 import boto3
 import redis.asyncio as redis
-from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+from playwright.async_api import async_playwright, BrowserContext, Page
 
 from ..config import settings
-from observability.metrics import render_latency, render_errors
+from .blocking import BlockProfile, profile_for
+from .browsers import BrowserPool
+from .contexts import ContextPool
+from .readiness import wait_ready
+from orchestrator.pacer import Pacer
+from observability.metrics import (
+    render_blocked_requests,
+    render_errors,
+    render_latency,
+    render_response_bytes,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -25,14 +36,18 @@ DEFAULT_UA = (
     "AppleWebKit/537.36 (KHTML, like Gecko) "
     "Chrome/122.0.0.0 Safari/537.36"
 )
+SCREENSHOT_MODES = ("never", "on_error", "always")
 
 
 class RenderService:
     def __init__(self, headless: bool = True, ctx_pool: int = 4, per_domain: int = 2):
         self._headless = headless
         self._pw = None
-        self._browser: Optional[Browser] = None
-        self._ctx_pool: asyncio.Queue[BrowserContext] = asyncio.Queue(maxsize=ctx_pool)
+        self._browsers: Optional[BrowserPool] = None
+        # контексты по (домен, регион) живут между рендерами
+        self._contexts = ContextPool(
+            ctx_pool, self._new_context, settings.RENDER_CONTEXT_MAX_PAGES, alive=self._context_alive
+        )
         self._domain_sems: dict[str, asyncio.Semaphore] = {}
         self._per_domain = per_domain
         self._redis = redis.from_url(settings.REDIS_URL)
@@ -48,26 +63,43 @@ class RenderService:
             self._s3 = None
         self._snapshot_ttl = getattr(settings, "SNAPSHOT_TTL_DAYS", 7)
         self._error_times: dict[str, list[float]] = {}
+        self._block_profiles: dict[str, BlockProfile] = {}
+        # вежливая пауза между рендерами домена выдерживается до взятия
+        # контекста, а не сном внутри него
+        delay = settings.RENDER_MIN_DELAY_MS / 1000
+        self._pacer = Pacer(1 / delay if delay > 0 else 0, 1)
 
     async def start(self):
-        if self._browser:
+        if self._browsers:
             return
         self._pw = await async_playwright().start()
         launch_args = {"headless": self._headless, "args": ["--no-sandbox"]}
         if settings.PROXY_URL:
             launch_args["proxy"] = {"server": settings.PROXY_URL}
-        self._browser = await self._pw.chromium.launch(**launch_args)
-        for _ in range(self._ctx_pool.maxsize):
-            ctx = await self._browser.new_context(user_agent=DEFAULT_UA, viewport={"width": 1366, "height": 860})
-            await self._ctx_pool.put(ctx)
+        # по умолчанию половина ядер, но не больше, чем контекстов в пуле
+        size = settings.RENDER_BROWSERS or max(
+            1, min((os.cpu_count() or 2) // 2, self._contexts.capacity)
+        )
+        self._browsers = BrowserPool(
+            lambda: self._pw.chromium.launch(**launch_args),
+            size,
+            settings.RENDER_BROWSER_MAX_PAGES,
+        )
+        await self._browsers.start()
+
+    async def _new_context(self, key) -> BrowserContext:
+        return await self._browsers.new_context(
+            user_agent=DEFAULT_UA, viewport={"width": 1366, "height": 860}
+        )
+
+    def _context_alive(self, ctx: BrowserContext) -> bool:
+        return self._browsers is not None and self._browsers.alive(ctx)
 
     async def stop(self):
-        while not self._ctx_pool.empty():
-            ctx = await self._ctx_pool.get()
-            await ctx.close()
-        if self._browser:
-            await self._browser.close()
-            self._browser = None
+        await self._contexts.close()
+        if self._browsers:
+            await self._browsers.close()
+            self._browsers = None
         if self._pw:
             await self._pw.stop()
             self._pw = None
@@ -85,33 +117,57 @@ class RenderService:
     def _record_error(self, domain: str) -> None:
         self._error_times.setdefault(domain, []).append(time.time())
 
-    async def _reset_context(self, ctx: BrowserContext) -> None:
+    async def _apply_blocking(self, page: Page, domain: str) -> None:
+        """Вешает на страницу профиль блокировки ресурсов домена."""
+        profile = self._block_profiles.get(domain)
+        if profile is None:
+            profile = self._block_profiles[domain] = profile_for(domain)
+        if not profile:
+            return
+
+        async def handle(route) -> None:
+            request = route.request
+            if profile.blocks(request.resource_type, request.url):
+                render_blocked_requests.labels(domain=domain, type=request.resource_type).inc()
+                await route.abort()
+            else:
+                await route.continue_()
+
+        def on_response(response) -> None:
+            size = response.headers.get("content-length")
+            if size and size.isdigit():
+                render_response_bytes.labels(domain=domain).inc(int(size))
+
+        await page.route("**/*", handle)
+        page.on("response", on_response)
+
+    @staticmethod
+    async def _screenshot(page: Page, full_page: bool) -> bytes:
         try:
-            await ctx.clear_cookies()
-            await ctx.set_extra_http_headers({})
-            await ctx.set_storage_state({"origins": []})
-        except Exception as e:
-            logger.exception("Не удалось сбросить контекст")
-            sentry_sdk.capture_exception(e)
-            raise
+            return await page.screenshot(full_page=full_page)
+        except Exception:
+            return b""
 
     async def save_snapshot(self, url: str, html: str, screenshot: bytes, prefix: str = "errors") -> None:
+        """Сохраняет HTML и, если он снят, скриншот страницы в S3."""
         if not self._s3:
             return
         parsed = urlparse(url)
         stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
         base = f"{prefix}/{parsed.netloc}/{stamp}-{uuid4()}"
         expires = datetime.utcnow() + timedelta(days=self._snapshot_ttl)
-        try:
-            await asyncio.gather(
-                asyncio.to_thread(
-                    self._s3.put_object,
-                    Bucket=self._s3_bucket,
-                    Key=f"{base}.html",
-                    Body=html.encode("utf-8"),
-                    ContentType="text/html",
-                    Expires=expires,
-                ),
+        uploads = [
+            asyncio.to_thread(
+                self._s3.put_object,
+                Bucket=self._s3_bucket,
+                Key=f"{base}.html",
+                Body=html.encode("utf-8"),
+                ContentType="text/html",
+                Expires=expires,
+            )
+        ]
+        if screenshot:
+            uploads.append(
                 asyncio.to_thread(
                     self._s3.put_object,
                     Bucket=self._s3_bucket,
@@ -119,8 +175,10 @@ class RenderService:
                     Body=screenshot,
                     ContentType="image/png",
                     Expires=expires,
-                ),
+                )
             )
+        try:
+            await asyncio.gather(*uploads)
         except Exception as e:
             logger.exception("Не удалось сохранить снапшот %s", url)
             sentry_sdk.capture_exception(e)
@@ -134,14 +192,27 @@ class RenderService:
         extra_headers: Dict[str, str] | None = None,
         region_hint: str | None = None,
         timeout_ms: int = 60000,
-        sleep_ms: int = 2000,
         cache_ttl: int | None = None,
         etag: str | None = None,
         last_modified: str | None = None,
-        sleep_jitter_ms: int = 1000,
+        ready: str | None = None,
+        capture: str | None = None,
+        full_page: bool | None = None,
     ) -> tuple[str, bytes]:
-        """Возвращает (html, screenshot_png)"""
-        assert self._browser, "RenderService not started"
+        """Возвращает (html, screenshot_png).
+
+        ``capture`` (по умолчанию ``SCREENSHOT_MODE``): ``never`` — без
+        скриншотов, ``on_error`` — только для снапшота ошибки рендера,
+        ``always`` — и при успехе. Без скриншота возвращается ``b""``.
+        ``ready`` — режим ожидания готовности (см. :mod:`.readiness`).
+        """
+        assert self._browsers, "RenderService not started"
+        capture = capture or settings.SCREENSHOT_MODE
+        if capture not in SCREENSHOT_MODES:
+            raise ValueError(f"Неизвестный режим скриншота: {capture}")
+        if full_page is None:
+            full_page = settings.SCREENSHOT_FULL_PAGE
+        shoot_errors = capture != "never"
         domain = urlparse(url).netloc
         sem = self._domain_sems.setdefault(domain, asyncio.Semaphore(self._per_domain))
         cache_key = f"render:{url}"
@@ -167,46 +238,50 @@ class RenderService:
         start = time.perf_counter()
         try:
             await self._throttle(domain)
+            await self._pacer.acquire(domain)
             async with sem:
-                ctx = await self._ctx_pool.get()
+                entry = await self._contexts.acquire((domain, region_hint))
+                ctx = entry.ctx
+                healthy = False
+                headers = dict(extra_headers or {})
                 try:
-                    headers = dict(extra_headers or {})
                     if etag:
                         headers["If-None-Match"] = etag
                     if last_modified:
                         headers["If-Modified-Since"] = last_modified
                     if headers:
                         await ctx.set_extra_http_headers(headers)
-                    if cookies:
-                        await ctx.add_cookies(cookies)
+                    # cookies региона выставляются на каждый рендер: сайт мог
+                    # переписать их в тёплом контексте (например, по geo-IP)
+                    region_cookies = list(cookies or [])
                     if region_hint:
-                        await ctx.add_cookies([
+                        region_cookies.append(
                             {
                                 "name": "region",
                                 "value": region_hint,
                                 "domain": f".{domain}",
                                 "path": "/",
                             }
-                        ])
+                        )
+                    if region_cookies:
+                        await ctx.add_cookies(region_cookies)
                     page: Page = await ctx.new_page()
+                    await self._apply_blocking(page, domain)
                     try:
                         resp = await page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
                         if wait_selector:
-                            try:
-                                await page.wait_for_selector(wait_selector, timeout=timeout_ms // 2)
-                            except Exception:
-                                html = await page.content()
-                                screenshot = await page.screenshot(full_page=True)
-                                await self.save_snapshot(url, html, screenshot)
-                                raise
-                        await page.wait_for_timeout(sleep_ms + random.randint(0, sleep_jitter_ms))
+                            await page.wait_for_selector(wait_selector, timeout=timeout_ms // 2)
                         status = resp.status if resp else 200
                         if status == 304 and cached_html:
                             if self._redis:
                                 await self._redis.set(cache_key, cached_html, ex=cache_ttl)
+                            healthy = True
                             return cached_html, b""
+                        await wait_ready(page, domain, wait_selector, ready)
                         html = await page.content()
-                        screenshot = await page.screenshot(full_page=True)
+                        screenshot = (
+                            await self._screenshot(page, full_page) if capture == "always" else b""
+                        )
                         if self._redis and cache_ttl:
                             await self._redis.set(cache_key, html, ex=cache_ttl)
                             try:
@@ -220,23 +295,28 @@ class RenderService:
                             except Exception as e:
                                 logger.exception("Не удалось записать метаданные для %s", url)
                                 sentry_sdk.capture_exception(e)
+                        healthy = True
                         return html, screenshot
                     except Exception:
                         try:
                             html = await page.content()
                         except Exception:
                             html = ""
-                        try:
-                            screenshot = await page.screenshot(full_page=True)
-                        except Exception:
-                            screenshot = b""
+                        screenshot = await self._screenshot(page, full_page) if shoot_errors else b""
                         await self.save_snapshot(url, html, screenshot)
                         raise
                     finally:
                         await page.close()
                 finally:
-                    await self._reset_context(ctx)
-                    await self._ctx_pool.put(ctx)
+                    if healthy and headers:
+                        try:
+                            await ctx.set_extra_http_headers({})
+                        except Exception:
+                            healthy = False
+                    if await self._browsers.page_done(ctx):
+                        # браузер уходит на пересоздание — его свободные контексты закрываем
+                        await self._contexts.purge()
+                    await self._contexts.release(entry, healthy and self._browsers.alive(ctx))
         except Exception as e:
             render_errors.labels(domain=domain).inc()
             self._record_error(domain)
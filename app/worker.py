@@ -1,11 +1,13 @@
 import asyncio
 import os
+import signal
 from sqlalchemy import select
 
 from .queue import RedisQueue, PermanentError
 from .schemas import TaskPayload
 from .processing.pipeline import process_preset
 from .scraper.render import RenderService
+from .scraper.parse_pool import parse_executor
 from .db import SessionLocal
 from .config import settings
 from .notifier.bot import send_batch
@@ -22,8 +24,19 @@ class Worker:
 
     async def start(self):
         await self.render.start()
+        await parse_executor.start(settings.PARSE_WORKERS)
         site, geoid, category = self.shard if self.shard else (None, None, None)
-        await self.queue.consume(self.handle_task, site=site, geoid=geoid, category=category)
+        try:
+            await self.queue.consume(
+                self.handle_task,
+                site=site,
+                geoid=geoid,
+                category=category,
+                concurrency=settings.WORKER_CONCURRENCY,
+            )
+        finally:
+            parse_executor.stop()
+            await self.render.stop()
 
     async def handle_task(self, task: TaskPayload):
         site = task.site
@@ -37,7 +50,7 @@ class Worker:
 
             chat_id = task.chat_id
             if chat_id:
-                res = await session.execute(select(User).where(User.chat_id == int(chat_id)))
+                res = await session.execute(select(User).where(User.chat_id_is(int(chat_id))))
                 user = res.scalar_one_or_none()
                 if user:
                     geoid = geoid or user.geoid
@@ -75,6 +88,9 @@ async def main():
     if all(v is None for v in shard):
         shard = None
     worker = Worker(queue, shard=shard)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, queue.stop)
     await worker.start()
 
 
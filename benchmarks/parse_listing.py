@@ -0,0 +1,85 @@
+"""Бенчмарк разбора листинга на фикстурах из ``tests/fixtures``.
+
+Фикстуры масштабируются повторением карточек до размера реальной выдачи.
+Сравнивается прежний путь (проверка региона и парсинг разбирают HTML
+каждый по отдельности) с одним :class:`Document` на страницу, а также
+движки разбора ``bs4`` и ``lxml``.
+
+    python -m benchmarks.parse_listing --cards 500 --repeat 5
+
+Нужно то же окружение, что и приложению (настройки читаются при импорте).
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.scraper.adapters import Document, market, ozon  # noqa: E402
+from app.scraper.adapters.engines import lxml_available  # noqa: E402
+
+FIXTURES = ROOT / "tests" / "fixtures"
+
+
+def _load(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def build_page(site: str, cards: int) -> str:
+    """Собирает страницу из шапки региона и ``cards`` карточек фикстуры."""
+    header = _load(f"{site}_region_msk.html")
+    listing = _load(f"{site}_listing.html")
+    if site == "ozon":
+        card = re.search(r"<a .*?</a>", listing, re.S).group(0)
+        body = "".join(card.replace("/product/123", f"/product/{i}") for i in range(cards))
+        listing = f'<div data-widget="searchResultsV2">{body}</div>'
+    else:
+        card = re.search(r"<article .*?</article>", listing, re.S).group(0)
+        listing = "".join(card.replace("/111", f"/{i}") for i in range(cards))
+    return header.replace("</body>", listing + "</body>")
+
+
+def _run(adapter, page, single: bool, engine: str = "bs4") -> float:
+    start = time.perf_counter()
+    src = Document(page, engine) if single else page
+    assert adapter.ensure_region(src, "213")
+    assert adapter.parse_listing(src)
+    return time.perf_counter() - start
+
+
+def bench(site: str, cards: int, repeat: int) -> dict[str, float]:
+    adapter = ozon if site == "ozon" else market
+    page = build_page(site, cards)
+    results = {
+        "two parses": statistics.median(_run(adapter, page, False) for _ in range(repeat)),
+        "single document": statistics.median(_run(adapter, page, True) for _ in range(repeat)),
+    }
+    if lxml_available():
+        results["lxml engine"] = statistics.median(
+            _run(adapter, page, True, "lxml") for _ in range(repeat)
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark listing parse latency")
+    parser.add_argument("--cards", type=int, default=500, help="Cards per page")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant")
+    args = parser.parse_args()
+    for site in ("ozon", "market"):
+        results = bench(site, args.cards, args.repeat)
+        base = results["two parses"]
+        print(site)
+        for name, value in results.items():
+            print(f"  {name:16} {value * 1000:8.1f} ms  {base / value:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Микробенчмарк классификатора промо/доставки на синтетических карточках.
+
+Сравнивает прежние четыре регулярки с подстроками (как было в адаптерах)
+с :func:`app.scraper.adapters.promo.extract_features` и проверяет, что
+результаты совпадают.
+
+    python -m benchmarks.promo_features --cards 50000
+
+Нужно то же окружение, что и приложению (настройки читаются при импорте).
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.scraper.adapters.promo import extract_features  # noqa: E402
+
+WORDS = (
+    "товар доставка завтра бесплатно в корзине цена купон скидка подписка дня "
+    "дней смартфон чехол гб черный продавец рейтинг отзывов ₽ premium"
+).split()
+
+
+def legacy(text_block: str) -> tuple:
+    promo_flags: dict[str, int | bool] = {}
+    m_coupon = re.search(r"купон.*?(\d+)", text_block)
+    if m_coupon:
+        promo_flags["instant_coupon"] = int(m_coupon.group(1))
+    shipping_days = None
+    m_ship = re.search(r"(\d+)[^\d]{0,5}дн", text_block)
+    if m_ship:
+        shipping_days = int(m_ship.group(1))
+    return (
+        promo_flags,
+        shipping_days,
+        "бесп" in text_block,
+        "корзин" in text_block,
+        "подпис" in text_block,
+    )
+
+
+def corpus(cards: int, seed: int = 1) -> list[str]:
+    rnd = random.Random(seed)
+    return [
+        " ".join(
+            rnd.choice(WORDS) if rnd.random() < 0.8 else str(rnd.randint(1, 9999))
+            for _ in range(rnd.randint(10, 80))
+        )
+        for _ in range(cards)
+    ]
+
+
+def _time(fn, texts: list[str]) -> float:
+    start = time.perf_counter()
+    for text in texts:
+        fn(text)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark promo/shipping text classifier")
+    parser.add_argument("--cards", type=int, default=50000, help="Synthetic cards")
+    args = parser.parse_args()
+    texts = corpus(args.cards)
+    mismatches = sum(legacy(t) != tuple(extract_features(t)) for t in texts)
+    before = _time(legacy, texts)
+    after = _time(extract_features, texts)
+    print(f"cards: {len(texts)}, mismatches: {mismatches}")
+    print(f"legacy regexes   {before * 1000:8.1f} ms")
+    print(f"extract_features {after * 1000:8.1f} ms  {before / after:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Ночной пересчёт метрик продуктов чанками с возобновлением."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Iterable
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import metrics
+from app.models import JobProgress, Product
+from .rollup import roll_window, rollup_metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "refresh_metrics"
+
+ChunkFn = Callable[[AsyncSession, Iterable[int]], Awaitable[object]]
+
+
+async def _load_progress(
+    session: AsyncSession, job: str, max_age: timedelta, now: datetime
+) -> int:
+    """Курсор прерванного запуска; прогресс прошлых запусков отбрасывается."""
+    progress = await session.get(JobProgress, job)
+    if progress is None:
+        return 0
+    if progress.updated_at is None or now - progress.updated_at > max_age:
+        logger.info("Прогресс пересчёта от %s устарел, начинаем сначала", progress.updated_at)
+        await session.delete(progress)
+        return 0
+    return progress.last_id
+
+
+async def _save_progress(session: AsyncSession, job: str, last_id: int) -> None:
+    progress = await session.get(JobProgress, job)
+    if progress is None:
+        session.add(JobProgress(name=job, last_id=last_id))
+    else:
+        progress.last_id = last_id
+    await session.commit()
+
+
+async def _process_chunk(
+    session_factory: async_sessionmaker, ids: list[int], fn: ChunkFn
+) -> None:
+    start = time.perf_counter()
+    async with session_factory() as session:
+        await fn(session, ids)
+        await session.commit()
+    metrics.history_refresh_chunk_seconds.observe(time.perf_counter() - start)
+    metrics.history_refresh_products.inc(len(ids))
+
+
+async def refresh_all_products(
+    session_factory: async_sessionmaker,
+    chunk_size: int = 1000,
+    concurrency: int = 4,
+    job: str = JOB_NAME,
+    fn: ChunkFn = rollup_metrics,
+    resume_hours: int = 12,
+    now: datetime | None = None,
+) -> int:
+    """Пересчитывает метрики всех продуктов и возвращает число обработанных.
+
+    Продукты обходятся keyset-пагинацией по id волнами из ``concurrency``
+    чанков; каждый чанк считается в своей сессии и коммитится отдельно.
+    После каждой волны последний id сохраняется в ``job_progress``, так что
+    прерванный запуск продолжается с места остановки — если прогресс обновлялся
+    не раньше ``resume_hours`` часов назад, то есть это повтор того же запуска.
+    """
+    now = now or datetime.utcnow()
+    async with session_factory() as session:
+        await roll_window(session)
+        cursor = await _load_progress(session, job, timedelta(hours=resume_hours), now)
+        await session.commit()
+    if cursor:
+        logger.info("Продолжаем пересчёт метрик с id %s", cursor)
+
+    started = time.perf_counter()
+    processed = 0
+    wave = chunk_size * concurrency
+    while True:
+        async with session_factory() as session:
+            ids = (
+                await session.execute(
+                    select(Product.id).where(Product.id > cursor).order_by(Product.id).limit(wave)
+                )
+            ).scalars().all()
+        if not ids:
+            break
+        chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+        await asyncio.gather(*(_process_chunk(session_factory, c, fn) for c in chunks))
+        processed += len(ids)
+        cursor = ids[-1]
+        async with session_factory() as session:
+            await _save_progress(session, job, cursor)
+
+    async with session_factory() as session:
+        await session.execute(delete(JobProgress).where(JobProgress.name == job))
+        await session.commit()
+
+    elapsed = time.perf_counter() - started
+    if elapsed > 0:
+        metrics.history_refresh_throughput.set(processed / elapsed)
+    logger.info("Пересчитаны метрики %s продуктов за %.1f с", processed, elapsed)
+    return processed
@@ -0,0 +1,310 @@
+"""Инкрементальные дневные агрегаты цен (``price_daily``).
+
+Каждая новая цена обновляет один бакет (продукт, день) за O(1): счётчик,
+сумму, минимум, первую цену дня и суммы для регрессии. Метрики за 30/90 дней
+собираются из не более чем 90 бакетов на продукт, а ночная задача лишь
+удаляет вышедшие из окна бакеты.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+from datetime import date, datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import PriceDaily, PriceHistory
+from .service import _trend_from_sums, last_points, store_metrics
+
+WINDOW_DAYS = 90
+TREND_DAYS = 30
+
+
+def _point(product_id: int, ts: datetime, price: int) -> dict:
+    day_start = datetime(ts.year, ts.month, ts.day)
+    x = (ts - day_start).total_seconds() / 86400
+    return {
+        "product_id": product_id,
+        "day": ts.toordinal(),
+        "cnt": 1,
+        "total": price,
+        "min_price": price,
+        "first_ts": ts,
+        "first_price": price,
+        "sum_x": x,
+        "sum_xx": x * x,
+        "sum_xy": x * price,
+    }
+
+
+def _merge(a: dict, b: dict) -> dict:
+    first = a if a["first_ts"] <= b["first_ts"] else b
+    return {
+        "product_id": a["product_id"],
+        "day": a["day"],
+        "cnt": a["cnt"] + b["cnt"],
+        "total": a["total"] + b["total"],
+        "min_price": min(a["min_price"], b["min_price"]),
+        "first_ts": first["first_ts"],
+        "first_price": first["first_price"],
+        "sum_x": a["sum_x"] + b["sum_x"],
+        "sum_xx": a["sum_xx"] + b["sum_xx"],
+        "sum_xy": a["sum_xy"] + b["sum_xy"],
+    }
+
+
+def _upsert(dialect: str):
+    """Upsert бакетов для поддерживаемых диалектов, иначе None."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+
+        least = func.least
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+
+        least = func.min
+    else:
+        return None
+    stmt = insert(PriceDaily)
+    ex = stmt.excluded
+    earlier = ex.first_ts < PriceDaily.first_ts
+    return stmt.on_conflict_do_update(
+        index_elements=[PriceDaily.product_id, PriceDaily.day],
+        set_={
+            "cnt": PriceDaily.cnt + ex.cnt,
+            "total": PriceDaily.total + ex.total,
+            "min_price": least(PriceDaily.min_price, ex.min_price),
+            "first_ts": case((earlier, ex.first_ts), else_=PriceDaily.first_ts),
+            "first_price": case((earlier, ex.first_price), else_=PriceDaily.first_price),
+            "sum_x": PriceDaily.sum_x + ex.sum_x,
+            "sum_xx": PriceDaily.sum_xx + ex.sum_xx,
+            "sum_xy": PriceDaily.sum_xy + ex.sum_xy,
+        },
+    )
+
+
+async def record_prices(
+    session: AsyncSession, points: Iterable[tuple[int, datetime, int | None]]
+) -> None:
+    """Добавляет наблюдения (product_id, ts, price) в дневные бакеты одним upsert.
+
+    На СУБД без ``ON CONFLICT`` бакеты читаются и сливаются через ORM.
+    """
+    buckets: dict[tuple[int, int], dict] = {}
+    for product_id, ts, price in points:
+        if price is None:
+            continue
+        row = _point(product_id, ts, price)
+        key = (product_id, row["day"])
+        buckets[key] = _merge(buckets[key], row) if key in buckets else row
+    if not buckets:
+        return
+    stmt = _upsert(session.get_bind().dialect.name)
+    if stmt is None:
+        await _merge_orm(session, buckets)
+        return
+    await session.execute(stmt, list(buckets.values()))
+
+
+async def _merge_orm(session: AsyncSession, buckets: dict[tuple[int, int], dict]) -> None:
+    """Слияние бакетов через ORM для СУБД без ``ON CONFLICT``."""
+    res = await session.execute(
+        select(PriceDaily).where(
+            PriceDaily.product_id.in_(list({pid for pid, _ in buckets})),
+            PriceDaily.day.in_(list({day for _, day in buckets})),
+        )
+    )
+    existing = {(r.product_id, r.day): r for r in res.scalars()}
+    for key, row in buckets.items():
+        bucket = existing.get(key)
+        if bucket is None:
+            session.add(PriceDaily(**row))
+            continue
+        merged = _merge({col: getattr(bucket, col) for col in row}, row)
+        for col, value in merged.items():
+            setattr(bucket, col, value)
+    await session.flush()
+
+
+async def rollup_metrics(
+    session: AsyncSession,
+    product_ids: Iterable[int],
+    today: date | None = None,
+) -> dict[int, tuple[int | None, int | None, float | None]]:
+    """Считает avg 30д, min 90д и тренд 30д по бакетам и записывает в Product."""
+    ids = list(dict.fromkeys(product_ids))
+    if not ids:
+        return {}
+    today_n = (today or datetime.utcnow().date()).toordinal()
+    d30 = today_n - TREND_DAYS + 1
+    d90 = today_n - WINDOW_DAYS + 1
+
+    in30 = case((PriceDaily.day >= d30, 1), else_=0)
+    b = (
+        select(
+            PriceDaily,
+            in30.label("in30"),
+            (PriceDaily.day - d30).label("shift"),
+            func.first_value(PriceDaily.first_price)
+            .over(partition_by=(PriceDaily.product_id, in30), order_by=PriceDaily.day)
+            .label("first"),
+        )
+        .where(PriceDaily.product_id.in_(ids), PriceDaily.day >= d90)
+        .subquery()
+    )
+    c = b.c
+    is30 = c.in30 == 1
+    # сдвигаем локальные x каждого бакета к общему началу окна
+    rows = (
+        await session.execute(
+            select(
+                c.product_id,
+                func.sum(case((is30, c.cnt))),
+                func.sum(case((is30, c.total))),
+                func.min(c.min_price),
+                func.max(case((is30, c.first))),
+                func.sum(case((is30, c.sum_x + c.cnt * c.shift))),
+                func.sum(case((is30, c.sum_xx + 2 * c.shift * c.sum_x + c.cnt * c.shift * c.shift))),
+                func.sum(case((is30, c.sum_xy + c.shift * c.total))),
+            ).group_by(c.product_id)
+        )
+    ).all()
+
+    result: dict[int, tuple[int | None, int | None, float | None]] = {
+        pid: (None, None, None) for pid in ids
+    }
+    for pid, n, total, best_90, first, sum_x, sum_xx, sum_xy in rows:
+        n = n or 0
+        avg_30 = int(total / n) if n else None
+        trend = (
+            _trend_from_sums(n, sum_x or 0, total or 0, sum_xx or 0, sum_xy or 0, first)
+            if n >= 2
+            else None
+        )
+        result[pid] = (avg_30, best_90, trend)
+
+    await store_metrics(session, result)
+    return result
+
+
+async def roll_window(session: AsyncSession, today: date | None = None) -> int:
+    """Удаляет бакеты старше окна и возвращает число удалённых."""
+    today_n = (today or datetime.utcnow().date()).toordinal()
+    res = await session.execute(
+        delete(PriceDaily).where(PriceDaily.day < today_n - WINDOW_DAYS + 1)
+    )
+    return res.rowcount or 0
+
+
+def _expand_change_points(
+    points: list[tuple[datetime, int | None]], since: datetime, now: datetime, hold: timedelta
+) -> Iterable[tuple[datetime, int]]:
+    """Разворачивает точки изменения в ежедневные наблюдения.
+
+    Цена точки действует до следующей, но не дольше ``hold``: пока товар
+    наблюдается, точка повторяется хотя бы раз в heartbeat.
+    """
+    day = timedelta(days=1)
+    for k, (ts, price) in enumerate(points):
+        if price is None:
+            continue
+        end = min(points[k + 1][0] if k + 1 < len(points) else now, ts + hold)
+        start = max(ts, since)
+        if start >= end and start != ts:
+            continue
+        for i in range(max(1, math.ceil((end - start) / day))):
+            yield start + i * day, price
+
+
+async def _rebuild_change_points(session: AsyncSession, since: datetime, batch_size: int) -> None:
+    now = datetime.utcnow()
+    hold = timedelta(hours=settings.HISTORY_HEARTBEAT_HOURS)
+    last_pid = 0
+    while True:
+        ids = (
+            await session.scalars(
+                select(PriceHistory.product_id)
+                .where(PriceHistory.product_id > last_pid, PriceHistory.ts >= since)
+                .group_by(PriceHistory.product_id)
+                .order_by(PriceHistory.product_id)
+                .limit(batch_size)
+            )
+        ).all()
+        if not ids:
+            break
+        points: dict[int, list[tuple[datetime, int | None]]] = {pid: [] for pid in ids}
+        # цена, действовавшая на начало окна, записана раньше него
+        for pid, (ts, price, _seller) in (await last_points(session, ids, before=since)).items():
+            points[pid].append((ts, price))
+        rows = await session.execute(
+            select(PriceHistory.product_id, PriceHistory.ts, PriceHistory.price_final)
+            .where(PriceHistory.product_id.in_(ids), PriceHistory.ts >= since)
+            .order_by(PriceHistory.product_id, PriceHistory.ts)
+        )
+        for pid, ts, price in rows:
+            points[pid].append((ts, price))
+        await record_prices(
+            session,
+            (
+                (pid, ts, price)
+                for pid, pts in points.items()
+                for ts, price in _expand_change_points(pts, since, now, hold)
+            ),
+        )
+        last_pid = ids[-1]
+
+
+async def rebuild_from_history(
+    session: AsyncSession, batch_size: int = 5000, change_points: bool | None = None
+) -> None:
+    """Пересобирает бакеты из price_history за последние 90 дней (разовая миграция).
+
+    История из точек изменения (``HISTORY_CHANGE_POINTS``) хранит цену один
+    раз на время её действия, поэтому перед агрегацией она разворачивается в
+    ежедневные наблюдения; иначе каждая строка считается одним наблюдением.
+    """
+    if change_points is None:
+        change_points = settings.HISTORY_CHANGE_POINTS
+    await session.execute(delete(PriceDaily))
+    since = datetime.utcnow() - timedelta(days=WINDOW_DAYS)
+    if change_points:
+        await _rebuild_change_points(session, since, batch_size)
+        await session.commit()
+        return
+    last_id = 0
+    while True:
+        rows = (
+            await session.execute(
+                select(PriceHistory.id, PriceHistory.product_id, PriceHistory.ts, PriceHistory.price_final)
+                .where(PriceHistory.id > last_id, PriceHistory.ts >= since)
+                .order_by(PriceHistory.id)
+                .limit(batch_size)
+            )
+        ).all()
+        if not rows:
+            break
+        await record_prices(session, ((pid, ts, price) for _, pid, ts, price in rows))
+        last_id = rows[-1][0]
+    await session.commit()
+
+
+async def _rebuild() -> None:
+    from app.db import SessionLocal, init_db
+
+    await init_db()
+    async with SessionLocal() as session:
+        await rebuild_from_history(session)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild price_daily rollups from price_history")
+    parser.parse_args()
+    asyncio.run(_rebuild())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,80 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
-from math import fsum
-from typing import Sequence
+from datetime import datetime
+from typing import Iterable
 
-from sqlalchemy import select, func, update
+from sqlalchemy import and_, select, func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models import Product, PriceHistory
 
 
-def _calc_trend(rows: Sequence[tuple[int, datetime]]) -> float | None:
-    if len(rows) < 2:
-        return None
-    base_ts = rows[0][1]
-    xs = [((ts - base_ts).total_seconds() / 86400) for _, ts in rows]
-    ys = [price for price, _ in rows]
-    if len(ys) < 2:
+def _trend_from_sums(
+    n: int, sum_x: float, sum_y: float, sum_xx: float, sum_xy: float, first: float | None
+) -> float | None:
+    if not first:
         return None
-    n = len(xs)
-    sum_x = fsum(xs)
-    sum_y = fsum(ys)
-    sum_xx = fsum(x * x for x in xs)
-    sum_xy = fsum(x * y for x, y in zip(xs, ys))
     denom = n * sum_xx - sum_x * sum_x
     if denom == 0:
         return None
     slope = (n * sum_xy - sum_x * sum_y) / denom
-    first = ys[0]
-    if not first:
-        return None
-    trend = slope * 30 / first * 100
-    return round(trend, 2)
+    return round(slope * 30 / first * 100, 2)
 
 
-async def update_product_metrics(session: AsyncSession, product_id: int) -> tuple[int | None, int | None, float | None]:
-    now = datetime.utcnow()
-    q30 = select(func.avg(PriceHistory.price_final)).where(
-        PriceHistory.product_id == product_id,
-        PriceHistory.ts >= now - timedelta(days=30),
+async def store_metrics(
+    session: AsyncSession, metrics: dict[int, tuple[int | None, int | None, float | None]]
+) -> None:
+    """Записывает метрики продуктов одним пакетным UPDATE."""
+    if not metrics:
+        return
+    await session.execute(
+        update(Product),
+        [
+            {"id": pid, "avg_price_30d": a, "min_price_90d": b, "trend_30d": t}
+            for pid, (a, b, t) in metrics.items()
+        ],
     )
-    avg_30 = await session.scalar(q30)
-    avg_30 = int(avg_30) if avg_30 is not None else None
 
-    q90 = select(func.min(PriceHistory.price_final)).where(
-        PriceHistory.product_id == product_id,
-        PriceHistory.ts >= now - timedelta(days=90),
+
+async def last_points(
+    session: AsyncSession, product_ids: Iterable[int], before: datetime | None = None
+) -> dict[int, tuple[datetime, int | None, str | None]]:
+    """Последняя точка истории (ts, цена, продавец) для каждого продукта."""
+    ids = list(dict.fromkeys(product_ids))
+    if not ids:
+        return {}
+    cond = [PriceHistory.product_id.in_(ids)]
+    if before is not None:
+        cond.append(PriceHistory.ts < before)
+    latest = (
+        select(PriceHistory.product_id, func.max(PriceHistory.ts).label("ts"))
+        .where(*cond)
+        .group_by(PriceHistory.product_id)
+        .subquery()
     )
-    best_90 = await session.scalar(q90)
-    best_90 = int(best_90) if best_90 is not None else None
+    rows = await session.execute(
+        select(
+            PriceHistory.product_id, PriceHistory.ts, PriceHistory.price_final, PriceHistory.seller
+        ).join(
+            latest,
+            and_(PriceHistory.product_id == latest.c.product_id, PriceHistory.ts == latest.c.ts),
+        )
+    )
+    return {pid: (ts, price, seller) for pid, ts, price, seller in rows}
 
-    qtrend = select(PriceHistory.price_final, PriceHistory.ts).where(
-        PriceHistory.product_id == product_id,
-        PriceHistory.ts >= now - timedelta(days=30),
-        PriceHistory.price_final.isnot(None),
-    ).order_by(PriceHistory.ts)
-    rows = (await session.execute(qtrend)).all()
-    trend = _calc_trend(rows)
 
-    await session.execute(
-        update(Product)
-        .where(Product.id == product_id)
-        .values(avg_price_30d=avg_30, min_price_90d=best_90, trend_30d=trend)
-    )
-    return avg_30, best_90, trend
+async def update_products_metrics(
+    session: AsyncSession, product_ids: Iterable[int]
+) -> dict[int, tuple[int | None, int | None, float | None]]:
+    """Считает и записывает метрики набора продуктов по дневным агрегатам.
 
+    Метрики считаются только по ``price_daily`` (см. :mod:`history.rollup`):
+    в режиме точек изменения строки истории нельзя усреднять как наблюдения.
+    """
+    from .rollup import rollup_metrics
 
-async def refresh_all_products(session: AsyncSession) -> None:
-    ids = (await session.execute(select(Product.id))).scalars().all()
-    for pid in ids:
-        await update_product_metrics(session, pid)
-    await session.commit()
+    return await rollup_metrics(session, product_ids)
+
+
+async def update_product_metrics(session: AsyncSession, product_id: int) -> tuple[int | None, int | None, float | None]:
+    return (await update_products_metrics(session, [product_id]))[product_id]
@@ -6,9 +6,30 @@ render_latency = Histogram(
 render_errors = Counter(
     "render_errors_total", "Total render errors", ["domain"]
 )
+render_blocked_requests = Counter(
+    "render_blocked_requests_total", "Requests aborted by the render blocking profile", ["domain", "type"]
+)
+render_response_bytes = Counter(
+    "render_response_bytes_total", "Declared size of responses loaded while rendering", ["domain"]
+)
+render_ready = Counter(
+    "render_ready_total", "Page readiness waits by mode and outcome", ["domain", "mode", "outcome"]
+)
+render_context_events = Counter(
+    "render_context_events_total", "Browser context pool events", ["event"]
+)
+render_browser_events = Counter(
+    "render_browser_events_total", "Browser process pool events", ["event"]
+)
 parse_latency = Histogram(
     "parse_latency_seconds", "Latency of HTML parsing", ["domain"]
 )
 parse_errors = Counter(
     "parse_errors_total", "Total parse errors", ["domain"]
 )
+price_locator_hits = Counter(
+    "price_locator_hits_total", "Listing price lookups by locator tier", ["site", "tier"]
+)
+detail_cache_requests = Counter(
+    "detail_cache_requests_total", "Product detail cache lookups", ["site", "result"]
+)
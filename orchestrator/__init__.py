@@ -1,4 +1,5 @@
 from .manager import Manager, create_preset_tasks
+from .pacer import Pacer, TokenBucket
 from .scheduler import Scheduler
 
-__all__ = ["Manager", "create_preset_tasks", "Scheduler"]
+__all__ = ["Manager", "create_preset_tasks", "Pacer", "TokenBucket", "Scheduler"]
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Callable, Dict
+
+
+class TokenBucket:
+    """Token bucket: до ``burst`` задач сразу, далее ``rate`` задач в секунду.
+
+    ``rate <= 0`` отключает ограничение.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if burst < 1:
+            raise ValueError("burst должен быть не меньше 1")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._ts = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = max(0.0, now - self._ts)
+        self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+        self._ts = now
+
+    def take(self, n: int) -> tuple[int, float]:
+        """Берёт до ``n`` токенов.
+
+        Возвращает (сколько взято, сколько секунд ждать следующего токена).
+        """
+        if self.rate <= 0:
+            return n, 0.0
+        self._refill()
+        got = min(n, int(self._tokens))
+        self._tokens -= got
+        wait = 0.0 if got else (1 - self._tokens) / self.rate
+        return got, wait
+
+    async def acquire(self, n: int = 1) -> int:
+        """Ждёт хотя бы один токен и возвращает число выданных (не больше ``n``)."""
+        while True:
+            got, wait = self.take(n)
+            if got:
+                return got
+            await asyncio.sleep(wait)
+
+
+class Pacer:
+    """Набор token bucket'ов по сайтам/доменам с общими настройками по умолчанию."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        overrides: Dict[str, float] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.overrides = overrides or {}
+        self._clock = clock
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate = self.overrides.get(key, self.rate)
+            bucket = TokenBucket(rate, self.burst, clock=self._clock)
+            self._buckets[key] = bucket
+        return bucket
+
+    async def acquire(self, key: str, n: int = 1) -> int:
+        return await self.bucket(key).acquire(n)
@@ -1,5 +1,26 @@
 import os
 
+import pytest
+
 DEFAULT_KEY = "MDAwMDAwMDAwMDAwMDAwMDAwMDAwMDAwMDAwMDAwMDA="
 os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test")
 os.environ.setdefault("DATA_ENCRYPTION_KEY", DEFAULT_KEY)
+
+
+@pytest.fixture
+def fake_browsers():
+    """Пул рендера из одного поддельного браузера, выдающего ``ctx``."""
+    from unittest.mock import AsyncMock, MagicMock
+
+    from app.scraper.browsers import BrowserPool, BrowserSlot
+
+    def make(ctx):
+        browser = MagicMock()
+        browser.new_context = AsyncMock(return_value=ctx)
+        browser.close = AsyncMock()
+        ctx.on = MagicMock()
+        pool = BrowserPool(AsyncMock(return_value=browser), 1)
+        pool.slots.append(BrowserSlot(browser))
+        return pool
+
+    return make
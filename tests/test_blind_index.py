@@ -0,0 +1,72 @@
+from pathlib import Path
+import sys
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import crypto
+from app.models import Base, User
+from app.backfill_blind_index import backfill, ensure_column, ensure_index
+
+
+def test_blind_index_is_deterministic():
+    assert crypto.blind_index("42") == crypto.blind_index("42")
+    assert crypto.blind_index("42") != crypto.blind_index("43")
+    assert crypto.blind_index("42") in crypto.blind_indexes("42")
+
+
+@pytest.mark.asyncio
+async def test_lookup_by_chat_id_uses_blind_index():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_session() as session:
+        session.add_all([User(chat_id=100), User(chat_id=200)])
+        await session.commit()
+
+    async with async_session() as session:
+        user = await session.scalar(select(User).where(User.chat_id_is(100)))
+        assert user is not None
+        assert user.chat_id == 100
+        assert user.chat_id_bidx == crypto.blind_index("100")
+        assert await session.scalar(select(User).where(User.chat_id_is(300))) is None
+
+
+@pytest.mark.asyncio
+async def test_backfill_adds_column_and_skips_duplicates():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # имитируем схему до миграции
+        await conn.execute(text("DROP INDEX ix_users_chat_id_bidx"))
+        await conn.execute(text("ALTER TABLE users DROP COLUMN chat_id_bidx"))
+        for chat_id in (1, 2, 1):
+            await conn.execute(
+                text("INSERT INTO users (chat_id, geoid, min_discount, min_score) VALUES (:c, :g, :d, :s)"),
+                {
+                    "c": crypto.encrypt_text(str(chat_id)),
+                    "g": crypto.encrypt_text("213"),
+                    "d": crypto.encrypt_text("25"),
+                    "s": crypto.encrypt_text("70"),
+                },
+            )
+        await ensure_column(conn)
+
+    async with async_session() as session:
+        assert await backfill(session, batch_size=2) == 3
+    async with engine.begin() as conn:
+        await ensure_index(conn)
+
+    async with async_session() as session:
+        user = await session.scalar(select(User).where(User.chat_id_is(1)))
+        assert user.id == 1
+        rows = (await session.execute(select(User.id, User.chat_id_bidx).order_by(User.id))).all()
+        assert rows[2][1] is None
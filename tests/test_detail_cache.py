@@ -0,0 +1,78 @@
+from pathlib import Path
+import sys
+
+import fakeredis.aioredis
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.schemas import OfferRaw
+from app.scraper.detail_cache import DetailCache
+from observability.metrics import detail_cache_requests
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def offer(**kw) -> OfferRaw:
+    data = {"source": "market", "title": "t", "url": "https://market.yandex.ru/product--a/1", "price": 100}
+    data.update(kw)
+    return OfferRaw(**data)
+
+
+def count(result: str) -> float:
+    return detail_cache_requests.labels(site="market", result=result)._value.get()
+
+
+@pytest.mark.asyncio
+async def test_detail_cache_round_trip():
+    cache = DetailCache(fakeredis.aioredis.FakeRedis(), ttl=3600, beta=1.0)
+    misses, hits = count("miss"), count("hit")
+    assert await cache.get("market", "1", "213") is None
+    item = offer(promo_flags={"instant_coupon": 200}, geoid="213")
+    await cache.set("1", "213", item, delta=0.5)
+    assert await cache.get("market", "1", "213") == item
+    # другой регион — другая запись
+    assert await cache.get("market", "1", "2") is None
+    assert count("miss") - misses == 2 and count("hit") - hits == 1
+    assert await cache.redis.ttl(cache.key("market", "1", "213")) > 3500
+
+
+@pytest.mark.asyncio
+async def test_detail_cache_refreshes_early(monkeypatch):
+    cache = DetailCache(fakeredis.aioredis.FakeRedis(), ttl=60, beta=1.0)
+    await cache.set("1", None, offer(), delta=30.0)
+    # случайное число близко к 1: долгий рендер «съедает» остаток TTL
+    monkeypatch.setattr("app.scraper.detail_cache.random.random", lambda: 0.99)
+    early = count("early")
+    assert await cache.get("market", "1", None) is None
+    assert count("early") - early == 1
+    monkeypatch.setattr("app.scraper.detail_cache.random.random", lambda: 0.0)
+    assert await cache.get("market", "1", None) == offer()
+
+
+@pytest.mark.asyncio
+async def test_fetch_product_detail_uses_cache(monkeypatch):
+    # модуль мог быть импортирован другими тестами с заглушками адаптеров
+    monkeypatch.delitem(sys.modules, "app.processing.pipeline", raising=False)
+    import app.processing.pipeline as pipeline
+
+    html = (FIXTURES / "market_product.html").read_text(encoding="utf-8")
+    url = "https://market.yandex.ru/product--slug1/111"
+
+    class Render:
+        calls = 0
+
+        async def fetch(self, **kw):
+            self.calls += 1
+            return html, b""
+
+    monkeypatch.setattr(
+        pipeline, "detail_cache", DetailCache(fakeredis.aioredis.FakeRedis(), ttl=3600, beta=0.0)
+    )
+    render = Render()
+    first = await pipeline.fetch_product_detail(render, "market", url, "213")
+    second = await pipeline.fetch_product_detail(render, "market", url, "213")
+    assert first == second and first.price == 1234
+    assert render.calls == 1
@@ -7,7 +7,7 @@ import importlib
 
 import pytest
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import event, select, func
 
 # Ensure required environment variables for settings
 os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test")
@@ -16,8 +16,9 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from app.models import Base, Product, PriceHistory
+from app.models import Base, Product, PriceHistory, PriceDaily
 from app.schemas import OfferNormalized
+from history.rollup import record_prices
 from app.processing.detectors import is_fake_msrp
 
 
@@ -39,6 +40,17 @@ def load_pipeline(monkeypatch):
     monkeypatch.setitem(sys.modules, "app.scraper.adapters", adapters_pkg)
     monkeypatch.setitem(sys.modules, "app.scraper.adapters.ozon", ozon_stub)
     monkeypatch.setitem(sys.modules, "app.scraper.adapters.market", market_stub)
+    monkeypatch.setitem(
+        sys.modules,
+        "app.scraper.parse_pool",
+        types.SimpleNamespace(
+            parse_executor=None,
+            parse_listing_page=None,
+            parse_product_page=None,
+            record_listing_stats=None,
+        ),
+    )
+    monkeypatch.setitem(sys.modules, "app.scraper.detail_cache", types.SimpleNamespace(detail_cache=None))
     monkeypatch.setitem(
         sys.modules,
         "app.metrics",
@@ -61,8 +73,21 @@ def load_pipeline(monkeypatch):
     return pipeline.compute_features, pipeline.upsert_offer
 
 
+def make_item(num: int, price: int = 100) -> OfferNormalized:
+    return OfferNormalized(
+        source="ozon",
+        external_id=str(num),
+        title=f"t{num}",
+        url=f"u{num}",
+        img_hash=f"h{num}",
+        finger=f"f{num}",
+        price=price,
+        price_final=price,
+    )
+
+
 @pytest.mark.asyncio
-async def test_price_history_stats_and_trend(monkeypatch):
+async def test_compute_features_stats_and_trend(monkeypatch):
     compute_features, _ = load_pipeline(monkeypatch)
     engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
     async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
@@ -75,11 +100,11 @@ async def test_price_history_stats_and_trend(monkeypatch):
         await session.flush()
 
         now = datetime.utcnow()
-        session.add_all([
-            PriceHistory(product_id=prod.id, price_final=200, ts=now - timedelta(days=40)),
-            PriceHistory(product_id=prod.id, price_final=100, ts=now - timedelta(days=20)),
-            PriceHistory(product_id=prod.id, price_final=80, ts=now - timedelta(days=10)),
-            PriceHistory(product_id=prod.id, price_final=120, ts=now - timedelta(days=1)),
+        await record_prices(session, [
+            (prod.id, now - timedelta(days=40), 200),
+            (prod.id, now - timedelta(days=20), 100),
+            (prod.id, now - timedelta(days=10), 80),
+            (prod.id, now - timedelta(days=1), 120),
         ])
         await session.commit()
 
@@ -90,6 +115,53 @@ async def test_price_history_stats_and_trend(monkeypatch):
         assert trend == pytest.approx(29.89, 0.01)
 
 
+@pytest.mark.asyncio
+async def test_update_products_metrics_batch():
+    from history.service import update_products_metrics
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    statements: list[str] = []
+    event.listen(
+        engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *a: statements.append(statement),
+    )
+
+    async with async_session() as session:
+        prods = [
+            Product(source="ozon", external_id=str(i), title="t", url=f"u{i}", finger="f")
+            for i in range(3)
+        ]
+        session.add_all(prods)
+        await session.flush()
+        now = datetime.utcnow()
+        for prod, shift in ((prods[0], 0), (prods[1], 100)):
+            await record_prices(session, [
+                (prod.id, now - timedelta(days=40), 200 + shift),
+                (prod.id, now - timedelta(days=20), 100 + shift),
+                (prod.id, now - timedelta(days=10), 80 + shift),
+                (prod.id, now - timedelta(days=1), 120 + shift),
+            ])
+        await session.commit()
+
+        statements.clear()
+        res = await update_products_metrics(session, [p.id for p in prods])
+        assert len(statements) == 2
+
+        assert res[prods[0].id][:2] == (100, 80)
+        assert res[prods[0].id][2] == pytest.approx(29.89, 0.01)
+        assert res[prods[1].id][:2] == (200, 180)
+        assert res[prods[2].id] == (None, None, None)
+        await session.commit()
+        stored = await session.get(Product, prods[1].id)
+        await session.refresh(stored)
+        assert stored.min_price_90d == 180
+
+
 @pytest.mark.asyncio
 async def test_upsert_adds_price_history(monkeypatch):
     _, upsert_offer = load_pipeline(monkeypatch)
@@ -130,6 +202,164 @@ async def test_upsert_adds_price_history(monkeypatch):
         entry = await session.scalar(select(PriceHistory))
         assert entry.price_final == 150
         assert entry.product_id == prod.id
+        bucket = await session.scalar(select(PriceDaily))
+        assert (bucket.product_id, bucket.cnt, bucket.total) == (prod.id, 1, 150)
+
+
+@pytest.mark.asyncio
+async def test_upsert_offers_constant_round_trips(monkeypatch):
+    load_pipeline(monkeypatch)
+    from app.processing.pipeline import upsert_offers
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    statements: list[str] = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+
+    async with async_session() as session:
+        session.add(Product(source="ozon", external_id="1", title="t1", url="u1", finger="f1"))
+        await session.commit()
+
+        statements.clear()
+        small = await upsert_offers(session, [make_item(1), make_item(2)])
+        await session.commit()
+        small_count = len(statements)
+
+        statements.clear()
+        items = [make_item(i) for i in range(1, 30)] + [make_item(5, price=90)]
+        big = await upsert_offers(session, items)
+        await session.commit()
+        assert len(statements) <= small_count
+
+        assert small[0].id == big[0].id
+        assert big[4].id == big[-1].id
+        assert small[0].img_hash == "h1"
+        assert await session.scalar(select(func.count(Product.id))) == 29
+        assert await session.scalar(select(func.count(PriceHistory.id))) == 32
+
+
+@pytest.mark.asyncio
+async def test_process_preset_writes_scored_offers(monkeypatch):
+    load_pipeline(monkeypatch)
+    from app.processing import pipeline
+    from app.models import Offer
+
+    async def fake_fetch(render, site, url, geoid):
+        return [1, 2, 3]
+
+    monkeypatch.setattr(pipeline, "fetch_site_list", fake_fetch)
+    monkeypatch.setattr(pipeline, "normalize", lambda i: make_item(i, price=100 * i))
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_session() as session:
+        await pipeline.process_preset(session, None, "ozon", "u", "213", 0, 0)
+        offers = (await session.execute(select(Offer).order_by(Offer.product_id))).scalars().all()
+        assert [o.price for o in offers] == [100, 200, 300]
+        assert all(o.score is not None for o in offers)
+        assert await session.scalar(select(func.count(PriceHistory.id))) == 3
+        prod = await session.get(Product, offers[0].product_id)
+        assert prod.avg_price_30d == offers[0].price_final
+
+
+@pytest.mark.asyncio
+async def test_process_preset_fetches_details_concurrently(monkeypatch):
+    load_pipeline(monkeypatch)
+    import asyncio
+    from app.processing import pipeline
+
+    async def fake_fetch(render, site, url, geoid):
+        return [1, 2, 3, 4]
+
+    def fake_normalize(i):
+        if i >= 100:  # страница товара
+            return make_item(i - 100, price=i)
+        return make_item(i).model_copy(update={"price_final": None, "price_in_cart": True})
+
+    calls: list[str] = []
+    active = peak = 0
+
+    async def fake_detail(render, site, url, geoid):
+        nonlocal active, peak
+        calls.append(url)
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return 100 + int(url[1:])
+
+    monkeypatch.setattr(pipeline, "fetch_site_list", fake_fetch)
+    monkeypatch.setattr(pipeline, "normalize", fake_normalize)
+
+    class FakeDetailCache:
+        async def get(self, site, external_id, geoid):
+            # деталь u1 уже лежит в Redis
+            return 101 if external_id == "u1" else None
+
+    monkeypatch.setattr(pipeline, "render_product_detail", fake_detail)
+    monkeypatch.setattr(pipeline, "detail_cache", FakeDetailCache())
+    monkeypatch.setattr(pipeline._ADAPTERS["ozon"], "external_id_from_url", lambda url: url)
+    monkeypatch.setattr(pipeline.settings, "DETAIL_FETCH_LIMIT", 2)
+    pipeline._detail_cache.clear()
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    from app.models import Offer
+
+    async with async_session() as session:
+        await pipeline.process_preset(session, None, "ozon", "u", "213", 0, 0)
+        offers = (await session.execute(select(Offer).order_by(Offer.product_id))).scalars().all()
+        # лимит считается по рендерам: u1 из кэша, u4 за пределами лимита
+        assert [o.price_final for o in offers] == [101, 102, 103, None]
+        assert sorted(calls) == ["u2", "u3"] and peak == 2
+
+        # повторный пресет берёт детали из кэша по URL и рендерит только u4
+        await pipeline.process_preset(session, None, "ozon", "u", "213", 0, 0)
+        assert calls[2:] == ["u4"]
+    pipeline._detail_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_upsert_offers_change_points(monkeypatch):
+    load_pipeline(monkeypatch)
+    from app.config import settings
+    from app.processing.pipeline import upsert_offers
+
+    monkeypatch.setattr(settings, "HISTORY_CHANGE_POINTS", True)
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_session() as session:
+        await upsert_offers(session, [make_item(1), make_item(2)])
+        await upsert_offers(session, [make_item(1), make_item(2)])
+        await session.commit()
+        assert await session.scalar(select(func.count(PriceHistory.id))) == 2
+
+        await upsert_offers(session, [make_item(1, price=90), make_item(2)])
+        await session.commit()
+        assert await session.scalar(select(func.count(PriceHistory.id))) == 3
+
+        # heartbeat: старая точка переписывается даже без изменения цены
+        old = datetime.utcnow() - timedelta(hours=settings.HISTORY_HEARTBEAT_HOURS + 1)
+        for entry in (await session.execute(select(PriceHistory))).scalars():
+            entry.ts = old
+        await session.commit()
+        await upsert_offers(session, [make_item(1, price=90), make_item(2)])
+        await session.commit()
+        assert await session.scalar(select(func.count(PriceHistory.id))) == 5
 
 
 def test_is_fake_msrp():
@@ -0,0 +1,104 @@
+from pathlib import Path
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.models import Base, Product, JobProgress
+from history.refresh import refresh_all_products
+from history.rollup import record_prices, rollup_metrics
+
+
+async def make_factory(tmp_path, products: int):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}", future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with factory() as session:
+        prods = [
+            Product(source="ozon", external_id=str(i), title="t", url=f"u{i}", finger="f")
+            for i in range(products)
+        ]
+        session.add_all(prods)
+        await session.flush()
+        now = datetime.utcnow()
+        await record_prices(session, [(p.id, now, 100 + p.id) for p in prods])
+        await session.commit()
+    return factory
+
+
+@pytest.mark.asyncio
+async def test_refresh_processes_all_chunks(tmp_path):
+    factory = await make_factory(tmp_path, 25)
+    seen: list[list[int]] = []
+
+    async def fn(session, ids):
+        seen.append(list(ids))
+        return await rollup_metrics(session, ids)
+
+    processed = await refresh_all_products(factory, chunk_size=4, concurrency=3, fn=fn)
+    assert processed == 25
+    assert sorted(i for chunk in seen for i in chunk) == list(range(1, 26))
+    assert max(len(c) for c in seen) == 4
+    async with factory() as session:
+        prod = await session.get(Product, 7)
+        assert prod.avg_price_30d == 107
+        assert await session.get(JobProgress, "refresh_metrics") is None
+
+
+@pytest.mark.asyncio
+async def test_refresh_resumes_after_failure(tmp_path):
+    factory = await make_factory(tmp_path, 10)
+    calls: list[int] = []
+
+    async def failing(session, ids):
+        calls.extend(ids)
+        if 7 in ids:
+            raise RuntimeError("boom")
+        return await rollup_metrics(session, ids)
+
+    with pytest.raises(RuntimeError):
+        await refresh_all_products(factory, chunk_size=2, concurrency=2, fn=failing)
+    async with factory() as session:
+        progress = await session.get(JobProgress, "refresh_metrics")
+        assert progress.last_id == 4
+
+    resumed: list[int] = []
+
+    async def recording(session, ids):
+        resumed.extend(ids)
+        return await rollup_metrics(session, ids)
+
+    assert await refresh_all_products(factory, chunk_size=2, concurrency=2, fn=recording) == 6
+    assert sorted(resumed) == list(range(5, 11))
+    async with factory() as session:
+        values = (await session.execute(select(Product.avg_price_30d).order_by(Product.id))).scalars().all()
+        assert values[4:] == [100 + i for i in range(5, 11)]
+
+
+@pytest.mark.asyncio
+async def test_refresh_ignores_progress_of_earlier_run(tmp_path):
+    factory = await make_factory(tmp_path, 10)
+    async with factory() as session:
+        # прошлой ночью запуск упал после id 8
+        session.add(JobProgress(
+            name="refresh_metrics", last_id=8, updated_at=datetime.utcnow() - timedelta(hours=23)
+        ))
+        await session.commit()
+
+    seen: list[int] = []
+
+    async def recording(session, ids):
+        seen.extend(ids)
+        return await rollup_metrics(session, ids)
+
+    assert await refresh_all_products(factory, chunk_size=4, concurrency=2, fn=recording) == 10
+    assert sorted(seen) == list(range(1, 11))
+    async with factory() as session:
+        assert await session.get(JobProgress, "refresh_metrics") is None
@@ -0,0 +1,52 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from orchestrator.pacer import Pacer, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_burst_then_paces():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=5, clock=clock)
+    assert bucket.take(10) == (5, 0.0)
+    got, wait = bucket.take(1)
+    assert got == 0
+    assert wait == pytest.approx(0.5)
+    clock.now = 1.0
+    assert bucket.take(10)[0] == 2
+
+
+def test_zero_rate_disables_pacing():
+    bucket = TokenBucket(rate=0, burst=1)
+    assert bucket.take(1000) == (1000, 0.0)
+
+
+@pytest.mark.asyncio
+async def test_pacer_uses_per_site_overrides(monkeypatch):
+    clock = FakeClock()
+    slept: list[float] = []
+
+    async def fake_sleep(v):
+        slept.append(v)
+        clock.now += v
+
+    monkeypatch.setattr("orchestrator.pacer.asyncio.sleep", fake_sleep)
+    pacer = Pacer(rate=1, burst=1, overrides={"ozon": 4}, clock=clock)
+    assert await pacer.acquire("ozon", 3) == 1
+    assert await pacer.acquire("ozon", 3) == 1
+    assert slept == [pytest.approx(0.25)]
+    assert await pacer.acquire("market", 3) == 1
+    assert pacer.bucket("market").rate == 1
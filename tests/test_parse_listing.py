@@ -2,6 +2,8 @@ from pathlib import Path
 import sys
 import logging
 
+import pytest
+
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
@@ -103,3 +105,51 @@ def test_parse_listing_market_missing_price(caplog):
         items = parse_market(html, geoid="213")
     assert items == []
     assert "отсутствует цена" in caplog.text
+
+
+def _engines():
+    from app.scraper.adapters.engines import lxml_available
+
+    return ["bs4", "lxml"] if lxml_available() else ["bs4"]
+
+
+@pytest.mark.parametrize("engine", _engines())
+def test_ozon_price_locator_tiers(engine, monkeypatch):
+    from app.scraper.adapters import Document
+    from app.scraper.adapters import ozon
+    from observability.metrics import price_locator_hits
+
+    monkeypatch.setattr(
+        "app.scraper.adapters.ozon.get_selectors",
+        lambda name: {"listing": {"card": {"css": "a[href*='/product/']"}}},
+    )
+    html = (
+        "<div data-widget='searchResultsV2'>"
+        "<div class='tile'><a href='/product/1'>Товар 5</a><div><span>1 234 ₽</span></div></div>"
+        "<div class='tile'><a href='/product/2'>Товар B 2 345 ₽</a></div>"
+        "<div class='tile'><div><a href='/product/3'>Товар C</a></div><b>3 456 ₽</b></div>"
+        "<div class='tile'><div><a href='/product/4'>Товар D</a></div></div>"
+        "<div><span>9 999 ₽</span></div>"
+        "</div>"
+    )
+
+    def hits(tier):
+        return price_locator_hits.labels(site="ozon", tier=tier)._value.get()
+
+    before = {t: hits(t) for t in ("card", "siblings", "miss")}
+    items = ozon.parse_listing(Document(html, engine))
+    assert [(str(i.url)[-1], i.price) for i in items] == [("1", 1234), ("2", 2345), ("3", 3456)]
+    assert hits("card") - before["card"] == 1
+    assert hits("siblings") - before["siblings"] == 2
+    # цена за пределами окна предков не берётся
+    assert hits("miss") - before["miss"] == 1
+
+
+def test_ozon_price_locator_stops_at_next_card():
+    from app.scraper.adapters import Document, select_one
+    from app.scraper.adapters.ozon import locate_price
+
+    doc = Document("<div><a href='/product/1'>A</a><a href='/product/2'>B</a><span>1 ₽</span></div>")
+    card = select_one(doc, {"css": "a"})
+    assert locate_price(card) == (None, "miss")
+    assert locate_price(card, depth=0) == (None, "miss")
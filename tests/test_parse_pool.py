@@ -0,0 +1,114 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.schemas import OfferRaw
+from app.scraper.adapters.market import parse_product as parse_market_product
+from app.scraper.adapters.ozon import parse_listing as parse_ozon
+from app.scraper.parse_pool import (
+    ParseExecutor,
+    parse_listing_page,
+    parse_product_page,
+    record_listing_stats,
+)
+from observability.metrics import price_locator_hits
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def load(*names: str) -> str:
+    return "".join((FIXTURES / name).read_text(encoding="utf-8") for name in names)
+
+
+def test_compact_payload_round_trip():
+    html = load("ozon_region_msk.html", "ozon_listing.html")
+    region_ok, payloads, elapsed, _ = parse_listing_page("ozon", html, "213", None)
+    assert region_ok and elapsed >= 0
+    assert [OfferRaw.model_validate(p) for p in payloads] == parse_ozon(html)
+    # значения по умолчанию не передаются между процессами
+    assert "promo_flags" not in payloads[0]
+
+    payload, _ = parse_product_page("market", load("market_product.html"), "213")
+    assert OfferRaw.model_validate(payload) == parse_market_product(load("market_product.html"), geoid="213")
+
+
+def test_wrong_region_reported():
+    region_ok, payloads, _, _ = parse_listing_page("ozon", load("ozon_region_spb.html"), "213", None)
+    assert region_ok is False and payloads == []
+
+
+@pytest.mark.asyncio
+async def test_executor_in_loop_without_workers():
+    executor = ParseExecutor(0)
+    await executor.start()
+    assert executor._pool is None
+    html = load("ozon_region_msk.html", "ozon_listing.html")
+    region_ok, payloads, _, _ = await executor.run(parse_listing_page, "ozon", html, "213", None)
+    assert region_ok and len(payloads) == 2
+    executor.stop()
+
+
+@pytest.mark.asyncio
+async def test_executor_process_pool():
+    executor = ParseExecutor()
+    await executor.start(1)
+    try:
+        html = load("ozon_region_msk.html", "ozon_listing.html")
+        before = price_locator_hits.labels(site="ozon", tier="selector")._value.get()
+        result = await executor.run(parse_listing_page, "ozon", html, "213", None)
+        assert result[:2] == parse_listing_page("ozon", html, "213", None)[:2]
+        # счётчики дочернего процесса приходят с результатом и пишутся здесь
+        assert result[3] == {"selector": 2}
+        record_listing_stats("ozon", result[3])
+        assert price_locator_hits.labels(site="ozon", tier="selector")._value.get() - before == 2
+    finally:
+        executor.stop()
+    assert executor._pool is None
+
+
+class FakePool:
+    def __init__(self, broken: bool) -> None:
+        self.broken = broken
+        self.shutdowns = 0
+
+    def submit(self, fn, *args):
+        fut = Future()
+        if self.broken:
+            fut.set_exception(BrokenProcessPool())
+        else:
+            fut.set_result(fn(*args))
+        return fut
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdowns += 1
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_recreated_once_for_concurrent_callers(monkeypatch):
+    executor = ParseExecutor(2)
+    broken = executor._pool = FakePool(broken=True)
+    created: list[FakePool] = []
+
+    def create():
+        created.append(FakePool(broken=False))
+        executor._pool = created[-1]
+
+    monkeypatch.setattr(executor, "_create", create)
+    results = await asyncio.gather(*(executor.run(pow, 2, n) for n in range(3)))
+    # все вызовы дошли до нового пула, и он не был остановлен соседями
+    assert results == [1, 2, 4]
+    assert broken.shutdowns == 1
+    assert len(created) == 1 and created[0].shutdowns == 0
+
+    executor._pool = FakePool(broken=True)
+    monkeypatch.setattr(executor, "_create", lambda: setattr(executor, "_pool", FakePool(broken=True)))
+    with pytest.raises(BrokenProcessPool):
+        await executor.run(pow, 2, 1)
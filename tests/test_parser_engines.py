@@ -0,0 +1,142 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+pytest.importorskip("lxml")
+pytest.importorskip("cssselect")
+
+from app.config import settings
+from app.scraper.adapters import Document, as_document, engine_for, ozon, market, select_all, select_one
+from app.scraper.adapters.engines import LxmlNode
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def load(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def both(html: str) -> tuple[Document, Document]:
+    return Document(html, "bs4"), Document(html, "lxml")
+
+
+OZON_JSON = (
+    "<div data-widget='searchResultsV2'>"
+    "<a href='/product/123'><span>Товар A</span>"
+    "<script>{\"price\":{\"current\":1234},\"image\":{\"url\":\"/img1.jpg\"}}</script>"
+    "</a></div>"
+)
+MARKET_JSON = (
+    "<article data-autotest-id='product-snippet'>"
+    "<a href='/product--slug1/111'></a>"
+    "<div data-baobab-name='title'>Товар A</div>"
+    "<script>{\"price\":{\"value\":1234},\"image\":{\"url\":\"/img1.png\"}}</script>"
+    "</article>"
+)
+
+
+@pytest.mark.parametrize("html", [load("ozon_listing.html"), OZON_JSON])
+def test_ozon_listing_parity(html):
+    old, new = both(html)
+    assert [o.model_dump() for o in ozon.parse_listing(new)] == [
+        o.model_dump() for o in ozon.parse_listing(old)
+    ]
+
+
+@pytest.mark.parametrize("html", [load("market_listing.html"), MARKET_JSON])
+def test_market_listing_parity(html):
+    old, new = both(html)
+    assert [o.model_dump() for o in market.parse_listing(new, geoid="213")] == [
+        o.model_dump() for o in market.parse_listing(old, geoid="213")
+    ]
+
+
+def test_product_parity():
+    old, new = both(load("ozon_product.html"))
+    assert ozon.parse_product(new).model_dump() == ozon.parse_product(old).model_dump()
+    old, new = both(load("market_product.html"))
+    assert (
+        market.parse_product(new, geoid="213").model_dump()
+        == market.parse_product(old, geoid="213").model_dump()
+    )
+
+
+@pytest.mark.parametrize(
+    "adapter,name,city",
+    [
+        (ozon, "ozon_region_msk.html", "Москва"),
+        (ozon, "ozon_region_spb.html", "Санкт-Петербург"),
+        (market, "market_region_msk.html", "Москва"),
+        (market, "market_region_spb.html", "Санкт-Петербург"),
+    ],
+)
+def test_region_parity(adapter, name, city):
+    for doc in both(load(name)):
+        assert adapter.city_from_html(doc) == city
+
+
+def test_lxml_fallback_order():
+    doc = Document(
+        "<div class='c'><a href='/x'>A</a><script>{\"p\": {\"v\": 5}}</script></div>", "lxml"
+    )
+    card = select_one(doc, {"css": "div.c"})
+    assert isinstance(card, LxmlNode)
+    # CSS не нашёл — XPath от карточки ищет внутри неё
+    assert select_one(card, {"css": "span", "xpath": "//a"}).get("href") == "/x"
+    assert select_all(card, {"css": "span", "xpath": "//span", "json": "p.v"}) == [5]
+    assert select_all(card, {"css": "span"}) == []
+
+
+def test_engine_for_per_site(monkeypatch):
+    monkeypatch.setattr(settings, "PARSER_ENGINE", "bs4")
+    monkeypatch.setattr(settings, "PARSER_ENGINES", {"ozon": "lxml"})
+    assert engine_for("ozon") == "lxml"
+    assert engine_for("market") == "bs4"
+    assert isinstance(as_document("<p></p>", "ozon").root, LxmlNode)
+    monkeypatch.setattr(settings, "PARSER_ENGINES", {"ozon": "html5"})
+    with pytest.raises(ValueError):
+        engine_for("ozon")
+
+
+def test_bs4_xpath_fallback_reuses_tree(monkeypatch):
+    import bs4
+    from app.scraper.adapters.engines import SoupMirror
+
+    html = "<div class='c'>" + "".join(
+        f"<article><a href='/p/{i}'>T{i}</a></article>" for i in range(20)
+    ) + "</div>"
+    parses = []
+    mirrors = []
+    orig_soup = bs4.BeautifulSoup.__init__
+    orig_mirror = SoupMirror.__init__
+
+    def soup_init(self, *args, **kwargs):
+        parses.append(1)
+        orig_soup(self, *args, **kwargs)
+
+    def mirror_init(self, *args, **kwargs):
+        mirrors.append(1)
+        orig_mirror(self, *args, **kwargs)
+
+    monkeypatch.setattr(bs4.BeautifulSoup, "__init__", soup_init)
+    monkeypatch.setattr(SoupMirror, "__init__", mirror_init)
+
+    old, new = both(html)
+    cards = select_all(old, {"css": "article"})
+    links = [select_one(card, {"css": "span", "xpath": "//a"}) for card in cards]
+    assert all(isinstance(link, bs4.Tag) for link in links)
+    assert [link.get("href") for link in links] == [f"/p/{i}" for i in range(20)]
+    assert links[3].find_parent("article") is cards[3]
+    assert len(parses) == 1
+    assert len(mirrors) == 1
+
+    lxml_links = [
+        select_one(card, {"css": "span", "xpath": "//a"})
+        for card in select_all(new, {"css": "article"})
+    ]
+    assert [link.get_text() for link in lxml_links] == [link.get_text() for link in links]
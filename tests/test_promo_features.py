@@ -0,0 +1,59 @@
+from pathlib import Path
+import random
+import re
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.scraper.adapters.promo import extract_features
+
+
+def legacy(text_block: str) -> tuple:
+    promo_flags = {}
+    m = re.search(r"купон.*?(\d+)", text_block)
+    if m:
+        promo_flags["instant_coupon"] = int(m.group(1))
+    m = re.search(r"(\d+)[^\d]{0,5}дн", text_block)
+    shipping_days = int(m.group(1)) if m else None
+    return (
+        promo_flags,
+        shipping_days,
+        "бесп" in text_block,
+        "корзин" in text_block,
+        "подпис" in text_block,
+    )
+
+
+@pytest.mark.parametrize(
+    "text,coupon,days",
+    [
+        ("купон 150 ₽ доставка 3 дня", 150, 3),
+        ("доставка за 12 дней, купон\nна 500", None, 12),
+        ("купон\nкупон -200", 200, None),
+        ("2 дн", None, 2),
+        ("99 товаров в наличии дня", None, None),
+        ("12345дн", None, 12345),
+    ],
+)
+def test_extract_features_cases(text, coupon, days):
+    features = extract_features(text)
+    assert features.promo_flags.get("instant_coupon") == coupon
+    assert features.shipping_days == days
+    assert tuple(features) == legacy(text)
+
+
+def test_extract_features_matches_legacy():
+    words = "купон скидка доставка дня дней бесплатно корзине подписка товар ₽ \n".split(" ")
+    rnd = random.Random(7)
+    for _ in range(3000):
+        text = " ".join(
+            rnd.choice(words) if rnd.random() < 0.7 else str(rnd.randint(1, 999))
+            for _ in range(rnd.randint(1, 30))
+        )
+        for glue in (" ", ""):
+            sample = text.replace(" ", glue)
+            assert tuple(extract_features(sample)) == legacy(sample), sample
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+import sys
+
+import fakeredis.aioredis
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.queue.backend import RedisQueue
+from app.schemas import TaskPayload
+
+
+def make_task(page: int) -> TaskPayload:
+    return TaskPayload(
+        site="ozon",
+        url=f"https://example.com/{page}",
+        geoid="213",
+        category="phones",
+        min_discount=0,
+        min_score=0,
+        page=page,
+    )
+
+
+@pytest.mark.asyncio
+async def test_consume_runs_tasks_concurrently():
+    q = RedisQueue("redis://localhost", "presets")
+    q.redis = fakeredis.aioredis.FakeRedis()
+    for page in range(3):
+        await q.publish(make_task(page))
+
+    running = 0
+    peak = 0
+    done: list[int] = []
+    release = asyncio.Event()
+
+    async def handler(task):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await release.wait()
+        running -= 1
+        done.append(task.page)
+        if len(done) == 3:
+            q.stop()
+
+    consumer = asyncio.create_task(
+        q.consume(handler, site="ozon", geoid="213", category="phones", concurrency=3)
+    )
+    for _ in range(50):
+        if peak == 3:
+            break
+        await asyncio.sleep(0.01)
+    release.set()
+    await asyncio.wait_for(consumer, timeout=5)
+
+    assert peak == 3
+    assert sorted(done) == [0, 1, 2]
+    assert await q.redis.xlen("presets:ozon:213:phones") == 0
+
+
+@pytest.mark.asyncio
+async def test_consume_drains_inflight_on_stop():
+    q = RedisQueue("redis://localhost", "presets")
+    q.redis = fakeredis.aioredis.FakeRedis()
+    await q.publish(make_task(1))
+
+    started = asyncio.Event()
+    finished: list[int] = []
+
+    async def handler(task):
+        started.set()
+        await asyncio.sleep(0.05)
+        finished.append(task.page)
+
+    consumer = asyncio.create_task(
+        q.consume(handler, site="ozon", geoid="213", category="phones", concurrency=2)
+    )
+    await asyncio.wait_for(started.wait(), timeout=5)
+    q.stop()
+    await asyncio.wait_for(consumer, timeout=5)
+
+    assert finished == [1]
+    assert await q.redis.xlen("presets:ozon:213:phones") == 0
+
+
+@pytest.mark.asyncio
+async def test_stop_before_consume_is_kept():
+    q = RedisQueue("redis://localhost", "presets")
+    q.redis = fakeredis.aioredis.FakeRedis()
+    await q.publish(make_task(1))
+    handled: list[int] = []
+
+    async def handler(task):
+        handled.append(task.page)
+
+    # SIGTERM пришёл, пока воркер ещё запускался
+    q.stop()
+    await asyncio.wait_for(
+        q.consume(handler, site="ozon", geoid="213", category="phones"), timeout=5
+    )
+    assert handled == []
+    assert await q.redis.xlen("presets:ozon:213:phones") == 1
+
+
+@pytest.mark.asyncio
+async def test_transient_failure_is_deferred_without_blocking(monkeypatch):
+    q = RedisQueue("redis://localhost", "presets")
+    q.redis = fakeredis.aioredis.FakeRedis()
+    stream = "presets:ozon:213:phones"
+    await q.publish(make_task(1))
+    await q.publish(make_task(2))
+
+    handled: list[int] = []
+
+    async def handler(task):
+        handled.append(task.page)
+        if task.page == 1:
+            raise RuntimeError("boom")
+        q.stop()
+
+    await asyncio.wait_for(
+        q.consume(handler, site="ozon", geoid="213", category="phones"), timeout=5
+    )
+
+    assert handled == [1, 2]
+    assert await q.redis.xlen(stream) == 0
+    assert await q.redis.zcard(f"{stream}:retry") == 1
+    assert await q.promote_due_retries(stream) == 0
+
+    now = time.time()
+    monkeypatch.setattr("app.queue.backend.time.time", lambda: now + 60)
+    assert await q.promote_due_retries(stream) == 1
+    assert await q.redis.zcard(f"{stream}:retry") == 0
+    entries = await q.redis.xrange(stream)
+    assert len(entries) == 1
+    assert entries[0][1][b"retries"] == b"1"
+
+
+@pytest.mark.asyncio
+async def test_promote_due_retries_moves_each_retry_once():
+    q = RedisQueue("redis://localhost", "presets")
+    q.redis = fakeredis.aioredis.FakeRedis()
+    stream = "presets:ozon:213:phones"
+    await q.schedule_retry(stream, make_task(1), 2, delay=0)
+    await q.schedule_retry(stream, make_task(2), 1, delay=60)
+
+    moved = await asyncio.gather(*(q.promote_due_retries(stream) for _ in range(3)))
+    assert sum(moved) == 1
+    entries = await q.redis.xrange(stream)
+    assert len(entries) == 1
+    fields = entries[0][1]
+    assert fields[b"retries"] == b"2"
+    assert json.loads(fields[b"data"])["page"] == 1
+    assert await q.redis.zcard(f"{stream}:retry") == 1
@@ -1,39 +1,43 @@
+import fakeredis.aioredis
 import pytest
 
 from app.queue.backend import RedisQueue
 from app.schemas import TaskPayload
 
 
-class DummyRedis:
-    def __init__(self):
-        self.last_stream = None
-
-    async def xgroup_create(self, *args, **kwargs):
-        pass
-
-    async def setnx(self, *args, **kwargs):
-        return True
-
-    async def expire(self, *args, **kwargs):
-        pass
-
-    async def xadd(self, stream, payload):
-        self.last_stream = stream
-
-
-@pytest.mark.asyncio
-async def test_publish_shards():
-    q = RedisQueue("redis://localhost", "presets")
-    q.redis = DummyRedis()
-    data = TaskPayload(
+def make_task(page: int = 1, category: str = "phones") -> TaskPayload:
+    return TaskPayload(
         site="ozon",
         url="https://example.com",
         geoid="213",
-        category="phones",
+        category=category,
         min_discount=0,
         min_score=0,
         url_template="u",
-        page=1,
+        page=page,
     )
-    await q.publish(data)
-    assert q.redis.last_stream == "presets:ozon:213:phones"
+
+
+@pytest.mark.asyncio
+async def test_publish_shards():
+    q = RedisQueue("redis://localhost", "presets")
+    q.redis = fakeredis.aioredis.FakeRedis()
+    await q.publish(make_task())
+    assert await q.redis.xlen("presets:ozon:213:phones") == 1
+    assert await q.redis.exists("presets") == 0
+
+
+@pytest.mark.asyncio
+async def test_publish_many_is_idempotent_and_sets_ttl():
+    q = RedisQueue("redis://localhost", "presets")
+    q.redis = fakeredis.aioredis.FakeRedis()
+    tasks = [make_task(1), make_task(2), make_task(1), make_task(1, category="tv")]
+    added = await q.publish_many(tasks)
+    assert added == 3
+    assert await q.redis.xlen("presets:ozon:213:phones") == 2
+    assert await q.redis.xlen("presets:ozon:213:tv") == 1
+    ttl = await q.redis.ttl("presets:ozon:213:phones:idem:ozon:213:phones:u:1")
+    assert 0 < ttl <= q.idempotency_ttl
+    assert ("presets:ozon:213:phones", "presets:ozon:213:phones:group") in q._groups
+
+    assert await q.publish_many([make_task(2)]) == 0
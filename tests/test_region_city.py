@@ -30,3 +30,26 @@ def test_ozon_region_parsing():
     assert ozon.city_from_html(html_spb) == "Санкт-Петербург"
     assert ozon.ensure_region(html_msk, "213")
     assert ozon.ensure_region(html_spb, "2")
+
+
+def test_document_parsed_once(monkeypatch):
+    import bs4
+    from app.scraper.adapters import Document
+
+    calls = []
+    orig = bs4.BeautifulSoup.__init__
+
+    def counting_init(self, *args, **kwargs):
+        calls.append(1)
+        orig(self, *args, **kwargs)
+
+    monkeypatch.setattr(bs4.BeautifulSoup, "__init__", counting_init)
+
+    doc = Document(load("ozon_region_msk.html") + load("ozon_listing.html"))
+    assert ozon.ensure_region(doc, "213")
+    assert len(ozon.parse_listing(doc)) == 2
+
+    doc = Document(load("market_region_msk.html") + load("market_listing.html"))
+    assert market.ensure_region(doc, "213")
+    assert len(market.parse_listing(doc, geoid="213")) == 2
+    assert len(calls) == 2
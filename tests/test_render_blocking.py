@@ -0,0 +1,69 @@
+import types
+from pathlib import Path
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.config import settings
+from app.scraper.blocking import profile_for
+from app.scraper.render import RenderService
+from observability.metrics import render_blocked_requests
+
+
+def test_profile_blocks_types_and_trackers():
+    profile = profile_for("www.ozon.ru")
+    assert profile.blocks("image", "https://ir.ozone.ru/a.jpg")
+    assert profile.blocks("script", "https://mc.yandex.ru/metrika/tag.js")
+    assert not profile.blocks("script", "https://www.ozon.ru/app.js")
+    assert not profile.blocks("document", "https://mc.yandex.ru/")
+
+
+def test_site_profile_overrides(monkeypatch):
+    monkeypatch.setattr(
+        settings,
+        "RENDER_BLOCK_PROFILES",
+        {"yandex.ru": {"types": ["image", "stylesheet"], "allow": ["avatars.mds"]}},
+    )
+    profile = profile_for("market.yandex.ru")
+    assert profile.blocks("stylesheet", "https://market.yandex.ru/a.css")
+    assert not profile.blocks("image", "https://avatars.mds.yandex.net/i.png")
+    # остальные сайты остаются на общем профиле
+    assert not profile_for("www.ozon.ru").blocks("stylesheet", "https://www.ozon.ru/a.css")
+
+    monkeypatch.setattr(settings, "RENDER_BLOCKING", False)
+    assert not profile_for("market.yandex.ru")
+
+
+@pytest.mark.asyncio
+async def test_fetch_routes_page_through_profile(fake_browsers):
+    svc = RenderService()
+    svc._redis = None
+    ctx = AsyncMock()
+    page = AsyncMock()
+    page.on = MagicMock()
+    ctx.new_page.return_value = page
+    svc._browsers = fake_browsers(ctx)
+    page.goto.return_value = types.SimpleNamespace(status=200, headers={})
+    page.content.return_value = "<html></html>"
+    page.evaluate.return_value = 3
+
+    await svc.fetch("https://www.ozon.ru/search")
+    pattern, handle = page.route.await_args.args
+    assert pattern == "**/*"
+
+    def route(resource_type, url):
+        return AsyncMock(request=types.SimpleNamespace(resource_type=resource_type, url=url))
+
+    before = render_blocked_requests.labels(domain="www.ozon.ru", type="image")._value.get()
+    img = route("image", "https://ir.ozone.ru/a.jpg")
+    await handle(img)
+    img.abort.assert_awaited_once()
+    doc = route("document", "https://www.ozon.ru/search")
+    await handle(doc)
+    doc.continue_.assert_awaited_once()
+    assert render_blocked_requests.labels(domain="www.ozon.ru", type="image")._value.get() - before == 1
@@ -0,0 +1,85 @@
+import asyncio
+from pathlib import Path
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.scraper.browsers import BrowserPool
+
+
+def make_browser():
+    browser = MagicMock()
+    browser.close = AsyncMock()
+
+    async def new_context(**kw):
+        ctx = MagicMock()
+        ctx.close = AsyncMock()
+        return ctx
+
+    browser.new_context = new_context
+    return browser
+
+
+def fire(obj, event):
+    for call in obj.on.call_args_list:
+        if call.args[0] == event:
+            call.args[1](None)
+
+
+def make_pool(size: int, max_pages: int = 0):
+    launched: list = []
+
+    async def launch():
+        launched.append(make_browser())
+        return launched[-1]
+
+    return BrowserPool(launch, size, max_pages), launched
+
+
+@pytest.mark.asyncio
+async def test_contexts_spread_to_least_loaded_browser():
+    pool, launched = make_pool(2)
+    await pool.start()
+    ctxs = [await pool.new_context() for _ in range(3)]
+    assert [s.contexts for s in pool.slots] == [2, 1]
+    fire(ctxs[0], "close")
+    fire(ctxs[1], "close")
+    assert [s.contexts for s in pool.slots] == [1, 0]
+    await pool.new_context()
+    assert [s.contexts for s in pool.slots] == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_crashed_browser_relaunched():
+    pool, launched = make_pool(1)
+    await pool.start()
+    ctx = await pool.new_context()
+    fire(launched[0], "disconnected")
+    assert not pool.alive(ctx)
+
+    fresh = await pool.new_context()
+    assert len(launched) == 2
+    assert pool.slots[0].browser is launched[1]
+    assert pool.alive(fresh)
+
+
+@pytest.mark.asyncio
+async def test_browser_recycled_after_page_budget():
+    pool, launched = make_pool(1, max_pages=2)
+    await pool.start()
+    ctx = await pool.new_context()
+    assert await pool.page_done(ctx) is False
+    assert await pool.page_done(ctx) is True
+    # замена запущена сразу, старый браузер ждёт закрытия своих контекстов
+    assert pool.slots[0].browser is launched[1]
+    assert not pool.alive(ctx)
+    launched[0].close.assert_not_called()
+
+    fire(ctx, "close")
+    await asyncio.sleep(0)
+    launched[0].close.assert_awaited_once()
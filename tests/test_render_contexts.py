@@ -0,0 +1,117 @@
+import asyncio
+import types
+from pathlib import Path
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.scraper.contexts import ContextPool
+from app.scraper.render import RenderService
+
+
+def make_pool(capacity: int, max_pages: int = 0):
+    created: list[tuple] = []
+
+    async def factory(key):
+        ctx = AsyncMock()
+        created.append((key, ctx))
+        return ctx
+
+    return ContextPool(capacity, factory, max_pages), created
+
+
+@pytest.mark.asyncio
+async def test_context_reused_per_key():
+    pool, created = make_pool(2)
+    first = await pool.acquire(("ozon", "213"))
+    await pool.release(first)
+    again = await pool.acquire(("ozon", "213"))
+    assert again is first and again.pages == 1
+    other = await pool.acquire(("ozon", "2"))
+    assert other is not first
+    assert [key for key, _ in created] == [("ozon", "213"), ("ozon", "2")]
+
+
+@pytest.mark.asyncio
+async def test_lru_context_evicted_when_full():
+    pool, created = make_pool(2)
+    for key in ("a", "b", "a"):
+        await pool.release(await pool.acquire(key))
+    # «b» использовался раньше «a» — вытесняется он
+    await pool.release(await pool.acquire("c"))
+    closed = [key for key, ctx in created if ctx.close.await_count]
+    assert closed == ["b"]
+    assert pool.size == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_stay_within_capacity():
+    created: list[tuple] = []
+
+    async def slow_close():
+        await asyncio.sleep(0)
+
+    async def factory(key):
+        await asyncio.sleep(0)
+        ctx = AsyncMock()
+        ctx.close.side_effect = slow_close
+        created.append((key, ctx))
+        return ctx
+
+    pool = ContextPool(2, factory)
+    for key in ("a", "b"):
+        await pool.release(await pool.acquire(key))
+    entries = await asyncio.gather(pool.acquire("z"), pool.acquire("w"))
+    # создаваемые контексты занимают место сразу, вытесняются оба свободных
+    assert pool.size == 2
+    assert [key for key, ctx in created if not ctx.close.await_count] == ["z", "w"]
+    for entry in entries:
+        await pool.release(entry)
+    assert pool.size == 2
+
+
+@pytest.mark.asyncio
+async def test_context_recycled_and_discarded():
+    pool, created = make_pool(2, max_pages=2)
+    entry = await pool.acquire("a")
+    await pool.release(entry)
+    await pool.release(await pool.acquire("a"))
+    created[0][1].close.assert_awaited_once()
+    assert pool.size == 0
+
+    entry = await pool.acquire("a")
+    await pool.release(entry, healthy=False)
+    created[1][1].close.assert_awaited_once()
+    assert pool.size == 0
+
+
+@pytest.mark.asyncio
+async def test_fetch_keeps_region_context_warm(fake_browsers):
+    svc = RenderService()
+    svc._redis = None
+    ctx = AsyncMock()
+    page = AsyncMock()
+    page.on = MagicMock()
+    page.goto.return_value = types.SimpleNamespace(status=200, headers={})
+    page.content.return_value = "<html></html>"
+    page.evaluate.return_value = 3
+    ctx.new_page.return_value = page
+    svc._browsers = fake_browsers(ctx)
+    svc._pacer = types.SimpleNamespace(acquire=AsyncMock())
+
+    cookies = [{"name": "yandex_gid", "value": "213", "domain": ".ozon.ru", "path": "/"}]
+    for _ in range(2):
+        await svc.fetch("https://www.ozon.ru/search", cookies=cookies, region_hint="213")
+
+    svc._browsers.slots[0].browser.new_context.assert_awaited_once()
+    # cookies региона переустанавливаются одним вызовом на рендер, контекст не сбрасывается
+    assert ctx.add_cookies.await_count == 2
+    assert [c["name"] for c in ctx.add_cookies.await_args.args[0]] == ["yandex_gid", "region"]
+    ctx.clear_cookies.assert_not_called()
+    await svc.stop()
+    ctx.close.assert_awaited_once()
@@ -15,16 +15,15 @@ from app.scraper.render import RenderService
 
 
 @pytest.mark.asyncio
-async def test_fetch_error_creates_snapshot_and_metrics(monkeypatch):
+async def test_fetch_error_creates_snapshot_and_metrics(monkeypatch, fake_browsers):
     svc = RenderService()
-    svc._browser = object()
     svc._redis = None
 
     ctx = AsyncMock()
     page = AsyncMock()
+    page.on = MagicMock()
     ctx.new_page.return_value = page
-    svc._ctx_pool = asyncio.Queue()
-    await svc._ctx_pool.put(ctx)
+    svc._browsers = fake_browsers(ctx)
 
     resp = types.SimpleNamespace(status=200, headers={})
     page.goto.return_value = resp
@@ -45,3 +44,51 @@ async def test_fetch_error_creates_snapshot_and_metrics(monkeypatch):
 
     assert save_snapshot.call_count >= 1
     assert inc_mock.call_count == 1
+
+
+def _service_with_page(fake_browsers, html: str = "<html></html>"):
+    svc = RenderService()
+    svc._redis = None
+    ctx = AsyncMock()
+    page = AsyncMock()
+    page.on = MagicMock()
+    ctx.new_page.return_value = page
+    svc._browsers = fake_browsers(ctx)
+    page.goto.return_value = types.SimpleNamespace(status=200, headers={})
+    page.content.return_value = html
+    page.evaluate.return_value = 3
+    page.screenshot.return_value = b"img"
+    return svc, page
+
+
+@pytest.mark.asyncio
+async def test_fetch_skips_screenshot_on_success(fake_browsers):
+    svc, page = _service_with_page(fake_browsers)
+    html, screenshot = await svc.fetch("https://example.com")
+    assert html == "<html></html>" and screenshot == b""
+    page.screenshot.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_fetch_always_viewport_screenshot(fake_browsers):
+    svc, page = _service_with_page(fake_browsers)
+    _, screenshot = await svc.fetch(
+        "https://example.com", capture="always", full_page=False
+    )
+    assert screenshot == b"img"
+    page.screenshot.assert_awaited_once_with(full_page=False)
+
+
+@pytest.mark.asyncio
+async def test_fetch_error_without_screenshot(monkeypatch, fake_browsers):
+    svc, page = _service_with_page(fake_browsers)
+    page.wait_for_selector.side_effect = Exception("boom")
+    save_snapshot = AsyncMock()
+    monkeypatch.setattr(svc, "save_snapshot", save_snapshot)
+    monkeypatch.setattr(render_module.sentry_sdk, "capture_exception", lambda e: None)
+
+    with pytest.raises(Exception):
+        await svc.fetch("https://example.com", wait_selector="#sel", capture="never")
+
+    page.screenshot.assert_not_called()
+    save_snapshot.assert_awaited_once_with("https://example.com", "<html></html>", b"")
@@ -0,0 +1,52 @@
+from pathlib import Path
+import sys
+from unittest.mock import AsyncMock
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from app.config import settings
+from app.scraper.readiness import wait_ready
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(settings, "RENDER_READY_INTERVAL_MS", 1)
+    monkeypatch.setattr(settings, "RENDER_READY_TIMEOUT_MS", 50)
+
+
+@pytest.mark.asyncio
+async def test_stable_waits_until_card_count_settles():
+    page = AsyncMock()
+    page.evaluate.side_effect = [0, 4, 8, 8]
+    assert await wait_ready(page, "www.ozon.ru", "article", "stable") == "ready"
+    assert page.evaluate.await_count == 4
+    assert page.evaluate.await_args.args[1] == "article"
+
+
+@pytest.mark.asyncio
+async def test_stable_gives_up_after_cap():
+    page = AsyncMock()
+    counter = iter(range(1, 10_000))
+    page.evaluate.side_effect = lambda *a: next(counter)
+    assert await wait_ready(page, "www.ozon.ru", "article", "stable") == "timeout"
+
+
+@pytest.mark.asyncio
+async def test_site_predicate_and_networkidle(monkeypatch):
+    monkeypatch.setattr(settings, "RENDER_READY_PREDICATES", {"ozon.ru": "() => window.__ready"})
+    page = AsyncMock()
+    assert await wait_ready(page, "www.ozon.ru", "article") == "ready"
+    page.wait_for_function.assert_awaited_once_with("() => window.__ready", timeout=50)
+
+    page = AsyncMock()
+    page.wait_for_load_state.side_effect = PlaywrightTimeoutError("idle")
+    assert await wait_ready(page, "market.yandex.ru", None, "networkidle") == "timeout"
+    assert await wait_ready(page, "market.yandex.ru", None, "none") == "skipped"
+    with pytest.raises(ValueError):
+        await wait_ready(page, "market.yandex.ru", None, "sleep")
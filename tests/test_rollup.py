@@ -0,0 +1,158 @@
+from pathlib import Path
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.models import Base, Product, PriceHistory, PriceDaily
+from history.rollup import record_prices, rollup_metrics, roll_window, rebuild_from_history
+from history.service import update_products_metrics
+
+
+def noon_yesterday() -> datetime:
+    today = datetime.utcnow().date()
+    return datetime(today.year, today.month, today.day, 12) - timedelta(days=1)
+
+
+async def make_session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+
+@pytest.mark.asyncio
+async def test_rollup_matches_history_metrics():
+    async_session = await make_session()
+    now = noon_yesterday()
+    points = [
+        (200, now - timedelta(days=40)),
+        (100, now - timedelta(days=20, hours=3)),
+        (90, now - timedelta(days=20, hours=1)),
+        (80, now - timedelta(days=10)),
+        (None, now - timedelta(days=5)),
+        (120, now),
+    ]
+    async with async_session() as session:
+        prod = Product(source="ozon", external_id="1", title="t", url="u", finger="f")
+        session.add(prod)
+        await session.flush()
+        session.add_all([PriceHistory(product_id=prod.id, price_final=p, ts=ts) for p, ts in points])
+        # наблюдения приходят по одному, как при ежечасном сборе
+        for price, ts in points:
+            await record_prices(session, [(prod.id, ts, price)])
+        await session.commit()
+
+        assert await session.scalar(select(func.count()).select_from(PriceDaily)) == 4
+        avg30, best90, trend = (await rollup_metrics(session, [prod.id]))[prod.id]
+        # те же значения, что даёт регрессия по сырым наблюдениям
+        assert (avg30, best90) == (97, 80)
+        assert trend == pytest.approx(29.73, abs=0.01)
+        assert await update_products_metrics(session, [prod.id]) == {prod.id: (avg30, best90, trend)}
+
+
+@pytest.mark.asyncio
+async def test_roll_window_drops_expired_buckets():
+    async_session = await make_session()
+    now = datetime.utcnow()
+    async with async_session() as session:
+        prod = Product(source="ozon", external_id="1", title="t", url="u", finger="f")
+        session.add(prod)
+        await session.flush()
+        await record_prices(session, [
+            (prod.id, now - timedelta(days=100), 50),
+            (prod.id, now - timedelta(days=60), 70),
+            (prod.id, now, 100),
+        ])
+        assert await roll_window(session) == 1
+        avg30, best90, trend = (await rollup_metrics(session, [prod.id]))[prod.id]
+        assert (avg30, best90, trend) == (100, 70, None)
+
+        later = (now + timedelta(days=40)).date()
+        await roll_window(session, today=later)
+        assert (await rollup_metrics(session, [prod.id], today=later))[prod.id] == (None, 100, None)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_from_history():
+    async_session = await make_session()
+    now = noon_yesterday()
+    async with async_session() as session:
+        prod = Product(source="ozon", external_id="1", title="t", url="u", finger="f")
+        session.add(prod)
+        await session.flush()
+        session.add_all([
+            PriceHistory(product_id=prod.id, price_final=p, ts=now - timedelta(hours=h))
+            for p, h in ((100, 1), (80, 2), (120, 3))
+        ])
+        await session.commit()
+        await rebuild_from_history(session, batch_size=2)
+        bucket = await session.scalar(select(PriceDaily))
+        assert (bucket.cnt, bucket.total, bucket.min_price, bucket.first_price) == (3, 300, 80, 120)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_expands_change_points(monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "HISTORY_HEARTBEAT_HOURS", 5 * 24)
+    async_session = await make_session()
+    now = noon_yesterday()
+    async with async_session() as session:
+        prod = Product(source="ozon", external_id="1", title="t", url="u", finger="f")
+        session.add(prod)
+        await session.flush()
+        session.add_all([
+            PriceHistory(product_id=prod.id, price_final=p, ts=now - timedelta(days=d))
+            for p, d in ((100, 20), (100, 16), (100, 12), (100, 8), (50, 7))
+        ])
+        await session.commit()
+        await rebuild_from_history(session, batch_size=1, change_points=True)
+
+        # 100 держалась 13 дней, 50 — 5 дней до конца heartbeat
+        assert await session.scalar(select(func.count()).select_from(PriceDaily)) == 18
+        avg30, best90, trend = (await rollup_metrics(session, [prod.id]))[prod.id]
+        assert (avg30, best90) == (int((13 * 100 + 5 * 50) / 18), 50)
+        assert trend < 0
+
+
+@pytest.mark.asyncio
+async def test_record_prices_orm_fallback(monkeypatch):
+    now = noon_yesterday()
+    batches = [
+        [(1, now - timedelta(hours=2), 100), (1, now - timedelta(days=3), 70)],
+        [(1, now - timedelta(hours=5), 90), (1, now, 120), (2, now, 50)],
+    ]
+
+    async def collect(session) -> list[tuple]:
+        for batch in batches:
+            await record_prices(session, batch)
+        await session.commit()
+        rows = await session.scalars(select(PriceDaily).order_by(PriceDaily.product_id, PriceDaily.day))
+        return [
+            (r.product_id, r.day, r.cnt, r.total, r.min_price, r.first_ts, r.first_price, r.sum_x, r.sum_xy)
+            for r in rows
+        ]
+
+    async def make_products(session):
+        session.add_all([
+            Product(source="ozon", external_id=str(i), title="t", url=f"u{i}", finger="f") for i in (1, 2)
+        ])
+        await session.flush()
+
+    async with (await make_session())() as session:
+        await make_products(session)
+        expected = await collect(session)
+
+    # СУБД без ON CONFLICT: бакеты сливаются через ORM
+    monkeypatch.setattr("history.rollup._upsert", lambda dialect: None)
+    async with (await make_session())() as session:
+        await make_products(session)
+        assert await collect(session) == expected
+    assert [r[2] for r in expected] == [1, 3, 1]
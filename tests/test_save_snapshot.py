@@ -24,3 +24,16 @@ async def test_save_snapshot_s3(monkeypatch):
     assert len(dummy.calls) == 2
     exp = dummy.calls[0]["Expires"]
     assert exp - dt.datetime.utcnow() > dt.timedelta(days=1)
+
+
+@pytest.mark.asyncio
+async def test_save_snapshot_without_screenshot(monkeypatch):
+    rs = RenderService()
+    dummy = DummyS3()
+    rs._s3 = dummy
+    rs._s3_bucket = "bucket"
+    async def fake_to_thread(func, *args, **kwargs):
+        return func(*args, **kwargs)
+    monkeypatch.setattr(asyncio, "to_thread", fake_to_thread)
+    await rs.save_snapshot("http://example.com", "<html></html>", b"")
+    assert [c["Key"].rsplit(".", 1)[1] for c in dummy.calls] == ["html"]
@@ -0,0 +1,64 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+pytest.importorskip("lxml")
+
+from app.scraper.adapters import Document, get_selectors, select_all, select_one
+from app.scraper.adapters.plans import SelectorPlan, plan_for
+
+
+class CountingCss:
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.calls = 0
+
+    def select(self, node):
+        self.calls += 1
+        return self.compiled.select(node)
+
+
+def test_selectors_compiled_once():
+    plans = get_selectors("ozon")
+    price = plans["listing"]["price"]
+    assert isinstance(price, SelectorPlan)
+    assert price.tiers == ("css", "xpath", "json")
+    assert get_selectors("ozon")["listing"]["price"] is price
+    assert plan_for({"css": "img"}) is plan_for({"css": "img"})
+
+
+def test_plan_starts_from_last_successful_tier():
+    plan = SelectorPlan({"css": "span.price", "xpath": "//b", "json": "p"}, "site.listing.price")
+    counter = CountingCss(plan._css_soup)
+    plan._css_soup = counter
+    html = "".join(f"<article><b>{i}</b></article>" for i in range(10))
+    cards = select_all(Document(html), {"css": "article"})
+
+    values = [select_one(card, plan).get_text() for card in cards]
+    assert values == [str(i) for i in range(10)]
+    assert plan.last_tier == "xpath"
+    # CSS промахнулся один раз, дальше карточки начинают с XPath
+    assert counter.calls == 1
+
+    # XPath перестал находить — возвращаемся к остальным уровням по порядку
+    card = select_one(Document("<article><span class='price'>7</span></article>"), {"css": "article"})
+    assert select_one(card, plan).get_text() == "7"
+    assert plan.last_tier == "css"
+
+
+def test_plan_same_results_on_lxml():
+    plan = SelectorPlan({"css": "span.price", "xpath": "//b"})
+    html = "<article><b>1</b></article><article><b>2</b></article>"
+    cards = select_all(Document(html, "lxml"), {"css": "article"})
+    assert [select_one(card, plan).get_text() for card in cards] == ["1", "2"]
+
+
+def test_invalid_xpath_tier_dropped():
+    plan = SelectorPlan({"css": "b", "xpath": "//[", "json": "a.b"})
+    assert plan.tiers == ("css", "json")
+    assert select_all(Document("<div><script>{\"a\": {\"b\": 3}}</script></div>"), plan) == [3]
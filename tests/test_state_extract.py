@@ -0,0 +1,102 @@
+from pathlib import Path
+import html as html_lib
+import json
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.config import settings
+from app.scraper.adapters import Document, ozon, market
+from app.scraper.adapters.state import attr_states, element_states
+
+
+def ozon_item(num: int, price: str, extra: str = "") -> dict:
+    return {
+        "action": {"link": f"/product/slug-{num}/?from=search"},
+        "mainState": [
+            {"type": "priceV2", "priceV2": {"price": [
+                {"text": price, "textStyle": "PRICE"},
+                {"text": "9 999 ₽", "textStyle": "ORIGINAL_PRICE"},
+            ]}},
+            {"type": "textAtom", "id": "brand", "textAtom": {"text": "Бренд"}},
+            {"type": "textAtom", "id": "name", "textAtom": {"text": f"Товар {num}"}},
+            {"type": "labelList", "labelList": {"items": [{"title": {"text": extra}}]}},
+        ],
+        "tileImage": {"items": [{"type": "image", "image": {"link": f"https://cdn.ozon.ru/{num}.jpg"}}]},
+    }
+
+
+def ozon_page(items: list[dict]) -> str:
+    state = html_lib.escape(json.dumps({"items": items}, ensure_ascii=False), quote=True)
+    return (
+        "<html><body><script>var analytics = {\"huge\": true};</script>"
+        f"<div data-state=\"{state}\" id=\"state-searchResultsV2-123-default-1\"></div>"
+        "<div data-widget='searchResultsV2'></div></body></html>"
+    )
+
+
+def market_page() -> str:
+    data = {
+        "widgets": {},
+        "collections": {
+            "product": {
+                "111": {"id": "111", "slug": "slug1", "titles": {"raw": "Товар A"},
+                        "pictures": [{"original": {"url": "//avatars.mds.yandex.net/1.png"}}]},
+                "222": {"id": "222", "slug": "slug2", "titles": {"raw": "Товар B"}},
+            },
+            "offer": {
+                "o1": {"productId": "111", "prices": {"value": "1234"}, "promo": "Купон 100 ₽"},
+                "o2": {"productId": "222", "prices": {"value": 2345}, "delivery": "Бесплатно, 3 дня"},
+                "o3": {"productId": "111", "prices": {"value": "999"}},
+            },
+        },
+    }
+    return (
+        "<html><body>"
+        f"<noframes class=\"apiary-patch\" data-apiary=\"patch\">{json.dumps(data)}</noframes>"
+        "</body></html>"
+    )
+
+
+def test_ozon_listing_from_state():
+    doc = Document(ozon_page([ozon_item(1, "1 234 ₽", "Купон 150 ₽"), ozon_item(2, "2 345 ₽")]))
+    items = ozon.parse_listing(doc)
+    assert [i.price for i in items] == [1234, 2345]
+    assert items[0].title == "Товар 1"
+    assert str(items[0].url) == "https://www.ozon.ru/product/slug-1/?from=search"
+    assert str(items[0].img) == "https://cdn.ozon.ru/1.jpg"
+    assert items[0].promo_flags == {"instant_coupon": 150}
+    # DOM не строился
+    assert doc._root is None
+
+
+def test_market_listing_from_state():
+    doc = Document(market_page())
+    items = market.parse_listing(doc, geoid="213")
+    assert [(i.title, i.price) for i in items] == [("Товар A", 1234), ("Товар B", 2345)]
+    assert str(items[0].url) == "https://market.yandex.ru/product--slug1/111"
+    assert str(items[0].img) == "https://avatars.mds.yandex.net/1.png"
+    assert items[0].promo_flags == {"instant_coupon": 100}
+    assert items[1].shipping_included and items[1].shipping_days == 3
+    assert items[0].geoid == "213"
+    assert doc._root is None
+
+
+def test_state_missing_falls_back_to_dom():
+    html = (Path(__file__).parent / "fixtures" / "ozon_listing.html").read_text(encoding="utf-8")
+    broken = "<div id='state-searchResultsV2-1' data-state='{not json'></div>" + html
+    assert [i.price for i in ozon.parse_listing(broken)] == [1234, 2345]
+
+
+def test_state_fast_path_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "PARSER_STATE_FAST_PATH", False)
+    assert ozon.parse_listing(ozon_page([ozon_item(1, "1 234 ₽")])) == []
+
+
+def test_state_locators():
+    html = "<div\n  data-state='{\"a\": 1}' class=x id=\"state-searchResultsV2-9\">"
+    assert list(attr_states(html, "state-searchResultsV2")) == [{"a": 1}]
+    html = "<script type='application/json' data-apiary-widget='x'>{\"b\": 2}</script>"
+    assert list(element_states(html, "script", "apiary")) == [{"b": 2}]